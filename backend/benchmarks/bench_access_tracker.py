@@ -0,0 +1,87 @@
+"""
+Benchmark: cost of access tracking on the cache-hit path
+
+1. AccessTracker.record() alone (no database): ns per hit over a catalog of keys.
+2. With MongoDB: N hits tracked by awaiting one update_one per hit (what the
+   hit path would pay without write-behind) vs record() per hit plus the
+   batched bulk_write flushes, and how many database operations each needs.
+
+Usage (part 2 needs a reachable MongoDB, see MONGO_URL / DB_NAME):
+    cd backend && DB_NAME=languageapp_bench python benchmarks/bench_access_tracker.py [hits]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo.errors import ServerSelectionTimeoutError  # noqa: E402
+
+from services.access_tracker import AccessTracker  # noqa: E402
+
+KEYS = [f"en_section{i}_coffeeshop_maria_jordan" for i in range(500)]
+
+
+class NullCollection:
+    async def bulk_write(self, requests, ordered=True):
+        pass
+
+
+def bench_record(total: int) -> None:
+    tracker = AccessTracker(NullCollection(), flush_events=total + 1)
+    started = time.perf_counter()
+    for i in range(total):
+        tracker.record(KEYS[i % len(KEYS)])
+    elapsed = time.perf_counter() - started
+    print(f"{'record() only':<28} {elapsed / total * 1e9:8.0f} ns/hit")
+
+
+async def bench_mongo(total: int) -> None:
+    client = AsyncIOMotorClient(
+        os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000
+    )
+    collection = client[os.environ.get('DB_NAME', 'languageapp_bench')]['bench_access_tracker']
+    try:
+        await collection.drop()
+    except ServerSelectionTimeoutError:
+        print("MongoDB not reachable; skipping the database comparison")
+        return
+    await collection.insert_many([{"cache_key": key, "hit_count": 0} for key in KEYS])
+    await collection.create_index("cache_key", unique=True)
+
+    started = time.perf_counter()
+    for i in range(total):
+        await collection.update_one(
+            {"cache_key": KEYS[i % len(KEYS)]},
+            {"$inc": {"hit_count": 1}, "$max": {"last_accessed_at": datetime.utcnow()}}
+        )
+    elapsed = time.perf_counter() - started
+    print(f"{'update_one per hit':<28} {elapsed / total * 1e6:8.1f} us/hit  {total} db ops")
+
+    tracker = AccessTracker(collection)
+    started = time.perf_counter()
+    for i in range(total):
+        tracker.record(KEYS[i % len(KEYS)])
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # let threshold flushes run, as between requests
+    await tracker.stop()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'AccessTracker (batched)':<28} {elapsed / total * 1e6:8.1f} us/hit  "
+        f"{tracker.stats()['flushes']} db ops"
+    )
+
+    expected = 2 * total
+    actual = sum([doc["hit_count"] async for doc in collection.find({}, {"hit_count": 1})])
+    print(f"hit_count total {actual} (expected {expected})")
+    await collection.drop()
+
+
+if __name__ == "__main__":
+    hits = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bench_record(hits * 10)
+    asyncio.run(bench_mongo(hits))
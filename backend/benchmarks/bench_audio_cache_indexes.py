@@ -0,0 +1,105 @@
+"""
+Benchmark: audio_cache lookups with and without indexes
+
+Seeds a scratch collection with 100k synthetic entries, then times
+find_one by cache_key, a language/location/section query and the
+get_cache_stats size pipeline, first without indexes (collection scans)
+and then with the indexes ensured at startup.
+
+Usage (needs a reachable MongoDB, see MONGO_URL / DB_NAME):
+    cd backend && DB_NAME=languageapp_bench python benchmarks/bench_audio_cache_indexes.py [entries]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.audio_cache import db, AUDIO_CACHE_INDEXES  # noqa: E402
+
+LANGUAGES = ["en", "es", "fr", "de", "it", "pt", "ja", "ko", "zh", "ar"]
+LOCATIONS = ["coffeeshop", "restaurant", "airport", "hotel", "market", "pharmacy", "bank", "taxi", "museum", "gym"]
+SECTIONS = ["welcome", "vocab", "slow", "breakdown", "natural", "quiz", "cultural"]
+
+
+def make_entry(i: int) -> dict:
+    language = LANGUAGES[i % len(LANGUAGES)]
+    location = LOCATIONS[(i // len(LANGUAGES)) % len(LOCATIONS)]
+    section = SECTIONS[(i // 100) % len(SECTIONS)]
+    cache_key = f"{language}_{section}_{location}_speaker{i}_partner{i}"
+    return {
+        "cache_key": cache_key,
+        "section_type": section,
+        "language": language,
+        "location": location,
+        "speaker_a": f"speaker{i}",
+        "speaker_b": f"partner{i}",
+        "audio_path": f"/audio-cache/{language}/{location}/{cache_key}.mp3",
+        "dialogue_timestamps": [],
+        "duration": 30000,
+        "file_size": 480000,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def timed(label, fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"  {label:<28} p50={p50:9.3f}ms  p99={p99:9.3f}ms")
+
+
+async def run_queries(collection, total):
+    async def by_key():
+        i = random.randrange(total)
+        await collection.find_one({"cache_key": make_entry(i)["cache_key"]}, {"_id": 0})
+
+    async def by_lesson():
+        await collection.find(
+            {"language": "es", "location": "restaurant", "section_type": "quiz"}, {"_id": 0}
+        ).to_list(1000)
+
+    async def stats():
+        await collection.aggregate(
+            [{"$group": {"_id": None, "total_size": {"$sum": "$file_size"}}}]
+        ).to_list(1)
+
+    await timed("find_one by cache_key", by_key, 200)
+    await timed("language/location/section", by_lesson, 50)
+    await timed("stats $group", stats, 10)
+
+
+async def main(total: int):
+    collection = db[f"audio_cache_bench_{os.getpid()}"]
+    try:
+        print(f"Seeding {total} entries...")
+        batch = []
+        for i in range(total):
+            batch.append(make_entry(i))
+            if len(batch) == 5000:
+                await collection.insert_many(batch)
+                batch = []
+        if batch:
+            await collection.insert_many(batch)
+
+        print("\nWithout indexes:")
+        await run_queries(collection, total)
+
+        await collection.create_indexes(AUDIO_CACHE_INDEXES)
+        print("\nWith indexes:")
+        await run_queries(collection, total)
+    finally:
+        await collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
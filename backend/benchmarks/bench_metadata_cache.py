@@ -0,0 +1,79 @@
+"""
+Benchmark: cache-hit latency with and without the in-process metadata cache
+
+Seeds one audio_cache entry in MongoDB, then issues GET /api/audio/section/{key}
+in-process (ASGI transport, no network) for both its content key and its
+alias, with the metadata cache disabled (one query per request) and enabled
+(zero database round trips once warm; aliases re-query every
+METADATA_ALIAS_TTL seconds), and prints p50/p99 for each.
+
+Usage (needs a reachable MongoDB, see MONGO_URL / DB_NAME):
+    cd backend && DB_NAME=languageapp_bench python benchmarks/bench_metadata_cache.py [requests]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import app  # noqa: E402
+from routes import audio_cache  # noqa: E402
+from services.metadata_cache import MetadataCache  # noqa: E402
+
+ALIAS = "en_benchmark_coffeeshop_maria_jordan"
+CONTENT_HASH = "0123456789abcdef"
+CACHE_KEY = f"{ALIAS}.v2-{CONTENT_HASH}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+
+async def measure(label, client, key, total):
+    latencies = []
+    for _ in range(total):
+        started = time.perf_counter()
+        response = await client.get(f"/api/audio/section/{key}")
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    print(f"{label:<36} p50={percentile(latencies, 0.50):7.3f}ms  p99={percentile(latencies, 0.99):7.3f}ms")
+
+
+async def main(total: int):
+    await audio_cache.db.audio_cache.delete_many({"cache_key": CACHE_KEY})
+    await audio_cache.db.audio_cache.insert_one({
+        "cache_key": CACHE_KEY,
+        "alias": ALIAS,
+        "script_hash": CONTENT_HASH,
+        "section_type": "benchmark",
+        "language": "en",
+        "location": "coffeeshop",
+        "speaker_a": "maria",
+        "speaker_b": "jordan",
+        "audio_path": f"/audio-cache/en/coffeeshop/{CACHE_KEY}.mp3",
+        "dialogue_timestamps": [{"text": "Welcome!", "speaker_id": 1, "start": 0.0, "end": 1.2}],
+        "duration": 1200,
+        "file_size": 19200,
+        "created_at": datetime.utcnow(),
+    })
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for kind, key in (("content key", CACHE_KEY), ("alias", ALIAS)):
+            audio_cache.metadata_cache = MetadataCache(max_entries=0)
+            await measure(f"{kind}, without metadata cache", client, key, total)
+
+            audio_cache.metadata_cache = MetadataCache()
+            await measure(f"{kind}, with metadata cache", client, key, total)
+
+    await audio_cache.db.audio_cache.delete_many({"cache_key": CACHE_KEY})
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
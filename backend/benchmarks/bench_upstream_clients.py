@@ -0,0 +1,128 @@
+"""
+Benchmark: per-request httpx client vs shared pooled client
+
+Starts a local fake upstream that mimics a TTS endpoint, then fires the same
+number of requests through (a) a fresh AsyncClient per request, as the old
+handlers did, and (b) the shared pooled client from services.http_clients.
+The fake upstream counts accepted TCP connections so the handshake savings
+are visible directly, not just as latency.
+
+Usage:
+    cd backend && python benchmarks/bench_upstream_clients.py [requests] [concurrency]
+
+The fake upstream is plain TCP; real TLS handshakes to api.openai.com /
+api.elevenlabs.io add one or two more round trips per new connection, so the
+gap in production is larger than what is measured here.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_AUDIO = b"\xff\xfb\x90\x64" + b"\x00" * 4096
+HANDSHAKE_DELAY = float(os.environ.get('BENCH_HANDSHAKE_DELAY', '0.02'))
+
+
+class FakeUpstream:
+    """Minimal keep-alive HTTP/1.1 server returning a fixed MP3 body"""
+
+    def __init__(self):
+        self.connections = 0
+        self.server = None
+        self.port = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        # Simulate the extra round trips a TLS handshake costs on a new connection
+        await asyncio.sleep(HANDSHAKE_DELAY)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: audio/mpeg\r\n"
+                    b"Content-Length: " + str(len(FAKE_AUDIO)).encode() + b"\r\n"
+                    b"Connection: keep-alive\r\n\r\n" + FAKE_AUDIO
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def run(label, fire, total, concurrency, upstream):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await fire()
+            latencies.append(time.perf_counter() - start)
+
+    upstream.connections = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<22} total={elapsed:6.2f}s  p50={p50:7.2f}ms  p99={p99:7.2f}ms  "
+          f"connections={upstream.connections}")
+
+
+async def main(total: int, concurrency: int):
+    upstream = FakeUpstream()
+    await upstream.start()
+    base_url = f"http://127.0.0.1:{upstream.port}"
+    os.environ['ELEVENLABS_BASE_URL'] = base_url
+
+    from services import http_clients
+    http_clients.UPSTREAM_BASE_URLS['elevenlabs'] = base_url
+
+    payload = {"text": "Hello and welcome!", "model_id": "eleven_flash_v2_5"}
+    path = "/v1/text-to-speech/EXAVITQu4vr4xnSDxMaL"
+
+    async def per_request_client():
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+            response = await client.post(path, json=payload)
+            response.raise_for_status()
+
+    async def shared_client():
+        response = await http_clients.get_client('elevenlabs').post(path, json=payload)
+        response.raise_for_status()
+
+    print(f"{total} requests, concurrency {concurrency}, "
+          f"simulated handshake {HANDSHAKE_DELAY * 1000:.0f}ms\n")
+    await run("per-request client", per_request_client, total, concurrency, upstream)
+    await http_clients.open_clients()
+    await run("shared pooled client", shared_client, total, concurrency, upstream)
+    await http_clients.close_clients()
+    await upstream.stop()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(total, concurrency))
@@ -4,7 +4,7 @@ Stores metadata for section-based audio caching system
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -27,8 +27,10 @@ class AudioCacheEntry(BaseModel):
     speaker_b: str  # Second speaker name (lowercased)
     audio_path: str  # Relative path to audio file: /audio-cache/{language}/{location}/{cache_key}.mp3
     dialogue_timestamps: List[DialogueTimestamp]
-    duration: int  # Total duration in milliseconds
+    duration: int  # Total duration in milliseconds (from MP3 frame headers)
     file_size: int  # Size in bytes
+    content_hash: Optional[str] = None  # sha256 of the audio file (strong ETag)
+    pinned: bool = False  # Exempt from eviction (bundled lessons)
     created_at: datetime = Field(default_factory=lambda: datetime.utcnow())
     
     class Config:
@@ -68,3 +70,50 @@ class GenerateSectionRequest(BaseModel):
     speaker_a: str
     speaker_b: str
     dialogue_lines: List[dict]  # Array of {text, spokenText, speakerId, emotion}
+    pin: bool = False  # Store the section as pinned (never evicted)
+
+
+class PinSectionsRequest(BaseModel):
+    """Pin or unpin cached sections (cache keys or aliases, all variants)"""
+    cache_keys: List[str]
+    pinned: bool = True
+
+
+class PrewarmRequest(BaseModel):
+    """Run a cache pre-warm pass now, optionally overriding its upstream budget"""
+    max_scripts: Optional[int] = None
+    max_sections: Optional[int] = None
+    max_chars: Optional[int] = None
+    dry_run: bool = False  # Only report what would be generated
+
+
+class GenerationJobAccepted(BaseModel):
+    """202 response for a section queued for background generation"""
+    job_id: str
+    cache_key: str
+    status: str  # queued, running, succeeded, failed
+    status_url: str  # Poll: GET /api/audio/jobs/{job_id}
+    events_url: str  # Subscribe: GET /api/audio/jobs/{job_id}/events (SSE)
+
+
+class LessonSectionRequest(BaseModel):
+    """One section of a lesson to resolve"""
+    section_type: str
+    dialogue_lines: Optional[List[dict]] = None  # Needed only to generate a miss
+
+
+class ResolveLessonRequest(BaseModel):
+    """Request to resolve all sections of a lesson in one call"""
+    language: str
+    location: str
+    speaker_a: str
+    speaker_b: str
+    sections: List[LessonSectionRequest]
+    generate_missing: bool = False  # Generate misses (with dialogue_lines) in parallel
+
+
+class ResolveLessonResponse(BaseModel):
+    """Cached (or newly generated) sections in lesson order, plus what is still missing"""
+    hits: List[AudioCacheResponse]
+    misses: List[str]  # Cache keys not available
+    errors: Dict[str, str] = {}  # Cache key -> generation error
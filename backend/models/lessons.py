@@ -0,0 +1,12 @@
+"""
+Lesson Build Models
+"""
+
+from pydantic import BaseModel
+
+
+class BuildLessonRequest(BaseModel):
+    """Generate a lesson script and its section audio in one pipelined call"""
+    config: dict  # language, location, situation, difficulty (as for /api/generate-dialogue)
+    speaker_a: str
+    speaker_b: str
@@ -0,0 +1,53 @@
+"""
+Pre-warm the section audio cache from the command line
+
+Runs one pass in this process, against the same MongoDB and storage as the
+server (MONGO_URL, DB_NAME, AUDIO_STORAGE_ROOT), generating uncovered
+catalog sections most requested first within the given budget.
+
+Usage:
+    cd backend && python prewarm_cache.py --report
+    cd backend && python prewarm_cache.py [--max-scripts N] [--max-sections N] [--max-chars N] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+
+from routes.audio_cache import access_tracker, cache_prewarmer
+from services.http_clients import close_clients, open_clients
+
+
+async def main(args) -> None:
+    if args.report:
+        print(json.dumps(await cache_prewarmer.coverage(args.top), indent=2, ensure_ascii=False))
+        return
+
+    budget = {
+        name: value for name, value in (
+            ('scripts', args.max_scripts),
+            ('sections', args.max_sections),
+            ('chars', args.max_chars),
+        ) if value is not None
+    }
+    await open_clients()
+    try:
+        result = await cache_prewarmer.run_once(budget, dry_run=args.dry_run)
+    finally:
+        await access_tracker.flush()
+        await close_clients()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    coverage = await cache_prewarmer.coverage(top=0)
+    print(f"Coverage: {coverage['sections_cached']}/{coverage['sections_total']} sections ({coverage['coverage']:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm the section audio cache")
+    parser.add_argument('--report', action='store_true', help="Only print the coverage report")
+    parser.add_argument('--top', type=int, default=20, help="Gaps listed in the report")
+    parser.add_argument('--max-scripts', type=int)
+    parser.add_argument('--max-sections', type=int)
+    parser.add_argument('--max-chars', type=int)
+    parser.add_argument('--dry-run', action='store_true')
+    asyncio.run(main(parser.parse_args()))
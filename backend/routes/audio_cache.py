@@ -7,12 +7,17 @@ Handles section-based audio caching with 3-tier architecture:
 """
 
 import os
+import asyncio
+import anyio
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
+import logging
 
 # Load environment variables
 load_dotenv()
@@ -21,13 +26,52 @@ from models.audio_cache import (
     AudioCacheEntry,
     AudioCacheResponse,
     GenerateSectionRequest,
-    DialogueTimestamp
+    DialogueTimestamp,
+    ResolveLessonRequest,
+    ResolveLessonResponse,
+    GenerationJobAccepted,
+    PinSectionsRequest,
+    PrewarmRequest
 )
-from services.cache_key_generator import generate_cache_key, get_audio_file_path
-from services.elevenlabs_dialogue import generate_dialogue_audio
+from services.cache_key_generator import (
+    cache_key_hash,
+    generate_cache_key,
+    generate_content_key,
+    get_audio_file_path,
+    is_content_key,
+    parse_cache_key
+)
+from services.elevenlabs_dialogue import (
+    stream_dialogue_audio,
+    DialogueTiming,
+    section_content_hash,
+    voice_alias,
+    mentions_speaker_names
+)
+from services.audio_storage import AtomicAudioWriter
+from services.tts_cache import tts_cache
+from services.metadata_cache import metadata_cache, MISSING, METADATA_ALIAS_TTL
+from services.http_conditional import (
+    RangeNotSatisfiable,
+    http_date,
+    if_range_matches,
+    is_not_modified,
+    make_etag,
+    parse_range
+)
+from services.generation_jobs import generation_jobs, QueueFull
+from services.single_flight import SingleFlight
+from services.sse import sse_event, sse_keepalive, SSE_HEADERS, SSE_KEEPALIVE_INTERVAL
+from services.upstream_limiter import LimiterTimeout
+from services.resilience import CircuitOpen
+from services.generation_lease import GenerationLease, LEASE_POLL_INTERVAL
+from services.cache_gc import CacheGarbageCollector
+from services.access_tracker import AccessTracker
+from services.cache_prewarm import CachePrewarmer
 
 
 router = APIRouter(prefix="/api/audio", tags=["audio-cache"])
+logger = logging.getLogger(__name__)
 
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -36,6 +80,229 @@ DB_NAME = os.environ.get('DB_NAME', 'languageapp')
 mongo_client = AsyncIOMotorClient(MONGO_URL)
 db = mongo_client[DB_NAME]
 
+# Directory that audio_path values (/audio-cache/...) are relative to
+AUDIO_STORAGE_ROOT = os.environ.get('AUDIO_STORAGE_ROOT', '/app/backend')
+
+# Content keys (.v2-{hash}) never change; an alias moves to each new variant,
+# so clients revalidate it (cheap 304 via the ETag) instead of keeping it
+CONTENT_KEY_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ALIAS_CACHE_CONTROL = "no-cache"
+
+# How long a request waits on another worker's in-progress generation
+GENERATION_LEASE_WAIT = float(os.environ.get('GENERATION_LEASE_WAIT', '300'))
+
+# One generation per cache_key: in this process, and across workers/hosts
+generation_flight = SingleFlight()
+generation_lease = GenerationLease(db.generation_leases)
+
+# Hit counts and last access per entry (eviction and pre-warm priority), written behind
+access_tracker = AccessTracker(db.audio_cache)
+
+# Keeps the audio cache within AUDIO_CACHE_BUDGET_MB and reconciles files/documents
+cache_gc = CacheGarbageCollector(
+    db.audio_cache,
+    AUDIO_STORAGE_ROOT,
+    on_remove=metadata_cache.invalidate
+)
+
+# Fills uncovered catalog sections off-peak, most requested lessons first
+cache_prewarmer = CachePrewarmer(
+    db.audio_cache,
+    lambda section: get_or_generate_section(GenerateSectionRequest(**section))
+)
+
+# Indexes ensured at startup
+AUDIO_CACHE_INDEXES = [
+    # Every lookup is by cache_key; unique also rejects duplicate inserts from racing generators
+    IndexModel([("cache_key", ASCENDING)], name="cache_key_unique", unique=True),
+    # Alias lookups (legacy/human-readable keys) want the newest variant
+    IndexModel([("alias", ASCENDING), ("created_at", DESCENDING)], name="alias_created_at"),
+    # Voice-level dedup: same script for another speaker pair, or same voices for an alias
+    IndexModel([("script_hash", ASCENDING)], name="script_hash"),
+    IndexModel([("voice_alias", ASCENDING), ("created_at", DESCENDING)], name="voice_alias_created_at"),
+    # Cache GC: is a file still referenced, and which files in a directory are
+    IndexModel([("audio_path", ASCENDING)], name="audio_path"),
+    # Lesson/stat queries filter or group by language → location → section
+    IndexModel(
+        [("language", ASCENDING), ("location", ASCENDING), ("section_type", ASCENDING)],
+        name="language_location_section"
+    ),
+]
+GENERATION_LEASE_INDEXES = [
+    # Let MongoDB reap abandoned leases (stale ones are also taken over on acquire)
+    IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+]
+
+
+async def ensure_indexes() -> None:
+    """
+    Create the audio_cache and generation_leases indexes if missing
+    
+    Called once at startup. Existing duplicate cache_key documents (left
+    by racing generators before the unique index existed) are collapsed to
+    the oldest one so the unique index can be built.
+    """
+    try:
+        await db.audio_cache.create_indexes(AUDIO_CACHE_INDEXES)
+    except (DuplicateKeyError, OperationFailure) as e:
+        if getattr(e, 'code', None) != 11000:
+            raise
+        removed = await _remove_duplicate_entries()
+        logger.warning(f"Removed {removed} duplicate audio_cache entries before indexing")
+        await db.audio_cache.create_indexes(AUDIO_CACHE_INDEXES)
+    
+    await db.generation_leases.create_indexes(GENERATION_LEASE_INDEXES)
+
+
+async def _remove_duplicate_entries() -> int:
+    """Keep the oldest document per cache_key, delete the rest"""
+    pipeline = [
+        {"$sort": {"created_at": 1}},
+        {"$group": {"_id": "$cache_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    removed = 0
+    async for group in db.audio_cache.aggregate(pipeline, allowDiskUse=True):
+        result = await db.audio_cache.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+
+def get_full_audio_path(audio_path: str) -> str:
+    """Resolve a stored audio_path to its location on disk"""
+    return f"{AUDIO_STORAGE_ROOT}{audio_path}"
+
+
+async def find_cache_entry(cache_key: str, fresh: bool = False) -> Optional[dict]:
+    """
+    Look up a cache entry, answering from the in-process metadata cache when possible
+    
+    Entries are immutable once written, so a hit costs no database round trip.
+    Pass fresh=True to skip the cache (e.g. while waiting on another worker).
+    """
+    if not fresh:
+        cached = metadata_cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+    
+    entry = await db.audio_cache.find_one(
+        {"cache_key": cache_key},
+        {"_id": 0}
+    )
+    
+    if entry:
+        metadata_cache.put(cache_key, entry)
+    else:
+        metadata_cache.put_negative(cache_key)
+    return entry
+
+
+async def resolve_cache_entries(cache_keys: List[str]) -> Dict[str, dict]:
+    """
+    Look up many cache entries at once, deduplicating by voice
+    
+    Keys the metadata cache can answer cost nothing; the rest are fetched
+    with one query per key kind:
+    - content keys match exactly, or any entry with the same script hash
+      (the hash covers voice IDs, not names, so that audio is byte-identical)
+    - aliases match their newest variant, or failing that the newest entry
+      for the same voices whose script does not mention speaker names
+    
+    Content-key results are immutable and cached; found aliases are cached for
+    METADATA_ALIAS_TTL seconds, since a new script variant can appear at any
+    time (storing one here invalidates its alias at once; other workers see it
+    when the TTL runs out). Misses are cached negatively.
+    
+    Returns:
+        Mapping of requested key -> entry for the keys that resolved
+    """
+    found = {}
+    content_keys = []
+    aliases = []
+    for key in dict.fromkeys(cache_keys):
+        cached = metadata_cache.get(key)
+        if cached is MISSING:
+            (content_keys if is_content_key(key) else aliases).append(key)
+        elif cached:
+            found[key] = cached
+    
+    if content_keys:
+        by_hash = {cache_key_hash(key): key for key in content_keys}
+        cursor = db.audio_cache.find(
+            {"$or": [{"cache_key": {"$in": content_keys}}, {"script_hash": {"$in": list(by_hash)}}]},
+            {"_id": 0}
+        ).sort("created_at", DESCENDING)
+        async for entry in cursor:
+            key = entry['cache_key'] if entry['cache_key'] in content_keys else by_hash.get(entry.get('script_hash'))
+            if key and (key not in found or entry['cache_key'] == key):
+                found[key] = entry
+        for key in content_keys:
+            if key in found:
+                metadata_cache.put(key, found[key])
+    
+    if aliases:
+        by_voice: Dict[str, List[str]] = {}
+        for alias in aliases:
+            voices = _alias_voice_alias(alias)
+            if voices:
+                by_voice.setdefault(voices, []).append(alias)
+        clauses = [{"cache_key": {"$in": aliases}}, {"alias": {"$in": aliases}}]
+        if by_voice:
+            clauses.append({"voice_alias": {"$in": list(by_voice)}, "mentions_speakers": False})
+        
+        shared = {}
+        cursor = db.audio_cache.find({"$or": clauses}, {"_id": 0}).sort("created_at", DESCENDING)
+        async for entry in cursor:
+            own = [key for key in (entry.get('alias'), entry['cache_key']) if key in aliases]
+            if own:
+                found.setdefault(own[0], entry)
+            elif entry.get('mentions_speakers') is False:
+                for alias in by_voice.get(entry.get('voice_alias'), []):
+                    shared.setdefault(alias, entry)
+        for alias, entry in shared.items():
+            found.setdefault(alias, entry)
+        for alias in aliases:
+            if alias in found:
+                metadata_cache.put(alias, found[alias], ttl=METADATA_ALIAS_TTL)
+    
+    for key in content_keys + aliases:
+        if key not in found:
+            metadata_cache.put_negative(key)
+    
+    return found
+
+
+def _alias_voice_alias(alias: str) -> Optional[str]:
+    """Voice alias for an alias key, or None if the key cannot be parsed"""
+    try:
+        parts = parse_cache_key(alias)
+    except ValueError:
+        return None
+    return voice_alias(
+        parts['language'], parts['section_type'], parts['location'],
+        parts['speaker_a'], parts['speaker_b']
+    )
+
+
+async def resolve_cache_entry(cache_key: str) -> Optional[dict]:
+    """Single-key resolve_cache_entries"""
+    return (await resolve_cache_entries([cache_key])).get(cache_key)
+
+
+def section_cache_key(
+    language: str,
+    section_type: str,
+    location: str,
+    speaker_a: str,
+    speaker_b: str,
+    dialogue_lines: Optional[List[dict]]
+) -> str:
+    """Content key when the script is known, otherwise the alias"""
+    alias = generate_cache_key(language, section_type, location, speaker_a, speaker_b)
+    if not dialogue_lines:
+        return alias
+    return generate_content_key(alias, section_content_hash(dialogue_lines, speaker_a, speaker_b))
+
 
 @router.get("/section/{cache_key}", response_model=AudioCacheResponse)
 async def get_cached_section(cache_key: str):
@@ -46,60 +313,117 @@ async def get_cached_section(cache_key: str):
         - 200: Audio metadata if found
         - 404: Not found in cache
     """
-    # Look up in MongoDB
-    cache_entry = await db.audio_cache.find_one(
-        {"cache_key": cache_key},
-        {"_id": 0}
-    )
+    # Look up in metadata cache, then MongoDB (an alias resolves to its newest variant)
+    cache_entry = await resolve_cache_entry(cache_key)
     
     if not cache_entry:
         raise HTTPException(status_code=404, detail="Audio not found in cache")
     
-    # Construct full audio URL
-    # For local development, use the backend URL
-    backend_url = os.environ.get('BACKEND_URL', 'http://localhost:8001')
-    audio_url = f"{backend_url}/api/audio/file/{cache_key}"
-    
-    return AudioCacheResponse(
-        cache_key=cache_entry['cache_key'],
-        audio_url=audio_url,
-        timestamps=cache_entry['dialogue_timestamps'],
-        duration=cache_entry['duration'],
-        is_cached=True
-    )
+    return _cached_response(cache_entry)
 
 
 @router.get("/file/{cache_key}")
-async def download_audio_file(cache_key: str):
+async def download_audio_file(
+    cache_key: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
     """
     Download the actual audio file
     
-    Returns the MP3 file for streaming/download
+    Returns the MP3 file for streaming/download. Supports:
+    - Range requests (206 + Content-Range, 416 when unsatisfiable) for seeking/resume
+    - Strong ETags + If-None-Match / If-Modified-Since (304) for device-cache revalidation
+    - If-Range, so a resumed download never mixes two versions of a file
+    
+    Content keys are cacheable for a year; aliases must be revalidated,
+    since they move to a new variant when the section is regenerated.
     """
-    # Look up file path in MongoDB
-    cache_entry = await db.audio_cache.find_one(
-        {"cache_key": cache_key},
-        {"_id": 0, "audio_path": 1}
-    )
+    # Look up file path in metadata cache, then MongoDB
+    cache_entry = await resolve_cache_entry(cache_key)
     
     if not cache_entry:
         raise HTTPException(status_code=404, detail="Audio file not found")
     
-    audio_path = cache_entry['audio_path']
-    full_path = f"/app/backend{audio_path}"
+    full_path = get_full_audio_path(cache_entry['audio_path'])
     
-    if not os.path.exists(full_path):
+    try:
+        stat_result = await asyncio.to_thread(os.stat, full_path)
+    except OSError:
+        # Evicted or reconciled away since it was cached in this process
+        metadata_cache.invalidate(cache_key)
         raise HTTPException(status_code=404, detail="Audio file missing from storage")
     
-    return FileResponse(
-        full_path,
+    file_size = stat_result.st_size
+    # Tag the resolved variant, so an alias's ETag changes when it moves
+    etag = make_etag(cache_entry['cache_key'], file_size, cache_entry.get('content_hash'))
+    headers = {
+        "Cache-Control": CONTENT_KEY_CACHE_CONTROL if is_content_key(cache_key) else ALIAS_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": http_date(stat_result.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+    
+    if is_not_modified(etag, stat_result.st_mtime, if_none_match, if_modified_since):
+        access_tracker.record(cache_entry['cache_key'])
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = None
+    if if_range_matches(if_range, etag, stat_result.st_mtime):
+        try:
+            byte_range = parse_range(range_header, file_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{file_size}"}
+            )
+    
+    # Streamed manually (not FileResponse) so a Range we chose to ignore
+    # (multi-range, malformed, stale If-Range) really yields the full file
+    status_code = 200
+    start, end = 0, file_size - 1
+    if byte_range is not None:
+        status_code = 206
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    # A play starts at byte 0; later ranges are seeks/resumes of the same play
+    if start == 0:
+        access_tracker.record(cache_entry['cache_key'])
+    
+    return StreamingResponse(
+        _read_file_range(full_path, start, end),
+        status_code=status_code,
         media_type="audio/mpeg",
-        headers={"Cache-Control": "public, max-age=31536000"}  # Cache for 1 year
+        headers=headers
     )
 
 
-@router.post("/section/generate", response_model=AudioCacheResponse)
-async def generate_section_audio(request: GenerateSectionRequest):
+async def _read_file_range(path: str, start: int, end: int, chunk_size: int = 64 * 1024):
+    """Yield bytes start..end (inclusive) of a file without blocking the event loop"""
+    async with await anyio.open_file(path, 'rb') as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.post(
+    "/section/generate",
+    response_model=AudioCacheResponse,
+    responses={202: {"model": GenerationJobAccepted}}
+)
+async def generate_section_audio(
+    request: GenerateSectionRequest,
+    mode: str = Query("sync", pattern="^(sync|async)$")
+):
     """
     Generate section audio or return from cache if exists
     
@@ -107,94 +431,452 @@ async def generate_section_audio(request: GenerateSectionRequest):
     1. Checks if audio already exists in cache
     2. If yes: returns cached version
     3. If no: generates via ElevenLabs, caches it, returns it
+    
+    With mode=async a miss is queued instead: the response is 202 with a
+    job id to poll (GET /api/audio/jobs/{id}) or subscribe to over SSE
+    (GET /api/audio/jobs/{id}/events).
+    
+    Concurrent requests for the same uncached section share one generation:
+    in-process via single-flight, across workers via a MongoDB lease.
     """
-    # Generate cache key
-    cache_key = generate_cache_key(
+    # Content key: changes whenever the script, voices or model settings change
+    cache_key = section_cache_key(
         request.language,
         request.section_type,
         request.location,
         request.speaker_a,
-        request.speaker_b
+        request.speaker_b,
+        request.dialogue_lines
     )
     
     # Check if already cached
-    existing = await db.audio_cache.find_one(
-        {"cache_key": cache_key},
-        {"_id": 0}
-    )
+    existing = await resolve_cache_entry(cache_key)
     
     if existing:
-        # Return cached version
-        backend_url = os.environ.get('BACKEND_URL', 'http://localhost:8001')
-        audio_url = f"{backend_url}/api/audio/file/{cache_key}"
-        
-        return AudioCacheResponse(
-            cache_key=cache_key,
-            audio_url=audio_url,
-            timestamps=existing['dialogue_timestamps'],
-            duration=existing['duration'],
-            is_cached=True
+        return _cached_response(existing)
+    
+    cache_prewarmer.record_demand(request.language, request.location, request.speaker_a, request.speaker_b)
+    
+    if not request.dialogue_lines:
+        raise HTTPException(status_code=422, detail="dialogue_lines are required to generate a section")
+    
+    if mode == "async":
+        return _queue_generation_job(cache_key, request)
+    
+    try:
+        return await generate_section(cache_key, request)
+    except (HTTPException, LimiterTimeout, CircuitOpen):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate audio: {str(e)}"
         )
+
+
+async def get_or_generate_section(request: GenerateSectionRequest) -> AudioCacheResponse:
+    """Serve a section from the cache, generating it on a miss (same keys as the generate endpoint)"""
+    cache_key = section_cache_key(
+        request.language,
+        request.section_type,
+        request.location,
+        request.speaker_a,
+        request.speaker_b,
+        request.dialogue_lines
+    )
+    existing = await resolve_cache_entry(cache_key)
+    if existing:
+        return _cached_response(existing)
+    return await generate_section(cache_key, request)
+
+
+async def generate_section(cache_key: str, request: GenerateSectionRequest) -> AudioCacheResponse:
+    """
+    Generate one section, deduplicated within and across workers
+    
+    In-process, requests are joined by script hash, so speaker pairs sharing
+    voices also share one generation; across workers the lease is per cache_key.
+    """
+    return await generation_flight.do(
+        cache_key_hash(cache_key) or cache_key,
+        lambda: _generate_under_lease(cache_key, request)
+    )
+
+
+def _queue_generation_job(cache_key: str, request: GenerateSectionRequest) -> JSONResponse:
+    """Queue a background generation and answer 202 Accepted with its job id"""
+    async def work():
+        response = await generate_section(cache_key, request)
+        return response.model_dump()
     
-    # Generate new audio
     try:
-        audio_bytes, timestamps = await generate_dialogue_audio(
-            dialogue_lines=request.dialogue_lines,
-            speaker_a=request.speaker_a,
-            speaker_b=request.speaker_b,
-            language=request.language
+        job = generation_jobs.submit(cache_key, work)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    accepted = GenerationJobAccepted(
+        job_id=job.id,
+        cache_key=cache_key,
+        status=job.status,
+        status_url=f"/api/audio/jobs/{job.id}",
+        events_url=f"/api/audio/jobs/{job.id}/events"
+    )
+    return JSONResponse(
+        status_code=202,
+        content=accepted.model_dump(),
+        headers={"Location": accepted.status_url}
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Poll a background generation job"""
+    job = generation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str):
+    """
+    Server-Sent Events for a background generation job
+    
+    Emits one event per status change (queued, running, succeeded, failed)
+    and closes after the final one. A keep-alive comment is sent every
+    SSE_KEEPALIVE_INTERVAL seconds while the job is idle.
+    """
+    job = generation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_status = None
+        while True:
+            changed = job.changed
+            if job.status != last_status:
+                last_status = job.status
+                yield sse_event(job.status, job.to_dict())
+            if job.done:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=SSE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield sse_keepalive()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/lesson/resolve", response_model=ResolveLessonResponse)
+async def resolve_lesson(request: ResolveLessonRequest):
+    """
+    Resolve every section of a lesson in one call
+    
+    Computes all cache keys (content keys for sections that carry their
+    dialogue_lines, aliases otherwise), fetches their metadata with one query
+    per key kind (after the in-process metadata cache), and returns the cached
+    sections plus the keys that are missing. With generate_missing=true,
+    misses that include dialogue_lines are generated in parallel.
+    """
+    # Sections with a script resolve by content key, the rest by alias (newest variant)
+    keys = [
+        section_cache_key(
+            request.language,
+            section.section_type,
+            request.location,
+            request.speaker_a,
+            request.speaker_b,
+            section.dialogue_lines
         )
+        for section in request.sections
+    ]
+    entries = await resolve_cache_entries(keys)
+    
+    sections = {key: _cached_response(entry) for key, entry in entries.items()}
+    misses = [key for key in dict.fromkeys(keys) if key not in entries]
+    if misses:
+        cache_prewarmer.record_demand(
+            request.language, request.location, request.speaker_a, request.speaker_b, len(misses)
+        )
+    
+    errors = {}
+    if request.generate_missing and misses:
+        to_generate = {}
+        for key, section in zip(keys, request.sections):
+            if key in misses and section.dialogue_lines and key not in to_generate:
+                to_generate[key] = GenerateSectionRequest(
+                    section_type=section.section_type,
+                    language=request.language,
+                    location=request.location,
+                    speaker_a=request.speaker_a,
+                    speaker_b=request.speaker_b,
+                    dialogue_lines=section.dialogue_lines
+                )
         
-        # Save audio file to local storage
-        audio_path = get_audio_file_path(cache_key, request.language, request.location)
-        full_path = f"/app/backend{audio_path}"
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        
-        # Write audio file
-        with open(full_path, 'wb') as f:
-            f.write(audio_bytes)
-        
-        file_size = len(audio_bytes)
-        
-        # Calculate total duration from timestamps
-        duration_ms = int(timestamps[-1]['end'] * 1000) if timestamps else 0
+        results = await asyncio.gather(
+            *(generate_section(key, req) for key, req in to_generate.items()),
+            return_exceptions=True
+        )
+        for key, result in zip(to_generate, results):
+            if isinstance(result, BaseException):
+                errors[key] = getattr(result, 'detail', None) or str(result)
+            else:
+                sections[key] = result
+                misses.remove(key)
+    
+    # Keep lesson order; a key listed twice is returned once
+    hits = [sections[key] for key in dict.fromkeys(keys) if key in sections]
+    
+    return ResolveLessonResponse(hits=hits, misses=misses, errors=errors)
+
+
+def _cached_response(entry: dict) -> AudioCacheResponse:
+    """Build the API response for an entry already in the cache (counts as a hit)"""
+    access_tracker.record(entry['cache_key'])
+    backend_url = os.environ.get('BACKEND_URL', 'http://localhost:8001')
+    audio_url = f"{backend_url}/api/audio/file/{entry['cache_key']}"
+    
+    return AudioCacheResponse(
+        cache_key=entry['cache_key'],
+        audio_url=audio_url,
+        timestamps=entry['dialogue_timestamps'],
+        duration=entry['duration'],
+        is_cached=True
+    )
+
+
+async def _generate_under_lease(cache_key: str, request: GenerateSectionRequest) -> AudioCacheResponse:
+    """
+    Generate a section once across all workers
+    
+    Holds the MongoDB lease for cache_key while generating. If another worker
+    holds it, polls until that worker's entry appears or its lease goes stale
+    (crashed worker) and can be taken over.
+    """
+    deadline = asyncio.get_running_loop().time() + GENERATION_LEASE_WAIT
+    
+    while True:
+        if await generation_lease.acquire(cache_key):
+            async with generation_lease.hold(cache_key):
+                # The previous holder may have finished just before we got the lease
+                existing = await find_cache_entry(cache_key, fresh=True)
+                if existing:
+                    return _cached_response(existing)
+                return await _generate_and_store(cache_key, request)
         
-        # Store metadata in MongoDB
-        cache_entry = {
-            "cache_key": cache_key,
-            "section_type": request.section_type,
-            "language": request.language,
-            "location": request.location,
-            "speaker_a": request.speaker_a,
-            "speaker_b": request.speaker_b,
-            "audio_path": audio_path,
-            "dialogue_timestamps": timestamps,
-            "duration": duration_ms,
-            "file_size": file_size,
-            "created_at": datetime.utcnow()
-        }
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=503,
+                detail="Section is being generated by another worker, retry shortly"
+            )
         
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+        existing = await find_cache_entry(cache_key, fresh=True)
+        if existing:
+            return _cached_response(existing)
+
+
+async def _generate_and_store(cache_key: str, request: GenerateSectionRequest) -> AudioCacheResponse:
+    """Call ElevenLabs, stream the audio to disk and store its metadata"""
+    audio_path = get_audio_file_path(cache_key, request.language, request.location)
+    full_path = get_full_audio_path(audio_path)
+    
+    # Chunks go straight to a temp file (hashed/sized on the fly) that is
+    # fsynced and renamed into place only once the whole section arrived;
+    # line timing and frame counts are collected from the same stream
+    timing = DialogueTiming()
+    async with AtomicAudioWriter(full_path) as writer:
+        async for chunk in stream_dialogue_audio(
+            dialogue_lines=request.dialogue_lines,
+            speaker_a=request.speaker_a,
+            speaker_b=request.speaker_b,
+            language=request.language,
+            timing=timing
+        ):
+            await writer.write(chunk)
+        if not timing.frames.frames:
+            # Never cache a silent/empty section; the temp file is discarded
+            raise ValueError("Generated section contains no audio")
+        await writer.commit()
+    
+    file_size = writer.size
+    timestamps = timing.timestamps(request.dialogue_lines)
+    
+    # Exact duration from the MP3 frame headers (estimate only if none parsed)
+    duration_ms = timing.duration_ms
+    if not duration_ms and timestamps:
+        duration_ms = int(timestamps[-1]['end'] * 1000)
+    
+    # Store metadata in MongoDB
+    cache_entry = {
+        "cache_key": cache_key,
+        "alias": generate_cache_key(
+            request.language, request.section_type, request.location,
+            request.speaker_a, request.speaker_b
+        ),
+        "script_hash": section_content_hash(
+            request.dialogue_lines, request.speaker_a, request.speaker_b
+        ),
+        "voice_alias": voice_alias(
+            request.language, request.section_type, request.location,
+            request.speaker_a, request.speaker_b
+        ),
+        "mentions_speakers": mentions_speaker_names(
+            request.dialogue_lines, request.speaker_a, request.speaker_b
+        ),
+        "section_type": request.section_type,
+        "language": request.language,
+        "location": request.location,
+        "speaker_a": request.speaker_a,
+        "speaker_b": request.speaker_b,
+        "audio_path": audio_path,
+        "dialogue_timestamps": timestamps,
+        "duration": duration_ms,
+        "file_size": file_size,
+        "content_hash": writer.content_hash,
+        "pinned": request.pin,
+        "created_at": datetime.utcnow()
+    }
+    
+    try:
         await db.audio_cache.insert_one(cache_entry)
+    except DuplicateKeyError:
+        # Another generator won the race; serve its entry
+        existing = await find_cache_entry(cache_key, fresh=True)
+        if existing:
+            return _cached_response(existing)
+        raise
+    metadata_cache.put(cache_key, cache_entry)
+    # The alias now resolves to this newer variant
+    metadata_cache.invalidate(cache_entry["alias"])
+    
+    # Return response
+    backend_url = os.environ.get('BACKEND_URL', 'http://localhost:8001')
+    audio_url = f"{backend_url}/api/audio/file/{cache_key}"
+    
+    return AudioCacheResponse(
+        cache_key=cache_key,
+        audio_url=audio_url,
+        timestamps=timestamps,
+        duration=duration_ms,
+        is_cached=False  # Newly generated
+    )
+
+
+async def migrate_cache_keys() -> dict:
+    """
+    Move entries written before content keys existed onto content keys
+    
+    The content hash is rebuilt from the stored timestamps (their text is the
+    spoken text and speaker_id picks the voice), which is exactly what the
+    audio was generated from. The alias is recomputed from the stored fields
+    so legacy names with underscores get the normalized alias. Entries that
+    already have content keys only get the voice-dedup fields backfilled.
+    
+    Returns:
+        Counts of migrated, merged (content key already taken), backfilled
+        and skipped entries
+    """
+    migrated = merged = backfilled = skipped = 0
+    cursor = db.audio_cache.find(
+        {"$or": [{"alias": {"$exists": False}}, {"voice_alias": {"$exists": False}}]}
+    )
+    async for entry in cursor:
+        lines = [
+            {"text": ts["text"], "speakerId": ts.get("speaker_id", 1)}
+            for ts in entry.get("dialogue_timestamps") or []
+        ]
+        if not lines:
+            skipped += 1
+            continue
         
-        # Return response
-        backend_url = os.environ.get('BACKEND_URL', 'http://localhost:8001')
-        audio_url = f"{backend_url}/api/audio/file/{cache_key}"
-        
-        return AudioCacheResponse(
-            cache_key=cache_key,
-            audio_url=audio_url,
-            timestamps=timestamps,
-            duration=duration_ms,
-            is_cached=False  # Newly generated
-        )
+        speakers = (entry["speaker_a"], entry["speaker_b"])
+        voice_fields = {
+            "voice_alias": voice_alias(entry["language"], entry["section_type"], entry["location"], *speakers),
+            "mentions_speakers": mentions_speaker_names(lines, *speakers),
+        }
+        if entry.get("alias"):
+            await db.audio_cache.update_one({"_id": entry["_id"]}, {"$set": voice_fields})
+            backfilled += 1
+            metadata_cache.invalidate(entry["cache_key"])
+            continue
         
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to generate audio: {str(e)}"
-        )
+        alias = generate_cache_key(entry["language"], entry["section_type"], entry["location"], *speakers)
+        script_hash = section_content_hash(lines, *speakers)
+        fields = dict(voice_fields, alias=alias, script_hash=script_hash)
+        try:
+            await db.audio_cache.update_one(
+                {"_id": entry["_id"]},
+                {"$set": dict(fields, cache_key=generate_content_key(alias, script_hash))}
+            )
+            migrated += 1
+        except DuplicateKeyError:
+            # Same content already stored under its content key; keep the old key too
+            await db.audio_cache.update_one({"_id": entry["_id"]}, {"$set": fields})
+            merged += 1
+        metadata_cache.invalidate(entry["cache_key"])
+    
+    return {"migrated": migrated, "merged": merged, "backfilled": backfilled, "skipped": skipped}
+
+
+@router.post("/cache/migrate-keys")
+async def migrate_cache_keys_endpoint():
+    """
+    Backfill content keys, aliases, script hashes and voice aliases for legacy entries (admin endpoint)
+    Safe to run repeatedly; only entries missing those fields are touched
+    """
+    result = await migrate_cache_keys()
+    logger.info(f"Cache key migration: {result}")
+    return result
+
+
+@router.post("/cache/pin")
+async def pin_sections(request: PinSectionsRequest):
+    """
+    Pin (or unpin) cached sections so eviction never removes them (admin endpoint)
+    An alias pins every script variant stored under it
+    """
+    result = await db.audio_cache.update_many(
+        {"$or": [
+            {"cache_key": {"$in": request.cache_keys}},
+            {"alias": {"$in": request.cache_keys}},
+        ]},
+        {"$set": {"pinned": request.pinned}}
+    )
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+@router.post("/cache/gc")
+async def run_cache_gc():
+    """
+    Run one eviction + reconciliation pass now (admin endpoint)
+    The same pass runs in the background every AUDIO_CACHE_GC_INTERVAL seconds
+    """
+    return await cache_gc.run_once()
+
+
+@router.post("/cache/prewarm")
+async def run_cache_prewarm(request: PrewarmRequest = PrewarmRequest()):
+    """
+    Run one pre-warm pass now (admin endpoint)
+    Generates uncovered catalog sections, most requested lessons first, within
+    the given budget (default: the per-window budget). The same pass runs in
+    the background during PREWARM_WINDOW.
+    """
+    budget = {
+        name: value for name, value in (
+            ('scripts', request.max_scripts),
+            ('sections', request.max_sections),
+            ('chars', request.max_chars),
+        ) if value is not None
+    }
+    return await cache_prewarmer.run_once(budget, dry_run=request.dry_run)
+
+
+@router.get("/cache/coverage")
+async def get_cache_coverage(top: int = Query(20, ge=0, le=500)):
+    """Share of the pre-warm catalog that is cached, and the most requested gaps"""
+    return await cache_prewarmer.coverage(top)
 
 
 @router.delete("/cache/clear")
@@ -205,7 +887,7 @@ async def clear_cache():
     """
     # Delete all files
     import shutil
-    cache_dir = "/app/backend/audio-cache"
+    cache_dir = os.path.join(AUDIO_STORAGE_ROOT, "audio-cache")
     
     if os.path.exists(cache_dir):
         shutil.rmtree(cache_dir)
@@ -213,6 +895,7 @@ async def clear_cache():
     
     # Clear MongoDB
     result = await db.audio_cache.delete_many({})
+    metadata_cache.clear()
     
     return {
         "message": "Cache cleared",
@@ -242,5 +925,11 @@ async def get_cache_stats():
         "total_cached_sections": total_count,
         "total_size_bytes": total_size,
         "total_size_mb": round(total_size / (1024 * 1024), 2),
-        "by_language": {item['_id']: item['count'] for item in lang_breakdown}
+        "by_language": {item['_id']: item['count'] for item in lang_breakdown},
+        "tts_cache": tts_cache.stats(),
+        "metadata_cache": metadata_cache.stats(),
+        "generation_jobs": generation_jobs.stats(),
+        "gc": cache_gc.stats(),
+        "access_tracking": access_tracker.stats(),
+        "prewarm": cache_prewarmer.stats()
     }
@@ -0,0 +1,154 @@
+"""
+Lesson Build Routes
+Pipelines script generation into audio generation: the LLM script is
+streamed, and each section is sent to section audio generation (same cache
+keys, single-flight and leases as /api/audio/section/generate) as soon as
+the model moves on to the next section. Sections are reported as they
+become playable, so time-to-first-audio is about one section's synthesis
+instead of the whole script plus all of its audio.
+"""
+
+import os
+import asyncio
+import logging
+from typing import List, Optional
+
+import httpx
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from models.audio_cache import GenerateSectionRequest
+from models.lessons import BuildLessonRequest
+from routes.audio_cache import get_or_generate_section, section_cache_key
+from services.dialogue_script import DialogueLineParser, stream_dialogue_lines
+from services.resilience import DeadlineExceeded
+from services.sse import sse_event, SSE_HEADERS
+
+
+router = APIRouter(prefix="/api/lessons", tags=["lessons"])
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+
+
+@router.post("/build")
+async def build_lesson(request: BuildLessonRequest):
+    """
+    Stream a new lesson: script lines, then each section's audio as it is ready
+    
+    Server-Sent Events:
+    - `line`: a validated script line (as /api/generate-dialogue/stream)
+    - `section`: a section's script is complete and its audio was dispatched
+      ({index, section_type, cache_key, lines})
+    - `audio`: a section is playable ({index, section_type, ...AudioCacheResponse}),
+      in completion order
+    - `audio_error`: a section's audio failed ({index, section_type, cache_key, detail})
+    - `error`: the script stream failed; dispatched sections still finish
+    - `done`: everything finished ({sections, lines, rejected, output_text})
+    
+    A section is complete when the model starts the next one. If the model
+    returns to a section it already finished, those lines become a new
+    section entry (same section_type, next index).
+    """
+    if not OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    language = request.config.get("language", "en")
+    location = request.config.get("location", "coffee_shop")
+    
+    parser = DialogueLineParser()
+    try:
+        lines = await stream_dialogue_lines(request.config, OPENAI_API_KEY, parser)
+    except (httpx.HTTPError, DeadlineExceeded) as e:
+        raise HTTPException(status_code=500, detail=f"OpenAI API request failed: {str(e)}")
+    
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def synthesize(index: int, section_type: str, cache_key: str, dialogue_lines: List[dict]):
+        section = GenerateSectionRequest(
+            section_type=section_type,
+            language=language,
+            location=location,
+            speaker_a=request.speaker_a,
+            speaker_b=request.speaker_b,
+            dialogue_lines=dialogue_lines
+        )
+        try:
+            response = await get_or_generate_section(section)
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            logger.error(f"Lesson build: {cache_key} failed: {detail}")
+            await events.put(sse_event("audio_error", {
+                "index": index, "section_type": section_type, "cache_key": cache_key, "detail": detail
+            }))
+            return
+        await events.put(sse_event("audio", dict(
+            response.model_dump(), index=index, section_type=section_type
+        )))
+    
+    async def produce():
+        tasks: List[asyncio.Task] = []
+        current: Optional[str] = None
+        pending: List[dict] = []
+        
+        async def dispatch():
+            index = len(tasks)
+            section_type = current.lower()
+            dialogue_lines = [
+                {"text": line["text"], "speakerId": line["speakerId"], "emotion": line["emotion"]}
+                for line in pending
+            ]
+            cache_key = section_cache_key(
+                language, section_type, location, request.speaker_a, request.speaker_b, dialogue_lines
+            )
+            await events.put(sse_event("section", {
+                "index": index, "section_type": section_type, "cache_key": cache_key, "lines": dialogue_lines
+            }))
+            tasks.append(asyncio.create_task(synthesize(index, section_type, cache_key, dialogue_lines)))
+        
+        failed = False
+        try:
+            async for line in lines:
+                await events.put(sse_event("line", line))
+                if current is not None and line["segmentType"] != current:
+                    await dispatch()
+                    pending = []
+                current = line["segmentType"]
+                pending.append(line)
+            if pending:
+                await dispatch()
+        except Exception as e:
+            failed = True
+            logger.error(f"Lesson build: script stream failed after {len(parser.lines)} lines: {e}")
+            await events.put(sse_event("error", {"detail": str(e), "lines": len(parser.lines)}))
+        
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if not failed:
+            await events.put(sse_event("done", {
+                "sections": len(tasks),
+                "lines": len(parser.lines),
+                "rejected": parser.rejected,
+                "output_text": parser.text
+            }))
+        await events.put(None)
+    
+    async def stream():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # Client gone: stop reading the script. Section generation that
+            # already started runs on under single-flight and is still cached.
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,14 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import base64
 import httpx
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI()
+from services.http_clients import get_client, open_clients, close_clients
+from services.tts_cache import tts_cache, make_tts_cache_key, TTS_CACHE_ENABLED
+from services.generation_jobs import generation_jobs
+from services.upstream_limiter import get_limiter, limiter_stats, LimiterTimeout
+from services.resilience import get_resilience, resilience_stats, CircuitOpen, DeadlineExceeded
+from services.sse import sse_event, SSE_HEADERS
+from services.dialogue_script import (
+    CHAT_COMPLETIONS_URL, DialogueLineParser, build_dialogue_prompt, build_completion_payload,
+    stream_dialogue_lines, script_cache_key, is_usable_script
+)
+from services.script_cache import script_cache, SCRIPT_CACHE_ENABLED
+from services.elevenlabs_dialogue import (
+    ELEVENLABS_TTS_MODEL, ELEVENLABS_VOICE_SETTINGS, ELEVENLABS_TTS_SETTINGS, DIALOGUE_OUTPUT_FORMAT
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def ensure_database_indexes():
+    """Build MongoDB indexes without holding up startup if the database is slow or down"""
+    try:
+        await ensure_audio_cache_indexes()
+    except Exception as e:
+        logger.error(f"Failed to ensure audio cache indexes: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open upstream clients, ensure indexes, start job workers, cache GC, access tracking, TTS index flushes and pre-warming; clean up on shutdown"""
+    await open_clients()
+    index_task = asyncio.create_task(ensure_database_indexes())
+    await generation_jobs.start()
+    await cache_gc.start()
+    await access_tracker.start()
+    await tts_cache.start()
+    await cache_prewarmer.start()
+    try:
+        yield
+    finally:
+        await cache_prewarmer.stop()
+        await cache_gc.stop()
+        await generation_jobs.stop()
+        # After the workers, so hits served during shutdown are flushed too
+        await access_tracker.stop()
+        await tts_cache.stop()
+        index_task.cancel()
+        await close_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for the frontend
 app.add_middleware(
@@ -19,13 +75,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(LimiterTimeout)
+async def limiter_timeout_handler(request: Request, exc: LimiterTimeout):
+    """Upstream budget exhausted for too long: tell the client to back off"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request: Request, exc: CircuitOpen):
+    """Provider is degraded and being skipped: tell the client to back off"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
 # Import and include audio cache routes
-from routes.audio_cache import router as audio_cache_router
+from routes.audio_cache import router as audio_cache_router, ensure_indexes as ensure_audio_cache_indexes, cache_gc, access_tracker, cache_prewarmer
 app.include_router(audio_cache_router)
 
+from routes.lessons import router as lessons_router
+app.include_router(lessons_router)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
+# Chunk size used when streaming cached audio back to the client
+TTS_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Deadline for one /api/tts call, shared by retries, hedges and provider fallback
+TTS_REQUEST_DEADLINE = float(os.getenv("TTS_REQUEST_DEADLINE", "30"))
+
+# Share of the remaining deadline the requested provider gets when a fallback exists
+PRIMARY_DEADLINE_SHARE = 0.6
+
+# Closest voice on the other provider, used when the requested one is degraded
+FALLBACK_VOICES = {
+    "openai": {  # ElevenLabs voice ID → OpenAI voice
+        "EXAVITQu4vr4xnSDxMaL": "nova",     # Bella
+        "onwK4e9ZLuTAKqWW03F9": "onyx",     # Daniel
+        "pNInz6obpgDQGcFmaJgB": "echo",     # Adam
+        "jsCqWAovK2LkecY7zXl4": "shimmer",  # Freya
+        "VR6AewLTigWG4xSOukaG": "onyx",     # Arnold
+        "XB0fDUnXU5powFXDhCwa": "nova",     # Charlotte
+    },
+    "elevenlabs": {  # OpenAI voice → ElevenLabs voice ID
+        "nova": "EXAVITQu4vr4xnSDxMaL",
+        "shimmer": "jsCqWAovK2LkecY7zXl4",
+        "alloy": "XB0fDUnXU5powFXDhCwa",
+        "onyx": "onwK4e9ZLuTAKqWW03F9",
+        "echo": "pNInz6obpgDQGcFmaJgB",
+        "fable": "VR6AewLTigWG4xSOukaG",
+    },
+}
+DEFAULT_FALLBACK_VOICES = {"openai": "alloy", "elevenlabs": "EXAVITQu4vr4xnSDxMaL"}
+
 class TTSRequest(BaseModel):
     text: str
     voice: str
@@ -35,153 +134,359 @@ class DialogueRequest(BaseModel):
     config: dict
 
 @app.post("/api/generate-dialogue")
-async def generate_dialogue(request: DialogueRequest):
+async def generate_dialogue(request: DialogueRequest, response: Response):
     """Proxy OpenAI dialogue generation to avoid CORS issues"""
     
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API key not configured")
     
-    url = "https://api.openai.com/v1/chat/completions"
+    url = CHAT_COMPLETIONS_URL
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENAI_API_KEY}"
     }
     
+    # Serve from the script cache once this prompt's variant pool is full
+    cache_key = script_cache_key(request.config)
+    text = script_cache.get(cache_key) if SCRIPT_CACHE_ENABLED else None
+    if text is not None:
+        response.headers["X-Script-Cache"] = "hit"
+        return dialogue_output(text)
+    
     # Build the prompt based on config
-    config = request.config
-    language = config.get("language", "en")
-    location = config.get("location", "coffee_shop")
-    situation = config.get("situation", "ordering")
-    difficulty = config.get("difficulty", "intermediate")
-    
-    prompt = f"""Generate a language learning lesson dialogue in PIPE-DELIMITED format.
-
-Language: {language}
-Location: {location}
-Situation: {situation}
-Difficulty: {difficulty}
-
-Format each line EXACTLY as: SpeakerID|SegmentType|[emotion]|dialogue text
-
-- SpeakerID: Use "1" for first speaker, "2" for second speaker
-- SegmentType: WELCOME, VOCAB, SLOW, BREAKDOWN, NATURAL, QUIZ, CULTURAL
-- emotion: neutral, happy, curious, friendly, polite
-- Alternate speakers naturally in dialogue sections
-
-Generate a complete lesson with these sections (total ~30-35 lines):
-
-1. WELCOME (5 lines) - Introduction
-   Example: 1|WELCOME|[friendly]|Hello and welcome to our coffee shop lesson!
-   
-2. VOCAB (4-6 lines) - Vocabulary with definitions
-   Example: 1|VOCAB|[neutral]|Coffee - a hot beverage made from roasted beans
-   
-3. SLOW (6-8 lines) - Slow-paced dialogue between speakers
-   Example: 2|SLOW|[polite]|Hello, how can I help you today?
-   Example: 1|SLOW|[friendly]|Hi, I would like to order a coffee please
-   
-4. BREAKDOWN (3-4 lines) - Phrase explanations
-   Example: 1|BREAKDOWN|[neutral]|"I would like" is a polite way to make requests
-   
-5. NATURAL (7-10 lines) - Natural speed dialogue
-   Example: 2|NATURAL|[happy]|Hi there! What can I get for you?
-   Example: 1|NATURAL|[friendly]|Hey! I'll have a large coffee please
-   
-6. QUIZ (4-6 lines) - Questions and answers
-   Example: 1|QUIZ|[curious]|What does 'order' mean in this context?
-   Example: 1|QUIZ|[neutral]|To request food or drink
-   
-7. CULTURAL (2-3 lines) - Cultural notes
-   Example: 1|CULTURAL|[neutral]|In many countries, tipping at coffee shops is customary
-
-IMPORTANT: Output ONLY the pipe-delimited lines, no headers, no extra text."""
-
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {"role": "system", "content": "You are a language learning content generator. Output only the requested format with no additional text."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7
+    prompt = build_dialogue_prompt(request.config)
+    payload = build_completion_payload(prompt)
+    
+    client = get_client("openai")
+    try:
+        async with get_limiter("openai").acquire(chars=len(prompt)):
+            upstream = await client.post(url, headers=headers, json=payload)
+        upstream.raise_for_status()
+        data = upstream.json()
+        
+        # Extract text from ChatGPT response
+        text = data["choices"][0]["message"]["content"]
+    except httpx.HTTPError as e:
+        # A cached variant beats an error, even while the pool is still filling
+        text = script_cache.get_any(cache_key) if SCRIPT_CACHE_ENABLED else None
+        if text is None:
+            raise HTTPException(status_code=500, detail=f"OpenAI API request failed: {str(e)}")
+        response.headers["X-Script-Cache"] = "fallback"
+        return dialogue_output(text)
+    
+    if SCRIPT_CACHE_ENABLED and is_usable_script(text):
+        script_cache.put(cache_key, text)
+    response.headers["X-Script-Cache"] = "miss"
+    return dialogue_output(text)
+
+
+def dialogue_output(text: str) -> dict:
+    """Script text in the response format the frontend expects"""
+    return {
+        "output": [{
+            "content": [{
+                "text": text
+            }]
+        }],
+        "output_text": text
     }
+
+
+@app.get("/api/generate-dialogue/cache/stats")
+async def dialogue_cache_stats():
+    """Script cache hit rate, pool fill and evictions"""
+    return script_cache.stats()
+
+@app.post("/api/generate-dialogue/stream")
+async def generate_dialogue_stream(request: DialogueRequest):
+    """
+    Streaming variant of /api/generate-dialogue (Server-Sent Events)
+    
+    Each pipe-delimited line is parsed and validated as soon as the model
+    finishes writing it and sent as a `line` event
+    ({index, speakerId, segmentType, emotion, text}). A final `done` event
+    carries the line count, rejected lines and the full text in the same
+    shape as the non-streaming endpoint's output_text. Failures before the
+    first token are normal HTTP errors; later ones end the stream with an
+    `error` event.
+    """
+    if not OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    parser = DialogueLineParser()
+    try:
+        lines = await stream_dialogue_lines(request.config, OPENAI_API_KEY, parser)
+    except (LimiterTimeout, CircuitOpen):
+        raise
+    except (httpx.HTTPError, DeadlineExceeded) as e:
+        raise HTTPException(status_code=500, detail=f"OpenAI API request failed: {str(e)}")
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    async def events():
         try:
-            response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract text from ChatGPT response
-            text = data["choices"][0]["message"]["content"]
-            
-            # Return in the format the frontend expects
-            return {
-                "output": [{
-                    "content": [{
-                        "text": text
-                    }]
-                }],
-                "output_text": text
-            }
-        except httpx.HTTPError as e:
-            raise HTTPException(status_code=500, detail=f"OpenAI API request failed: {str(e)}")
+            async for line in lines:
+                yield sse_event("line", line)
+        except Exception as e:
+            logger.error(f"Dialogue stream failed after {len(parser.lines)} lines: {e}")
+            yield sse_event("error", {"detail": str(e), "lines": len(parser.lines)})
+            return
+        yield sse_event("done", {
+            "lines": len(parser.lines),
+            "rejected": parser.rejected,
+            "output_text": parser.text
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
-@app.post("/api/tts")
-async def generate_audio(request: TTSRequest):
-    """Proxy TTS requests to avoid CORS issues"""
+
+def build_tts_upstream_request(request: TTSRequest):
+    """
+    Build the upstream TTS call for a request
     
+    Returns:
+        Tuple of (provider, url, headers, payload, cache_key)
+    """
     if request.provider == "elevenlabs":
         if not ELEVENLABS_API_KEY:
             raise HTTPException(status_code=500, detail="ElevenLabs API key not configured")
         
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{request.voice}?output_format=mp3_44100_128"
+        url = f"/v1/text-to-speech/{request.voice}?output_format={DIALOGUE_OUTPUT_FORMAT}"
         headers = {
             "Content-Type": "application/json",
             "xi-api-key": ELEVENLABS_API_KEY
         }
+        # Same model/settings as the per-line dialogue fallback, so cache entries are shared
+        model = ELEVENLABS_TTS_MODEL
+        voice_settings = ELEVENLABS_VOICE_SETTINGS
+        settings = ELEVENLABS_TTS_SETTINGS
         payload = {
             "text": request.text,
-            "model_id": "eleven_flash_v2_5",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.75,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
+            "model_id": model,
+            "voice_settings": voice_settings
         }
     else:  # OpenAI
         if not OPENAI_API_KEY:
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
         
-        url = "https://api.openai.com/v1/audio/speech"
+        url = "/v1/audio/speech"
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {OPENAI_API_KEY}"
         }
+        model = "tts-1"
+        settings = {"response_format": "mp3"}
         payload = {
-            "model": "tts-1",
+            "model": model,
             "input": request.text,
             "voice": request.voice,
             "response_format": "mp3"
         }
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    provider = "elevenlabs" if request.provider == "elevenlabs" else "openai"
+    cache_key = make_tts_cache_key(provider, request.voice, request.text, model, settings)
+    return provider, url, headers, payload, cache_key
+
+
+def wants_audio_stream(stream: bool, accept: Optional[str]) -> bool:
+    """Binary streaming is selected by ?stream=true or an Accept header asking for audio/mpeg"""
+    if stream:
+        return True
+    return bool(accept) and "audio/mpeg" in accept and "application/json" not in accept
+
+
+async def iter_cached_audio(audio_data: bytes):
+    """Yield cached audio in chunks so hits use the same chunked transfer as misses"""
+    for offset in range(0, len(audio_data), TTS_STREAM_CHUNK_SIZE):
+        yield audio_data[offset:offset + TTS_STREAM_CHUNK_SIZE]
+
+
+def fallback_tts_request(request: TTSRequest) -> Optional[TTSRequest]:
+    """The same text on the other provider with the closest voice, if that provider is configured"""
+    provider = "openai" if request.provider == "elevenlabs" else "elevenlabs"
+    api_key = OPENAI_API_KEY if provider == "openai" else ELEVENLABS_API_KEY
+    if not api_key:
+        return None
+    voice = FALLBACK_VOICES[provider].get(request.voice, DEFAULT_FALLBACK_VOICES[provider])
+    return TTSRequest(text=request.text, voice=voice, provider=provider)
+
+
+async def call_tts_upstream(request: TTSRequest, make_attempt, discard=None):
+    """
+    Run a TTS call with retries, optional hedging and provider fallback
+    
+    The requested provider is tried first under its circuit breaker; if it is
+    open, times out or keeps failing, the call moves to the other provider.
+    All of it fits in TTS_REQUEST_DEADLINE.
+    
+    Args:
+        request: The TTS request as received
+        make_attempt: (provider, url, headers, payload) -> zero-argument coroutine
+            factory performing one upstream call
+        discard: Cleanup for a result that lost a hedge race
+    
+    Returns:
+        Tuple of (result, cache_key) for the provider that answered
+    """
+    candidates = [request]
+    fallback = fallback_tts_request(request)
+    if fallback is not None:
+        candidates.append(fallback)
+    
+    expires = time.monotonic() + TTS_REQUEST_DEADLINE
+    errors = []
+    for index, candidate in enumerate(candidates):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        if index < len(candidates) - 1:
+            remaining *= PRIMARY_DEADLINE_SHARE
+        
+        provider, url, headers, payload, cache_key = build_tts_upstream_request(candidate)
+        try:
+            result = await get_resilience(provider).call(
+                make_attempt(provider, url, headers, payload), remaining, discard, operation="tts"
+            )
+        except (CircuitOpen, DeadlineExceeded, LimiterTimeout, httpx.HTTPError) as e:
+            logger.warning(f"TTS via {provider} failed: {e}")
+            errors.append(e)
+            continue
+        if index > 0:
+            logger.info(f"TTS served by fallback provider {provider}")
+        return result, cache_key
+    
+    if errors and all(isinstance(e, (CircuitOpen, LimiterTimeout)) for e in errors):
+        raise HTTPException(
+            status_code=503,
+            detail="TTS providers are unavailable",
+            headers={"Retry-After": "5"}
+        )
+    detail = str(errors[-1]) if errors else "deadline exceeded"
+    raise HTTPException(status_code=500, detail=f"API request failed: {detail}")
+
+
+async def stream_tts_audio(request: TTSRequest):
+    """
+    Open an upstream TTS stream and relay its chunks as they arrive
+    
+    Opening the stream goes through the same retry/fallback path as the
+    buffered call, and the upstream status is checked before the response
+    starts so failures still surface as a normal HTTP error. A fully relayed
+    result is stored in the TTS cache; an aborted one is discarded. The
+    provider's limiter permit is held until the relay finishes.
+    """
+    def make_attempt(provider, url, headers, payload):
+        client = get_client(provider)
+        
+        async def open_stream():
+            permit = await get_limiter(provider).enter(chars=len(request.text))
+            try:
+                upstream = await client.send(
+                    client.build_request("POST", url, headers=headers, json=payload),
+                    stream=True
+                )
+            except BaseException:
+                permit.release()
+                raise
+            if upstream.is_error:
+                await upstream.aread()
+                await upstream.aclose()
+                permit.release()
+                upstream.raise_for_status()
+            return upstream, permit
+        
+        return open_stream
+    
+    async def discard(opened):
+        upstream, permit = opened
+        await upstream.aclose()
+        permit.release()
+    
+    started = time.perf_counter()
+    (upstream, permit), cache_key = await call_tts_upstream(request, make_attempt, discard)
+    
+    async def relay():
+        chunks = []
         try:
-            response = await client.post(url, headers=headers, json=payload)
+            async for chunk in upstream.aiter_bytes():
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            await upstream.aclose()
+            permit.release()
+        
+        tts_cache.record_upstream_latency(time.perf_counter() - started)
+        if TTS_CACHE_ENABLED:
+            await tts_cache.put(cache_key, b"".join(chunks))
+    
+    return relay()
+
+
+async def fetch_tts_audio(request: TTSRequest) -> bytes:
+    """Synthesize a whole clip (buffered) through the retry/fallback path and cache it"""
+    def make_attempt(provider, url, headers, payload):
+        client = get_client(provider)
+        
+        async def post():
+            async with get_limiter(provider).acquire(chars=len(request.text)):
+                response = await client.post(url, headers=headers, json=payload)
             response.raise_for_status()
-            
-            # Return the audio data as base64
-            import base64
-            audio_data = response.content
-            base64_audio = base64.b64encode(audio_data).decode('utf-8')
-            
-            return {
-                "audio": f"data:audio/mpeg;base64,{base64_audio}",
-                "success": True
-            }
-        except httpx.HTTPError as e:
-            raise HTTPException(status_code=500, detail=f"API request failed: {str(e)}")
+            return response.content
+        
+        return post
+    
+    started = time.perf_counter()
+    audio_data, cache_key = await call_tts_upstream(request, make_attempt)
+    tts_cache.record_upstream_latency(time.perf_counter() - started)
+    
+    if TTS_CACHE_ENABLED:
+        await tts_cache.put(cache_key, audio_data)
+    return audio_data
+
+
+@app.post("/api/tts")
+async def generate_audio(
+    request: TTSRequest,
+    stream: bool = Query(False, description="Stream raw audio/mpeg instead of a base64 JSON payload"),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Proxy TTS requests to avoid CORS issues
+    
+    Default response is JSON with a base64 data URI (backward compatible).
+    With ?stream=true or `Accept: audio/mpeg` the audio is streamed back as
+    chunked audio/mpeg so playback can start before synthesis finishes.
+    """
+    _, _, _, _, cache_key = build_tts_upstream_request(request)
+    
+    # Identical (provider, voice, text, model, settings) → serve without calling upstream
+    audio_data = await tts_cache.get(cache_key) if TTS_CACHE_ENABLED else None
+    
+    if wants_audio_stream(stream, accept):
+        if audio_data is not None:
+            body = iter_cached_audio(audio_data)
+        else:
+            body = await stream_tts_audio(request)
+        return StreamingResponse(body, media_type="audio/mpeg")
+    
+    if audio_data is None:
+        audio_data = await fetch_tts_audio(request)
+    
+    # Return the audio data as base64
+    base64_audio = base64.b64encode(audio_data).decode('utf-8')
+    
+    return {
+        "audio": f"data:audio/mpeg;base64,{base64_audio}",
+        "success": True
+    }
 
 @app.get("/api/health")
 async def health():
     return {"status": "healthy"}
+
+@app.get("/api/upstream/stats")
+async def upstream_stats():
+    """Limiter load/queue wait and breaker/retry/hedge counters per upstream provider"""
+    return {"limiters": limiter_stats(), "resilience": resilience_stats()}
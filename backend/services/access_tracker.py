@@ -0,0 +1,160 @@
+"""
+Write-Behind Access Tracking
+Counts cache hits in memory and flushes them to MongoDB in batches: one
+UpdateOne per entry with `$inc` hit_count and `$max` last_accessed_at,
+sent as a single unordered bulk_write every ACCESS_FLUSH_INTERVAL seconds
+or every ACCESS_FLUSH_EVENTS hits, whichever comes first. Recording a hit
+is a dict update, so the hit path never waits on the database. Pending
+counts are flushed on shutdown and put back if a flush fails; while the
+database stays down, at most ACCESS_MAX_PENDING entries are kept and the
+least recently hit ones are dropped first.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+
+logger = logging.getLogger(__name__)
+
+ACCESS_FLUSH_INTERVAL = float(os.environ.get('ACCESS_FLUSH_INTERVAL', '10'))
+ACCESS_FLUSH_EVENTS = int(os.environ.get('ACCESS_FLUSH_EVENTS', '1000'))
+ACCESS_MAX_PENDING = int(os.environ.get('ACCESS_MAX_PENDING', '50000'))
+
+
+class AccessTracker:
+    """In-memory hit accumulator for one collection, keyed by cache_key"""
+
+    def __init__(
+        self,
+        collection,
+        flush_interval: float = ACCESS_FLUSH_INTERVAL,
+        flush_events: int = ACCESS_FLUSH_EVENTS,
+        max_pending: int = ACCESS_MAX_PENDING
+    ):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.max_pending = max_pending
+        # cache_key -> [hits, last access (epoch seconds)], least recently hit first
+        self._pending: Dict[str, List[float]] = {}
+        self._events = 0
+        # After a failed flush, leave retries to the periodic flush
+        self._retry_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self._stats = {
+            'recorded': 0, 'flushes': 0, 'flushed_updates': 0, 'flush_errors': 0,
+            'dropped_entries': 0, 'dropped_hits': 0,
+        }
+
+    def record(self, cache_key: str) -> None:
+        """Count one hit (never blocks; may schedule a flush)"""
+        pending = self._pending.pop(cache_key, None)
+        if pending is None:
+            pending = [0, 0.0]
+        pending[0] += 1
+        pending[1] = time.time()
+        self._pending[cache_key] = pending
+        self._events += 1
+        self._stats['recorded'] += 1
+        self._trim()
+
+        if (
+            self._events >= self.flush_events
+            and time.monotonic() >= self._retry_at
+            and (self._flushing is None or self._flushing.done())
+        ):
+            try:
+                self._flushing = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                pass  # no loop (sync caller); the periodic flush picks it up
+
+    async def flush(self) -> int:
+        """
+        Write all pending counts in one bulk_write
+
+        Returns:
+            Number of entries updated
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        events, self._events = self._events, 0
+
+        updates = [
+            UpdateOne(
+                {"cache_key": key},
+                {
+                    "$inc": {"hit_count": int(hits)},
+                    "$max": {"last_accessed_at": datetime.utcfromtimestamp(last)},
+                }
+            )
+            for key, (hits, last) in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(updates, ordered=False)
+        except asyncio.CancelledError:
+            # Shutting down mid-flush: keep the counts for stop()'s final flush
+            self._restore(pending, events)
+            raise
+        except Exception as e:
+            self._stats['flush_errors'] += 1
+            self._retry_at = time.monotonic() + self.flush_interval
+            self._restore(pending, events)
+            logger.error(f"Access tracking flush failed, will retry: {e}")
+            return 0
+
+        self._stats['flushes'] += 1
+        self._stats['flushed_updates'] += len(updates)
+        return len(updates)
+
+    def _restore(self, pending: Dict[str, List[float]], events: int) -> None:
+        """Merge counts and the event count from a failed flush back into the accumulator"""
+        # Hits recorded during the flush are the most recent: keep them last
+        for key, (hits, last) in self._pending.items():
+            current = pending.pop(key, None)
+            if current is not None:
+                hits += current[0]
+                last = max(last, current[1])
+            pending[key] = [hits, last]
+        self._pending = pending
+        self._events += events
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the least recently hit entries beyond max_pending"""
+        while len(self._pending) > self.max_pending:
+            key = next(iter(self._pending))
+            hits, _ = self._pending.pop(key)
+            self._events = max(0, self._events - int(hits))
+            self._stats['dropped_entries'] += 1
+            self._stats['dropped_hits'] += int(hits)
+
+    async def start(self) -> None:
+        """Start the periodic flush (called from the app lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write whatever is still pending"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return dict(self._stats, pending_entries=len(self._pending), pending_events=self._events)
@@ -0,0 +1,108 @@
+"""
+Atomic Audio File Storage
+Streams generated audio into a temp file next to its final location,
+hashing and sizing it on the fly, then fsyncs and renames it into place.
+A crash mid-generation leaves at most a stray temp file, never a truncated
+MP3 that MongoDB points at.
+"""
+
+import os
+import uuid
+import asyncio
+import hashlib
+from typing import List, Optional
+
+
+# Buffer this much before handing a write to the worker thread
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# Suffix for in-progress files (ignored by readers, swept by cache GC)
+TEMP_SUFFIX = '.tmp'
+
+
+class AtomicAudioWriter:
+    """
+    Async context manager that writes chunks to `{final_path}.{nonce}.tmp`
+
+    Usage:
+        async with AtomicAudioWriter(full_path) as writer:
+            async for chunk in stream:
+                await writer.write(chunk)
+            await writer.commit()
+
+    Leaving the block without commit() (error, cancellation) removes the
+    temp file.
+    """
+
+    def __init__(self, final_path: str):
+        self.final_path = final_path
+        self.temp_path = f"{final_path}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}"
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._file = None
+        self.committed = False
+
+    @property
+    def content_hash(self) -> str:
+        """sha256 hex digest of everything written so far"""
+        return self._hasher.hexdigest()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.final_path), exist_ok=True)
+        return open(self.temp_path, 'wb')
+
+    async def __aenter__(self) -> "AtomicAudioWriter":
+        self._file = await asyncio.to_thread(self._open)
+        return self
+
+    async def write(self, chunk: bytes) -> None:
+        """Append a chunk (hash/size updated immediately, disk writes batched)"""
+        if not chunk:
+            return
+        self._hasher.update(chunk)
+        self.size += len(chunk)
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= WRITE_BUFFER_SIZE:
+            await self._flush_buffer()
+
+    async def _flush_buffer(self) -> None:
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        await asyncio.to_thread(self._file.write, data)
+
+    def _sync_and_rename(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.temp_path, self.final_path)
+        # Persist the rename itself
+        dir_fd = os.open(os.path.dirname(self.final_path), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    async def commit(self) -> None:
+        """Flush, fsync and atomically move the file to its final path"""
+        await self._flush_buffer()
+        await asyncio.to_thread(self._sync_and_rename)
+        self.committed = True
+
+    def _discard(self) -> None:
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    async def __aexit__(self, exc_type, exc, tb) -> Optional[bool]:
+        if not self.committed:
+            await asyncio.to_thread(self._discard)
+        return None
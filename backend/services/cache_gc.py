@@ -0,0 +1,296 @@
+"""
+Audio Cache Eviction & Garbage Collection
+Keeps the section audio cache within a disk budget. A background pass
+evicts the least valuable entries (rarely and not recently played) until
+usage drops below a low-water mark, skipping pinned entries such as bundled
+lessons. Each pass also reconciles a bounded slice of the cache: MongoDB
+documents whose file is gone and temp files left behind by interrupted
+generations. Deleting files that no document points at is opt-in
+(AUDIO_CACHE_GC_ORPHANS), and even then only touches files named by a
+content key: bundled audio shipped with the repo (alias-named files with no
+documents) is never an orphan.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from services.audio_storage import TEMP_SUFFIX
+from services.cache_key_generator import is_content_key
+
+
+logger = logging.getLogger(__name__)
+
+# Disk budget for cached section audio in MB (0 = unlimited, never evict)
+AUDIO_CACHE_BUDGET_MB = float(os.environ.get('AUDIO_CACHE_BUDGET_MB', '0'))
+# Evict down to this fraction of the budget so passes don't run back to back
+AUDIO_CACHE_LOW_WATER = float(os.environ.get('AUDIO_CACHE_LOW_WATER', '0.9'))
+# Seconds between background passes
+AUDIO_CACHE_GC_INTERVAL = float(os.environ.get('AUDIO_CACHE_GC_INTERVAL', '600'))
+# Documents and files reconciled per pass
+AUDIO_CACHE_GC_BATCH = int(os.environ.get('AUDIO_CACHE_GC_BATCH', '500'))
+# Files younger than this are never treated as orphans or stale temp files:
+# a generation renames its file into place just before inserting the document
+AUDIO_CACHE_GC_GRACE = float(os.environ.get('AUDIO_CACHE_GC_GRACE', '3600'))
+# Delete generated audio files that no document references (off by default)
+AUDIO_CACHE_GC_ORPHANS = os.environ.get('AUDIO_CACHE_GC_ORPHANS', 'false').lower() in ('1', 'true', 'yes')
+
+# Fields needed to score and evict an entry
+_EVICTION_PROJECTION = {
+    'cache_key': 1, 'audio_path': 1, 'file_size': 1,
+    'hit_count': 1, 'last_accessed_at': 1, 'created_at': 1,
+}
+
+
+def entry_value(entry: dict, now: datetime) -> float:
+    """
+    How much an entry is worth keeping (lowest is evicted first)
+
+    Hits divided by idle time: an often-played section survives a quiet
+    spell, a one-off play is evicted soon after it stops being recent.
+    Entries never tracked count as accessed when created.
+    """
+    last_access = entry.get('last_accessed_at') or entry.get('created_at') or now
+    idle_hours = max((now - last_access).total_seconds(), 0) / 3600
+    return (1 + entry.get('hit_count', 0)) / (1 + idle_hours)
+
+
+class CacheGarbageCollector:
+    """
+    Budgeted eviction plus incremental reconciliation for one audio cache
+
+    Args:
+        collection: The audio_cache MongoDB collection
+        storage_root: Directory that stored audio_path values are relative to
+        cache_dir: Directory under storage_root holding the audio files
+        budget_bytes: Disk budget (0 = unlimited)
+        remove_orphans: Delete content-keyed files no document references
+        on_remove: Called with each cache_key whose document is deleted
+    """
+
+    def __init__(
+        self,
+        collection,
+        storage_root: str,
+        cache_dir: str = 'audio-cache',
+        budget_bytes: int = int(AUDIO_CACHE_BUDGET_MB * 1024 * 1024),
+        low_water: float = AUDIO_CACHE_LOW_WATER,
+        interval: float = AUDIO_CACHE_GC_INTERVAL,
+        batch_size: int = AUDIO_CACHE_GC_BATCH,
+        grace_seconds: float = AUDIO_CACHE_GC_GRACE,
+        remove_orphans: bool = AUDIO_CACHE_GC_ORPHANS,
+        on_remove: Optional[Callable[[str], None]] = None
+    ):
+        self.collection = collection
+        self.storage_root = storage_root.rstrip('/')
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.low_water = low_water
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.remove_orphans = remove_orphans
+        self.on_remove = on_remove
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        # Resume points, so each pass reconciles the next slice
+        self._doc_cursor = None
+        self._dir_cursor = 0
+        self._stats = {
+            'passes': 0, 'evicted': 0, 'evicted_bytes': 0,
+            'dangling_documents': 0, 'orphan_files': 0, 'temp_files': 0,
+            'last_pass_at': None, 'last_usage_bytes': None,
+        }
+
+    async def start(self) -> None:
+        """Start the background loop (called from the app lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Audio cache GC pass failed: {e}")
+
+    async def run_once(self) -> dict:
+        """
+        One eviction + reconciliation pass
+
+        Returns:
+            What this pass removed
+        """
+        async with self._lock:
+            result = {'evicted': 0, 'evicted_bytes': 0}
+            result.update(await self._evict_over_budget())
+            result['dangling_documents'] = await self._reconcile_documents()
+            orphans, temps = await self._reconcile_files()
+            result['orphan_files'] = orphans
+            result['temp_files'] = temps
+
+            for name in ('evicted', 'evicted_bytes', 'dangling_documents', 'orphan_files', 'temp_files'):
+                self._stats[name] += result[name]
+            self._stats['passes'] += 1
+            self._stats['last_pass_at'] = time.time()
+            return result
+
+    def full_path(self, audio_path: str) -> str:
+        return f"{self.storage_root}{audio_path}"
+
+    async def usage_bytes(self) -> int:
+        """Total size of cached audio according to MongoDB"""
+        pipeline = [{"$group": {"_id": None, "total": {"$sum": "$file_size"}}}]
+        result = await self.collection.aggregate(pipeline).to_list(1)
+        return result[0]['total'] if result else 0
+
+    async def _evict_over_budget(self) -> dict:
+        usage = await self.usage_bytes()
+        self._stats['last_usage_bytes'] = usage
+        if self.budget_bytes <= 0 or usage <= self.budget_bytes:
+            return {}
+
+        now = datetime.utcnow()
+        candidates = []
+        async for entry in self.collection.find({"pinned": {"$ne": True}}, _EVICTION_PROJECTION):
+            candidates.append((entry_value(entry, now), entry))
+        candidates.sort(key=lambda item: item[0])
+
+        target = self.budget_bytes * self.low_water
+        evicted = evicted_bytes = 0
+        for _, entry in candidates:
+            if usage <= target:
+                break
+            if await self._remove_entry(entry):
+                size = entry.get('file_size', 0)
+                usage -= size
+                evicted += 1
+                evicted_bytes += size
+
+        if evicted:
+            logger.info(f"Evicted {evicted} audio cache entries ({evicted_bytes} bytes)")
+        return {'evicted': evicted, 'evicted_bytes': evicted_bytes}
+
+    async def _remove_entry(self, entry: dict) -> bool:
+        """Delete the document, then its file unless another document still uses it"""
+        result = await self.collection.delete_one({"_id": entry["_id"], "pinned": {"$ne": True}})
+        if not result.deleted_count:
+            return False  # pinned or removed meanwhile
+        if self.on_remove:
+            self.on_remove(entry['cache_key'])
+        await self._remove_file_if_unreferenced(entry['audio_path'])
+        return True
+
+    async def _remove_file_if_unreferenced(self, audio_path: str) -> None:
+        if await self.collection.count_documents({"audio_path": audio_path}, limit=1):
+            return
+        try:
+            await asyncio.to_thread(os.remove, self.full_path(audio_path))
+        except FileNotFoundError:
+            pass
+
+    async def _reconcile_documents(self) -> int:
+        """Delete documents (next batch by _id) whose audio file no longer exists"""
+        query = {"_id": {"$gt": self._doc_cursor}} if self._doc_cursor is not None else {}
+        cursor = self.collection.find(query, {"cache_key": 1, "audio_path": 1}).sort("_id", 1).limit(self.batch_size)
+        batch = await cursor.to_list(self.batch_size)
+        # Wrap around once the whole collection has been visited
+        self._doc_cursor = batch[-1]["_id"] if len(batch) == self.batch_size else None
+
+        dangling = 0
+        for entry in batch:
+            exists = await asyncio.to_thread(os.path.exists, self.full_path(entry['audio_path']))
+            if exists:
+                continue
+            result = await self.collection.delete_one({"_id": entry["_id"]})
+            if result.deleted_count:
+                dangling += 1
+                if self.on_remove:
+                    self.on_remove(entry['cache_key'])
+        if dangling:
+            logger.warning(f"Removed {dangling} audio cache documents with missing files")
+        return dangling
+
+    def _leaf_dirs(self) -> List[str]:
+        """audio-cache/{language}/{location} directories, in a stable order"""
+        root = os.path.join(self.storage_root, self.cache_dir)
+        dirs = []
+        for current, subdirs, _ in os.walk(root):
+            subdirs.sort()
+            if not subdirs:
+                dirs.append(current)
+        return dirs
+
+    def _scan_dir(self, directory: str) -> List[os.DirEntry]:
+        with os.scandir(directory) as entries:
+            return [entry for entry in entries if entry.is_file()]
+
+    async def _reconcile_files(self) -> Tuple[int, int]:
+        """
+        Remove stale temp files in the next directory, and unreferenced audio
+        files too when remove_orphans is on
+
+        Only files named by a content key ({alias}.v2-{hash}.mp3) are orphan
+        candidates; alias-named files are bundled or legacy audio.
+        """
+        dirs = await asyncio.to_thread(self._leaf_dirs)
+        if not dirs:
+            return 0, 0
+        directory = dirs[self._dir_cursor % len(dirs)]
+        self._dir_cursor = (self._dir_cursor + 1) % len(dirs)
+
+        files = await asyncio.to_thread(self._scan_dir, directory)
+        cutoff = time.time() - self.grace_seconds
+        old_files = [f for f in files if f.stat().st_mtime < cutoff]
+
+        temps = 0
+        audio = []
+        for f in old_files:
+            if f.name.endswith(TEMP_SUFFIX):
+                await asyncio.to_thread(_remove_quietly, f.path)
+                temps += 1
+            elif self.remove_orphans and f.name.endswith('.mp3') and is_content_key(f.name[:-len('.mp3')]):
+                audio.append(f)
+
+        orphans = 0
+        prefix_len = len(self.storage_root)
+        for start in range(0, len(audio), self.batch_size):
+            chunk = audio[start:start + self.batch_size]
+            paths = {f.path[prefix_len:]: f for f in chunk}
+            referenced = set()
+            cursor = self.collection.find({"audio_path": {"$in": list(paths)}}, {"audio_path": 1})
+            async for entry in cursor:
+                referenced.add(entry['audio_path'])
+            for audio_path, f in paths.items():
+                if audio_path not in referenced:
+                    await asyncio.to_thread(_remove_quietly, f.path)
+                    orphans += 1
+
+        if orphans or temps:
+            logger.info(f"Removed {orphans} orphaned and {temps} stale temp files from {directory}")
+        return orphans, temps
+
+    def stats(self) -> dict:
+        return dict(
+            self._stats,
+            budget_bytes=self.budget_bytes,
+            remove_orphans=self.remove_orphans,
+            running=self._task is not None and not self._task.done()
+        )
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
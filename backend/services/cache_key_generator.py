@@ -1,8 +1,101 @@
 """
 Cache Key Generation Utilities
 Generates consistent cache keys for section-based audio caching
+
+Two kinds of key exist:
+- alias: {language}_{sectionType}_{location}_{speakerA}_{speakerB}, human
+  readable, shared by every script variant of a section
+- content key: {alias}.v2-{hash}, where hash covers the normalized spoken
+  lines, voice IDs, model and settings, so a changed script never gets stale audio
+
+The hash uses voice IDs rather than speaker names, so two speaker pairs
+sharing voices get the same hash for the same script.
 """
 
+import re
+import json
+import hashlib
+import unicodedata
+from typing import List, Optional
+
+
+# Bump when the content hash inputs change; keys of another version never collide
+CACHE_KEY_VERSION = 'v2'
+CONTENT_HASH_LENGTH = 16  # hex chars (64 bits)
+
+_VERSION_SUFFIX = re.compile(r'^(?P<alias>.+)\.(?P<version>v\d+)-(?P<hash>[0-9a-f]+)$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a key component and replace '_' and spaces with '-' (keeps keys splittable)"""
+    return _WHITESPACE.sub('-', name.lower().strip()).replace('_', '-')
+
+
+def normalize_line_text(text: str) -> str:
+    """Canonical form of spoken text: NFC, collapsed whitespace, trimmed"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+def hash_section_content(
+    dialogue_lines: List[dict],
+    voice_a: str,
+    voice_b: str,
+    model_id: str,
+    settings: dict
+) -> str:
+    """
+    Content hash of everything that determines a section's audio
+    
+    Only what reaches the provider counts: the spoken text and voice of each
+    line, the model and its settings. Display text and emotion tags do not.
+    
+    Args:
+        dialogue_lines: List of {text, spokenText, speakerId, ...}
+        voice_a: Voice ID for speaker 1
+        voice_b: Voice ID for speaker 2
+        model_id: Provider model ID
+        settings: Model/output settings sent with the request
+        
+    Returns:
+        Hex digest (CONTENT_HASH_LENGTH chars)
+    """
+    lines = [
+        [
+            voice_a if line.get('speakerId', 1) == 1 else voice_b,
+            normalize_line_text(line.get('spokenText') or line.get('text', ''))
+        ]
+        for line in dialogue_lines
+    ]
+    canonical = json.dumps(
+        {'v': CACHE_KEY_VERSION, 'model': model_id, 'settings': settings, 'lines': lines},
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:CONTENT_HASH_LENGTH]
+
+
+def generate_content_key(alias: str, content_hash: str) -> str:
+    """Versioned content-addressed key: {alias}.v2-{hash}"""
+    return f"{alias}.{CACHE_KEY_VERSION}-{content_hash}"
+
+
+def is_content_key(cache_key: str) -> bool:
+    return _VERSION_SUFFIX.match(cache_key) is not None
+
+
+def cache_key_hash(cache_key: str) -> Optional[str]:
+    """The content hash of a content key (None for an alias)"""
+    match = _VERSION_SUFFIX.match(cache_key)
+    return match.group('hash') if match else None
+
+
+def cache_key_alias(cache_key: str) -> str:
+    """The alias part of a key (the key itself if it is already an alias)"""
+    match = _VERSION_SUFFIX.match(cache_key)
+    return match.group('alias') if match else cache_key
+
 
 def generate_cache_key(
     language: str,
@@ -12,11 +105,14 @@ def generate_cache_key(
     speaker_b: str
 ) -> str:
     """
-    Generate a unique cache key for a section+speaker combination
+    Generate the alias key for a section+speaker combination
     
     Format: {language}_{sectionType}_{location}_{speakerA}_{speakerB}
     Example: en_welcome_coffeeshop_maria_jordan
     
+    Speaker names have '_' replaced by '-' so the key always splits into
+    exactly five parts.
+    
     Args:
         language: Language code (en, es, fr)
         section_type: Section type (welcome, vocabulary, etc.)
@@ -31,8 +127,8 @@ def generate_cache_key(
     lang = language.lower().strip()
     section = section_type.lower().strip().replace('_', '')
     loc = location.lower().strip().replace('_', '')
-    spk_a = speaker_a.lower().strip()
-    spk_b = speaker_b.lower().strip()
+    spk_a = normalize_name(speaker_a)
+    spk_b = normalize_name(speaker_b)
     
     return f"{lang}_{section}_{loc}_{spk_a}_{spk_b}"
 
@@ -57,17 +153,24 @@ def get_audio_file_path(cache_key: str, language: str, location: str) -> str:
 
 def parse_cache_key(cache_key: str) -> dict:
     """
-    Parse a cache key back into its components
+    Parse a cache key (alias or content key) back into its components
     
     Args:
         cache_key: Cache key string
         
     Returns:
-        Dictionary with language, section_type, location, speaker_a, speaker_b
+        Dictionary with language, section_type, location, speaker_a, speaker_b,
+        plus version and content_hash (None for a bare alias)
+        
+    Raises:
+        ValueError: Malformed key, or a legacy key whose speaker names contained
+            underscores (the split between the two names is ambiguous)
     """
-    parts = cache_key.split('_')
+    match = _VERSION_SUFFIX.match(cache_key)
+    alias = match.group('alias') if match else cache_key
+    parts = alias.split('_')
     
-    if len(parts) < 5:
+    if len(parts) != 5 or not all(parts):
         raise ValueError(f"Invalid cache key format: {cache_key}")
     
     return {
@@ -75,5 +178,7 @@ def parse_cache_key(cache_key: str) -> dict:
         'section_type': parts[1],
         'location': parts[2],
         'speaker_a': parts[3],
-        'speaker_b': parts[4]
+        'speaker_b': parts[4],
+        'version': match.group('version') if match else None,
+        'content_hash': match.group('hash') if match else None
     }
@@ -0,0 +1,428 @@
+"""
+Audio Cache Pre-Warming
+Fills the section cache before users ask for it. The catalog is every
+language x location x speaker pair x section combination configured below,
+plus every combination already seen in the cache or in requests. Lessons
+are ranked by observed demand: hit counts persisted by access tracking, plus
+cache misses recorded by this process. Uncovered sections are generated
+through the normal path: a lesson script from the dialogue script stream
+(served from the script cache when warm), then each missing section through
+the same generation path as the endpoints, so keys, single-flight and leases
+all apply.
+
+Background passes run only inside an off-peak window and share an upstream
+budget per window (scripts, sections and TTS characters). A pass stops early
+when live requests are queued on the ElevenLabs limiter.
+
+Sections are the ones the backend script pipeline produces (the prompt's
+segment types, as /api/lessons/build stores them).
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.cache_key_generator import generate_cache_key, parse_cache_key
+from services.dialogue_script import SEGMENT_TYPES, stream_dialogue_lines
+from services.resilience import CircuitOpen
+from services.upstream_limiter import LimiterTimeout, get_limiter
+
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+
+# Catalog: comma-separated; speaker pairs as a:b
+PREWARM_LANGUAGES = os.environ.get('PREWARM_LANGUAGES', 'en,es,fr')
+PREWARM_LOCATIONS = os.environ.get('PREWARM_LOCATIONS', 'coffee_shop,restaurant')
+PREWARM_SPEAKER_PAIRS = os.environ.get('PREWARM_SPEAKER_PAIRS', 'maria:jordan')
+# Off-peak window, UTC "HH:MM-HH:MM" (may wrap midnight); empty = no background passes
+PREWARM_WINDOW = os.environ.get('PREWARM_WINDOW', '')
+# Seconds between background checks
+PREWARM_INTERVAL = float(os.environ.get('PREWARM_INTERVAL', '900'))
+# Upstream budget per window (and default for a manual run)
+PREWARM_MAX_SCRIPTS = int(os.environ.get('PREWARM_MAX_SCRIPTS', '10'))
+PREWARM_MAX_SECTIONS = int(os.environ.get('PREWARM_MAX_SECTIONS', '50'))
+PREWARM_MAX_CHARS = int(os.environ.get('PREWARM_MAX_CHARS', '100000'))
+
+PREWARM_SECTIONS = tuple(segment.lower() for segment in SEGMENT_TYPES)
+
+# Fields needed to attribute an entry to a lesson and score it
+_COVERAGE_PROJECTION = {
+    'alias': 1, 'cache_key': 1, 'language': 1, 'location': 1,
+    'speaker_a': 1, 'speaker_b': 1, 'hit_count': 1,
+}
+
+ComboKey = Tuple[str, str, str, str]
+
+
+def combo_key(language: str, location: str, speaker_a: str, speaker_b: str) -> ComboKey:
+    """(language, location, speaker_a, speaker_b) normalized as in cache keys"""
+    parts = parse_cache_key(generate_cache_key(language, 'lesson', location, speaker_a, speaker_b))
+    return parts['language'], parts['location'], parts['speaker_a'], parts['speaker_b']
+
+
+def lesson_label(lesson: dict) -> str:
+    return f"{lesson['language']}/{lesson['location']} {lesson['speaker_a']}&{lesson['speaker_b']}"
+
+
+def parse_catalog(languages: str, locations: str, speaker_pairs: str) -> List[dict]:
+    """Configured lessons: every language x location x speaker pair"""
+    pairs = [pair.split(':', 1) for pair in speaker_pairs.split(',') if ':' in pair]
+    return [
+        {'language': language.strip(), 'location': location.strip(),
+         'speaker_a': a.strip(), 'speaker_b': b.strip()}
+        for language in languages.split(',') if language.strip()
+        for location in locations.split(',') if location.strip()
+        for a, b in pairs
+    ]
+
+
+def parse_window(window: str) -> Optional[Tuple[int, int]]:
+    """'HH:MM-HH:MM' -> (start, end) in minutes after midnight, None if unset"""
+    if not window.strip():
+        return None
+    start, end = window.split('-')
+    minutes = [int(h) * 60 + int(m) for h, m in (part.strip().split(':') for part in (start, end))]
+    return minutes[0], minutes[1]
+
+
+def window_start(window: Optional[Tuple[int, int]], now: datetime) -> Optional[datetime]:
+    """Start of the window `now` falls in (None when outside it)"""
+    if window is None:
+        return None
+    start, end = window
+    minute = now.hour * 60 + now.minute
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if start <= end:
+        inside = start <= minute < end
+        return midnight + timedelta(minutes=start) if inside else None
+    # Wraps midnight: after start today, or before end (window began yesterday)
+    if minute >= start:
+        return midnight + timedelta(minutes=start)
+    if minute < end:
+        return midnight - timedelta(days=1) + timedelta(minutes=start)
+    return None
+
+
+def script_sections(lines: List[dict]) -> Dict[str, List[dict]]:
+    """
+    First run of each section in a script, as /api/lessons/build dispatches it
+
+    Lines keep exactly the fields the lesson build sends, so a lesson built
+    later from the same script resolves to the same content keys.
+    """
+    sections: Dict[str, List[dict]] = {}
+    current = None
+    for line in lines:
+        section_type = line['segmentType'].lower()
+        if section_type != current and section_type in sections:
+            current = None  # a revisited section; keep the first run only
+            continue
+        current = section_type
+        sections.setdefault(section_type, []).append(
+            {"text": line["text"], "speakerId": line["speakerId"], "emotion": line["emotion"]}
+        )
+    return sections
+
+
+async def fetch_lesson_script(config: dict) -> List[dict]:
+    """A full lesson script (validated lines) through the dialogue script stream"""
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OpenAI API key not configured")
+    lines = await stream_dialogue_lines(config, OPENAI_API_KEY)
+    return [line async for line in lines]
+
+
+class CachePrewarmer:
+    """
+    Demand-ranked pre-generation of uncovered catalog sections
+
+    Args:
+        collection: The audio_cache MongoDB collection
+        generate_section: Async callable taking the fields of a section generate
+            request (section_type, language, location, speaker_a, speaker_b,
+            dialogue_lines) that serves or generates it
+        fetch_script: Async callable taking a lesson config, returning its lines
+        catalog: Lessons to cover ({language, location, speaker_a, speaker_b})
+        window: UTC off-peak window 'HH:MM-HH:MM' ('' = no background passes)
+    """
+
+    def __init__(
+        self,
+        collection,
+        generate_section: Callable[[dict], Awaitable],
+        fetch_script: Callable[[dict], Awaitable[List[dict]]] = fetch_lesson_script,
+        catalog: Optional[List[dict]] = None,
+        sections: Tuple[str, ...] = PREWARM_SECTIONS,
+        window: str = PREWARM_WINDOW,
+        interval: float = PREWARM_INTERVAL,
+        max_scripts: int = PREWARM_MAX_SCRIPTS,
+        max_sections: int = PREWARM_MAX_SECTIONS,
+        max_chars: int = PREWARM_MAX_CHARS
+    ):
+        self.collection = collection
+        self.generate_section = generate_section
+        self.fetch_script = fetch_script
+        self.catalog = catalog if catalog is not None else parse_catalog(
+            PREWARM_LANGUAGES, PREWARM_LOCATIONS, PREWARM_SPEAKER_PAIRS
+        )
+        self.sections = tuple(sections)
+        self.window = parse_window(window)
+        self.interval = interval
+        self.budget = {'scripts': max_scripts, 'sections': max_sections, 'chars': max_chars}
+        # Misses seen by this process, per lesson (persisted demand is hit_count)
+        self._demand: Counter = Counter()
+        self._requested: Dict[ComboKey, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._window_started: Optional[datetime] = None
+        self._window_spent = Counter()
+        self._stats = {
+            'passes': 0, 'scripts': 0, 'generated': 0, 'chars': 0, 'failed': 0,
+            'last_pass_at': None, 'last_stop_reason': None,
+        }
+
+    def record_demand(self, language: str, location: str, speaker_a: str, speaker_b: str, count: int = 1) -> None:
+        """Count requests for a lesson that missed the cache (never blocks)"""
+        try:
+            key = combo_key(language, location, speaker_a, speaker_b)
+        except ValueError:
+            return
+        self._demand[key] += count
+        self._requested.setdefault(key, {
+            'language': language, 'location': location, 'speaker_a': speaker_a, 'speaker_b': speaker_b
+        })
+
+    async def plan(self) -> List[dict]:
+        """
+        Every known lesson with its cached sections and demand
+
+        Returns:
+            [{language, location, speaker_a, speaker_b, demand, cached, missing}],
+            most demanded first (catalog order breaks ties)
+        """
+        lessons: Dict[ComboKey, dict] = {}
+
+        def lesson(fields: dict) -> dict:
+            key = combo_key(fields['language'], fields['location'], fields['speaker_a'], fields['speaker_b'])
+            if key not in lessons:
+                lessons[key] = dict(fields, demand=0, aliases=set())
+            return lessons[key]
+
+        for fields in self.catalog:
+            lesson(fields)
+        for fields in self._requested.values():
+            lesson(fields)
+
+        cursor = self.collection.find({}, _COVERAGE_PROJECTION)
+        async for entry in cursor:
+            try:
+                parts = parse_cache_key(entry.get('alias') or entry['cache_key'])
+            except (KeyError, ValueError):
+                continue
+            current = lesson({
+                'language': entry.get('language') or parts['language'],
+                'location': entry.get('location') or parts['location'],
+                'speaker_a': entry.get('speaker_a') or parts['speaker_a'],
+                'speaker_b': entry.get('speaker_b') or parts['speaker_b'],
+            })
+            current['demand'] += entry.get('hit_count', 0)
+            current['aliases'].add(generate_cache_key(
+                parts['language'], parts['section_type'], parts['location'], parts['speaker_a'], parts['speaker_b']
+            ))
+
+        for key, count in self._demand.items():
+            if key in lessons:
+                lessons[key]['demand'] += count
+
+        plan = []
+        for current in lessons.values():
+            aliases = current.pop('aliases')
+            current['cached'] = [s for s in self.sections if self._alias(current, s) in aliases]
+            current['missing'] = [s for s in self.sections if self._alias(current, s) not in aliases]
+            plan.append(current)
+        # Stable sort keeps catalog order among equal demand
+        plan.sort(key=lambda current: -current['demand'])
+        return plan
+
+    async def coverage(self, top: int = 20) -> dict:
+        """Share of catalog sections cached, overall and per language, plus the most wanted gaps"""
+        plan = await self.plan()
+        by_language: Dict[str, Counter] = {}
+        for current in plan:
+            counts = by_language.setdefault(current['language'], Counter())
+            counts['cached'] += len(current['cached'])
+            counts['total'] += len(self.sections)
+        cached = sum(counts['cached'] for counts in by_language.values())
+        total = sum(counts['total'] for counts in by_language.values())
+        return {
+            'lessons': len(plan),
+            'sections_total': total,
+            'sections_cached': cached,
+            'coverage': round(cached / total, 4) if total else 1.0,
+            'by_language': {
+                language: dict(counts, coverage=round(counts['cached'] / counts['total'], 4))
+                for language, counts in sorted(by_language.items())
+            },
+            'top_missing': [current for current in plan if current['missing']][:top],
+        }
+
+    async def run_once(self, budget: Optional[dict] = None, dry_run: bool = False) -> dict:
+        """
+        One pre-warm pass: generate missing sections, most demanded lessons first
+
+        Args:
+            budget: {scripts, sections, chars} this pass may spend (default: the
+                per-window budget)
+            dry_run: Only report what would be generated
+
+        Returns:
+            What was generated, what failed, and why the pass stopped
+        """
+        async with self._lock:
+            budget = dict(self.budget, **(budget or {}))
+            spent = Counter()
+            result = {'generated': [], 'failed': [], 'planned': 0, 'stop_reason': 'complete'}
+            plan = [current for current in await self.plan() if current['missing']]
+            result['planned'] = sum(len(current['missing']) for current in plan)
+
+            for current in plan:
+                if dry_run:
+                    result['generated'].extend(self._alias(current, section) for section in current['missing'])
+                    continue
+                reason = self._should_stop(budget, spent)
+                if reason:
+                    result['stop_reason'] = reason
+                    break
+
+                config = {'language': current['language'], 'location': current['location']}
+                spent['scripts'] += 1
+                try:
+                    sections = script_sections(await self.fetch_script(config))
+                except (CircuitOpen, LimiterTimeout) as e:
+                    result['stop_reason'] = f"upstream unavailable: {e}"
+                    break
+                except Exception as e:
+                    logger.error(f"Pre-warm: script for {current['language']}/{current['location']} failed: {e}")
+                    result['failed'].append({'lesson': lesson_label(current), 'detail': str(e)})
+                    continue
+
+                reason = await self._generate_missing(current, sections, budget, spent, result)
+                if reason:
+                    result['stop_reason'] = reason
+                    break
+
+            result.update(spent)
+            self._stats['passes'] += 1
+            self._stats['last_pass_at'] = time.time()
+            self._stats['last_stop_reason'] = result['stop_reason']
+            if not dry_run:
+                self._stats['scripts'] += spent['scripts']
+                self._stats['generated'] += len(result['generated'])
+                self._stats['chars'] += spent['chars']
+                self._stats['failed'] += len(result['failed'])
+            return result
+
+    async def _generate_missing(self, current: dict, sections: dict, budget: dict, spent: Counter, result: dict) -> Optional[str]:
+        """Generate a lesson's missing sections from its script; returns a stop reason, if any"""
+        for section_type in current['missing']:
+            dialogue_lines = sections.get(section_type)
+            if not dialogue_lines:
+                continue  # the script has no such section
+            chars = sum(len(line['text']) for line in dialogue_lines)
+            reason = self._should_stop(budget, spent, chars=chars, script=False)
+            if reason:
+                return reason
+
+            alias = self._alias(current, section_type)
+            try:
+                await self.generate_section({
+                    'section_type': section_type,
+                    'language': current['language'],
+                    'location': current['location'],
+                    'speaker_a': current['speaker_a'],
+                    'speaker_b': current['speaker_b'],
+                    'dialogue_lines': dialogue_lines,
+                })
+            except (CircuitOpen, LimiterTimeout) as e:
+                return f"upstream unavailable: {e}"
+            except Exception as e:
+                detail = getattr(e, 'detail', None) or str(e)
+                logger.error(f"Pre-warm: {alias} failed: {detail}")
+                result['failed'].append({'section': alias, 'detail': detail})
+                continue
+            spent['sections'] += 1
+            spent['chars'] += chars
+            result['generated'].append(alias)
+        return None
+
+    def _should_stop(self, budget: dict, spent: Counter, chars: int = 0, script: bool = True) -> Optional[str]:
+        if script and spent['scripts'] >= budget['scripts']:
+            return 'script budget spent'
+        if spent['sections'] >= budget['sections']:
+            return 'section budget spent'
+        if spent['chars'] + chars > budget['chars']:
+            return 'character budget spent'
+        if get_limiter('elevenlabs').stats()['waiting'] > 0:
+            return 'live traffic queued upstream'
+        return None
+
+    def _alias(self, current: dict, section_type: str) -> str:
+        return generate_cache_key(
+            current['language'], section_type, current['location'], current['speaker_a'], current['speaker_b']
+        )
+
+    async def start(self) -> None:
+        """Start the off-peak loop (called from the app lifespan; no-op without a window)"""
+        if self.window is None:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._run_in_window(datetime.utcnow())
+            except Exception as e:
+                logger.error(f"Pre-warm pass failed: {e}")
+
+    async def _run_in_window(self, now: datetime) -> Optional[dict]:
+        """Run a pass with what is left of the current window's budget (None outside the window)"""
+        started = window_start(self.window, now)
+        if started is None:
+            return None
+        if started != self._window_started:
+            self._window_started = started
+            self._window_spent = Counter()
+        remaining = {name: limit - self._window_spent[name] for name, limit in self.budget.items()}
+        if min(remaining.values()) <= 0:
+            return None
+        result = await self.run_once(remaining)
+        for name in ('scripts', 'sections', 'chars'):
+            self._window_spent[name] += result.get(name, 0)
+        logger.info(
+            f"Pre-warm: {len(result['generated'])} sections generated, "
+            f"{len(result['failed'])} failed ({result['stop_reason']})"
+        )
+        return result
+
+    def stats(self) -> dict:
+        return dict(
+            self._stats,
+            budget=self.budget,
+            window_spent=dict(self._window_spent),
+            tracked_demand=sum(self._demand.values()),
+            running=self._task is not None and not self._task.done()
+        )
@@ -0,0 +1,310 @@
+"""
+Dialogue Script Generation
+Prompt and request for the lesson script LLM call, plus an incremental
+parser for its pipe-delimited output:
+
+    SpeakerID|SegmentType|[emotion]|dialogue text
+
+so lines can be validated and used as soon as the model finishes writing
+them, instead of after the whole completion arrives.
+"""
+
+import os
+import json
+import hashlib
+from typing import AsyncIterator, List, Optional
+
+from services.http_clients import get_client
+from services.upstream_limiter import get_limiter
+from services.resilience import get_resilience
+from services.script_cache import script_cache, SCRIPT_CACHE_ENABLED
+
+
+DIALOGUE_LLM_MODEL = 'gpt-4o-mini'
+DIALOGUE_LLM_TEMPERATURE = 0.7
+DIALOGUE_SYSTEM_PROMPT = (
+    "You are a language learning content generator. "
+    "Output only the requested format with no additional text."
+)
+
+# Bump whenever the prompt text changes (scripts cached per template version)
+PROMPT_TEMPLATE_VERSION = 1
+
+# Seconds allowed to open the completion stream (retries included)
+DIALOGUE_OPEN_DEADLINE = float(os.environ.get('DIALOGUE_OPEN_DEADLINE', '30'))
+
+# Lesson sections, in the order the prompt asks for them
+SEGMENT_TYPES = ('WELCOME', 'VOCAB', 'SLOW', 'BREAKDOWN', 'NATURAL', 'QUIZ', 'CULTURAL')
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+def dialogue_prompt_config(config: dict) -> dict:
+    """The config fields the prompt depends on, with their defaults"""
+    return {
+        'language': config.get("language", "en"),
+        'location': config.get("location", "coffee_shop"),
+        'situation': config.get("situation", "ordering"),
+        'difficulty': config.get("difficulty", "intermediate"),
+    }
+
+
+def script_cache_key(config: dict) -> str:
+    """
+    Script cache key for the prompt a config produces
+
+    Config values are normalized (case, whitespace, '-' vs '_'), and the
+    template version, model and temperature are included so a prompt change
+    never serves scripts written for the old one.
+
+    Returns:
+        sha256 hex digest
+    """
+    fields = {
+        name: str(value).lower().strip().replace('-', '_').replace(' ', '_')
+        for name, value in dialogue_prompt_config(config).items()
+    }
+    identity = json.dumps(
+        {
+            'template': PROMPT_TEMPLATE_VERSION,
+            'model': DIALOGUE_LLM_MODEL,
+            'temperature': DIALOGUE_LLM_TEMPERATURE,
+            'config': fields,
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def is_usable_script(text: str) -> bool:
+    """Whether a completion parsed into at least one valid line (worth caching)"""
+    return any(parse_dialogue_line(raw) for raw in text.split('\n'))
+
+
+def build_dialogue_prompt(config: dict) -> str:
+    """User prompt for a full lesson script"""
+    fields = dialogue_prompt_config(config)
+    return f"""Generate a language learning lesson dialogue in PIPE-DELIMITED format.
+
+Language: {fields['language']}
+Location: {fields['location']}
+Situation: {fields['situation']}
+Difficulty: {fields['difficulty']}
+
+Format each line EXACTLY as: SpeakerID|SegmentType|[emotion]|dialogue text
+
+- SpeakerID: Use "1" for first speaker, "2" for second speaker
+- SegmentType: WELCOME, VOCAB, SLOW, BREAKDOWN, NATURAL, QUIZ, CULTURAL
+- emotion: neutral, happy, curious, friendly, polite
+- Alternate speakers naturally in dialogue sections
+
+Generate a complete lesson with these sections (total ~30-35 lines):
+
+1. WELCOME (5 lines) - Introduction
+   Example: 1|WELCOME|[friendly]|Hello and welcome to our coffee shop lesson!
+   
+2. VOCAB (4-6 lines) - Vocabulary with definitions
+   Example: 1|VOCAB|[neutral]|Coffee - a hot beverage made from roasted beans
+   
+3. SLOW (6-8 lines) - Slow-paced dialogue between speakers
+   Example: 2|SLOW|[polite]|Hello, how can I help you today?
+   Example: 1|SLOW|[friendly]|Hi, I would like to order a coffee please
+   
+4. BREAKDOWN (3-4 lines) - Phrase explanations
+   Example: 1|BREAKDOWN|[neutral]|"I would like" is a polite way to make requests
+   
+5. NATURAL (7-10 lines) - Natural speed dialogue
+   Example: 2|NATURAL|[happy]|Hi there! What can I get for you?
+   Example: 1|NATURAL|[friendly]|Hey! I'll have a large coffee please
+   
+6. QUIZ (4-6 lines) - Questions and answers
+   Example: 1|QUIZ|[curious]|What does 'order' mean in this context?
+   Example: 1|QUIZ|[neutral]|To request food or drink
+   
+7. CULTURAL (2-3 lines) - Cultural notes
+   Example: 1|CULTURAL|[neutral]|In many countries, tipping at coffee shops is customary
+
+IMPORTANT: Output ONLY the pipe-delimited lines, no headers, no extra text."""
+
+
+def build_completion_payload(prompt: str, stream: bool = False) -> dict:
+    """Chat completion request body for a lesson script"""
+    payload = {
+        "model": DIALOGUE_LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": DIALOGUE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": DIALOGUE_LLM_TEMPERATURE
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def parse_dialogue_line(raw: str) -> Optional[dict]:
+    """
+    Parse and validate one `SpeakerID|SegmentType|[emotion]|text` line
+
+    Returns:
+        {speakerId, segmentType, emotion, text}, or None if the line is
+        malformed (wrong speaker, unknown section, no text)
+    """
+    parts = raw.strip().split('|')
+    if len(parts) < 4:
+        return None
+
+    speaker = parts[0].strip()
+    segment = parts[1].strip().upper()
+    emotion = parts[2].strip()
+    text = '|'.join(parts[3:]).strip()
+    if speaker not in ('1', '2') or segment not in SEGMENT_TYPES or not text:
+        return None
+
+    if emotion.startswith('[') and emotion.endswith(']'):
+        emotion = emotion[1:-1].strip()
+    return {
+        'speakerId': int(speaker),
+        'segmentType': segment,
+        'emotion': emotion or None,
+        'text': text,
+    }
+
+
+class DialogueLineParser:
+    """
+    Incremental parser for streamed pipe-delimited output
+
+    feed() takes text deltas as they arrive and returns the lines completed
+    by them; finish() flushes a final line without a trailing newline.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self.lines: List[dict] = []
+        self.rejected: List[str] = []
+
+    def feed(self, delta: str) -> List[dict]:
+        self._buffer += delta
+        *complete, self._buffer = self._buffer.split('\n')
+        return [line for line in map(self._accept, complete) if line]
+
+    def finish(self) -> List[dict]:
+        rest, self._buffer = self._buffer, ''
+        line = self._accept(rest)
+        return [line] if line else []
+
+    def _accept(self, raw: str) -> Optional[dict]:
+        if not raw.strip():
+            return None
+        line = parse_dialogue_line(raw)
+        if line is None:
+            self.rejected.append(raw.strip())
+            return None
+        line['index'] = len(self.lines)
+        self.lines.append(line)
+        return line
+
+    @property
+    def text(self) -> str:
+        """The accepted lines in pipe-delimited form"""
+        return '\n'.join(
+            f"{line['speakerId']}|{line['segmentType']}|[{line['emotion'] or ''}]|{line['text']}"
+            for line in self.lines
+        )
+
+
+async def iter_completion_deltas(upstream) -> AsyncIterator[str]:
+    """Text deltas from an OpenAI chat completion stream (SSE `data:` lines)"""
+    async for raw in upstream.aiter_lines():
+        if not raw.startswith('data:'):
+            continue
+        data = raw[5:].strip()
+        if data == '[DONE]':
+            return
+        choices = json.loads(data).get('choices') or []
+        delta = (choices[0].get('delta') or {}).get('content') if choices else None
+        if delta:
+            yield delta
+
+
+async def stream_dialogue_lines(config: dict, api_key: str, parser: Optional[DialogueLineParser] = None):
+    """
+    Start a streamed lesson script completion
+
+    Opening the stream goes through the OpenAI limiter and resilience policy
+    (retries happen only before the first token), so failures surface before
+    anything is yielded. The limiter permit is held until the stream ends.
+    Once the prompt's variant pool in the script cache is full, a cached
+    script is replayed instead; completed streams fill the pool.
+
+    Args:
+        config: Lesson config (language, location, situation, difficulty)
+        api_key: OpenAI API key
+        parser: Parser to collect accepted/rejected lines into (optional)
+
+    Returns:
+        Async iterator of validated lines ({index, speakerId, segmentType, emotion, text})
+    """
+    parser = parser or DialogueLineParser()
+    cache_key = script_cache_key(config)
+    cached = script_cache.get(cache_key) if SCRIPT_CACHE_ENABLED else None
+    if cached is not None:
+        return _replay(cached, parser)
+
+    prompt = build_dialogue_prompt(config)
+    client = get_client("openai")
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    payload = build_completion_payload(prompt, stream=True)
+
+    async def open_stream():
+        permit = await get_limiter("openai").enter(chars=len(prompt))
+        try:
+            upstream = await client.send(
+                client.build_request("POST", CHAT_COMPLETIONS_URL, headers=headers, json=payload),
+                stream=True
+            )
+        except BaseException:
+            permit.release()
+            raise
+        if upstream.is_error:
+            await upstream.aread()
+            await upstream.aclose()
+            permit.release()
+            upstream.raise_for_status()
+        return upstream, permit
+
+    async def discard(opened):
+        upstream, permit = opened
+        await upstream.aclose()
+        permit.release()
+
+    upstream, permit = await get_resilience("openai").call(
+        open_stream, DIALOGUE_OPEN_DEADLINE, discard, operation="dialogue_stream"
+    )
+
+    async def lines():
+        deltas = []
+        try:
+            async for delta in iter_completion_deltas(upstream):
+                deltas.append(delta)
+                for line in parser.feed(delta):
+                    yield line
+            for line in parser.finish():
+                yield line
+        finally:
+            await upstream.aclose()
+            permit.release()
+        if SCRIPT_CACHE_ENABLED and parser.lines:
+            script_cache.put(cache_key, ''.join(deltas))
+
+    return lines()
+
+
+async def _replay(text: str, parser: DialogueLineParser):
+    """Cached script as the same stream of validated lines"""
+    for line in parser.feed(text):
+        yield line
+    for line in parser.finish():
+        yield line
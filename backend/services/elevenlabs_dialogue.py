@@ -4,9 +4,61 @@ Generates multi-speaker conversation audio using ElevenLabs API
 """
 
 import os
-from typing import List, Tuple
-from elevenlabs import ElevenLabs
+import re
+import math
+import base64
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from elevenlabs import AsyncElevenLabs, VoiceSettings
 
+from services.http_clients import get_client
+from services.upstream_limiter import get_limiter
+from services.resilience import get_resilience
+from services.mp3_frames import Mp3FrameCounter, stitch_mp3
+from services.tts_cache import tts_cache, make_tts_cache_key, TTS_CACHE_ENABLED
+from services.cache_key_generator import hash_section_content, generate_cache_key
+
+
+logger = logging.getLogger(__name__)
+
+
+# Text-to-dialogue renders a whole section per call, so it needs far more
+# headroom than the shared client's single-line TTS timeout
+ELEVENLABS_DIALOGUE_TIMEOUT = float(os.environ.get('ELEVENLABS_DIALOGUE_TIMEOUT', '240'))
+
+# Output format for dialogue audio (44.1 kHz, 128 kbps CBR MP3); per-line
+# fallback clips use it too so they can be stitched frame by frame
+DIALOGUE_OUTPUT_FORMAT = 'mp3_44100_128'
+
+# Text-to-dialogue model and request settings (both part of a section's content hash)
+DIALOGUE_MODEL_ID = 'eleven_v3'
+DIALOGUE_SETTINGS = {'output_format': DIALOGUE_OUTPUT_FORMAT}
+
+# Single-line text-to-speech model and settings, shared with /api/tts so the
+# TTS cache serves both
+ELEVENLABS_TTS_MODEL = 'eleven_flash_v2_5'
+ELEVENLABS_VOICE_SETTINGS = {
+    'stability': 0.5,
+    'similarity_boost': 0.75,
+    'style': 0.0,
+    'use_speaker_boost': True
+}
+ELEVENLABS_TTS_SETTINGS = {'voice_settings': ELEVENLABS_VOICE_SETTINGS, 'output_format': DIALOGUE_OUTPUT_FORMAT}
+
+# Per-line fallback: concurrent TTS calls per section and silence between lines
+DIALOGUE_FALLBACK_CONCURRENCY = int(os.environ.get('DIALOGUE_FALLBACK_CONCURRENCY', '4'))
+DIALOGUE_SPEAKER_GAP = float(os.environ.get('DIALOGUE_SPEAKER_GAP', '0.3'))
+DIALOGUE_SAME_SPEAKER_GAP = float(os.environ.get('DIALOGUE_SAME_SPEAKER_GAP', '0.15'))
+
+# Sections longer than this are split at speaker turns and rendered in parallel
+# (each chunk holds a bulk ElevenLabs permit while it streams, so beyond
+# ELEVENLABS_MAX_CONCURRENCY - ELEVENLABS_INTERACTIVE_RESERVE chunks just queue)
+DIALOGUE_CHUNK_LINES = int(os.environ.get('DIALOGUE_CHUNK_LINES', '12'))
+DIALOGUE_CHUNK_CONCURRENCY = int(os.environ.get('DIALOGUE_CHUNK_CONCURRENCY', '4'))
+
+# text-to-dialogue responses meaning "not available to this account"
+DIALOGUE_UNAVAILABLE_STATUSES = (403, 404, 405)
 
 # ElevenLabs voice IDs for different speakers
 VOICE_MAP = {
@@ -28,29 +80,158 @@ def get_voice_id(speaker_name: str) -> str:
     return VOICE_MAP.get(name_lower, VOICE_MAP['maria'])  # Default to Maria
 
 
-async def generate_dialogue_audio(
+def section_content_hash(dialogue_lines: List[dict], speaker_a: str, speaker_b: str) -> str:
+    """Content hash of a section as this service renders it (voices, model, settings, lines)"""
+    return hash_section_content(
+        dialogue_lines,
+        get_voice_id(speaker_a),
+        get_voice_id(speaker_b),
+        DIALOGUE_MODEL_ID,
+        DIALOGUE_SETTINGS
+    )
+
+
+def voice_alias(language: str, section_type: str, location: str, speaker_a: str, speaker_b: str) -> str:
+    """
+    Alias keyed by the voices actually used instead of speaker names
+
+    Speakers sharing a voice (carlos/james, ana/lisa, ben/jordan) share a
+    voice alias, so a section recorded for one pair can serve the other.
+    """
+    return generate_cache_key(language, section_type, location, get_voice_id(speaker_a), get_voice_id(speaker_b))
+
+
+def mentions_speaker_names(dialogue_lines: List[dict], speaker_a: str, speaker_b: str) -> bool:
+    """
+    Whether the spoken script names either speaker, or anyone sharing their voices
+
+    Such a script only fits its own speaker pair, so it must not be reused
+    through the voice alias.
+    """
+    voices = {get_voice_id(speaker_a), get_voice_id(speaker_b)}
+    names = {speaker_a.lower().strip(), speaker_b.lower().strip()}
+    names.update(name for name, voice in VOICE_MAP.items() if voice in voices)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(name) for name in names if name) + r')\b', re.IGNORECASE)
+    return any(
+        pattern.search(line.get('spokenText') or line.get('text', ''))
+        for line in dialogue_lines
+    )
+
+
+def get_elevenlabs_client(api_key: str) -> AsyncElevenLabs:
+    """
+    Build an async ElevenLabs SDK client on top of the shared pooled HTTP client
+    
+    The async client never blocks the event loop, and reusing the pooled
+    httpx client keeps connections to api.elevenlabs.io warm between sections.
+    """
+    return AsyncElevenLabs(
+        api_key=api_key,
+        httpx_client=get_client('elevenlabs'),
+        timeout=ELEVENLABS_DIALOGUE_TIMEOUT
+    )
+
+
+class DialogueTiming:
+    """
+    Per-line timing measured while a dialogue streams
+    
+    Collects the start/end of every line from the voice segments ElevenLabs
+    returns with the audio, and counts MP3 frames for the exact duration.
+    """
+    
+    def __init__(self):
+        self.frames = Mp3FrameCounter()
+        self._lines: Dict[int, List[float]] = {}
+    
+    def feed_audio(self, chunk: bytes) -> None:
+        self.frames.feed(chunk)
+    
+    def add_voice_segments(self, voice_segments) -> None:
+        for segment in voice_segments or ():
+            span = self._lines.get(segment.dialogue_input_index)
+            if span is None:
+                self._lines[segment.dialogue_input_index] = [
+                    segment.start_time_seconds, segment.end_time_seconds
+                ]
+            else:
+                span[0] = min(span[0], segment.start_time_seconds)
+                span[1] = max(span[1], segment.end_time_seconds)
+    
+    def add_line(self, index: int, start: float, end: float) -> None:
+        """Record a line's exact span (per-line fallback)"""
+        self._lines[index] = [start, end]
+    
+    @property
+    def duration_ms(self) -> int:
+        return self.frames.duration_ms
+    
+    def timestamps(self, dialogue_lines: List[dict]) -> List[dict]:
+        """
+        Timestamps for each line
+        
+        Uses the provider's voice segments when present; otherwise falls back
+        to word-count estimates stretched to the measured audio duration.
+        """
+        if not self._lines:
+            return scale_timestamps(calculate_timestamps(dialogue_lines), self.frames.duration_seconds)
+        
+        return [
+            {
+                'text': line.get('spokenText') or line.get('text', ''),
+                'speaker_id': line.get('speakerId', 1),
+                'start': round(start, 3),
+                'end': round(end, 3),
+                'emotion': line.get('emotion')
+            }
+            for line, (start, end) in zip(dialogue_lines, self.line_spans(dialogue_lines))
+        ]
+    
+    def line_spans(self, dialogue_lines: List[dict]) -> List[Tuple[float, float]]:
+        """Unrounded (start, end) seconds per line"""
+        if not self._lines:
+            return [(ts['start'], ts['end']) for ts in self.timestamps(dialogue_lines)]
+        
+        spans = []
+        previous_end = 0.0
+        for index in range(len(dialogue_lines)):
+            # A line the provider produced no segment for (e.g. blank) gets zero length
+            start, end = self._lines.get(index, (previous_end, previous_end))
+            spans.append((start, end))
+            previous_end = end
+        return spans
+
+
+async def stream_dialogue_audio(
     dialogue_lines: List[dict],
     speaker_a: str,
     speaker_b: str,
-    language: str = 'en'
-) -> Tuple[bytes, List[dict]]:
+    language: str = 'en',
+    timing: Optional[DialogueTiming] = None
+) -> AsyncIterator[bytes]:
     """
-    Generate multi-speaker dialogue audio using ElevenLabs text-to-dialogue API
+    Stream multi-speaker dialogue audio chunks as ElevenLabs produces them
+    
+    Lets callers write audio straight to disk instead of holding a whole
+    section in memory.
     
     Args:
         dialogue_lines: List of {text, spokenText, speakerId, emotion}
         speaker_a: Name of first speaker
         speaker_b: Name of second speaker
         language: Language code (en, es, fr)
+        timing: Collects per-line timing and exact duration as the audio streams
         
-    Returns:
-        Tuple of (audio_bytes, estimated_timestamps)
+    Yields:
+        MP3 byte chunks
     """
+    if timing is None:
+        timing = DialogueTiming()
     api_key = os.environ.get('ELEVENLABS_API_KEY')
     if not api_key:
         raise ValueError("ELEVENLABS_API_KEY not configured")
     
-    client = ElevenLabs(api_key=api_key)
+    client = get_elevenlabs_client(api_key)
     
     # Get voice IDs for speakers
     voice_a = get_voice_id(speaker_a)
@@ -68,31 +249,226 @@ async def generate_dialogue_audio(
             'voice_id': voice_id
         })
     
-    # Call ElevenLabs text-to-dialogue API
-    # Note: As of current API, this endpoint may be called text_to_dialogue or similar
-    # Adjust based on actual SDK methods
+    dialogue_api = getattr(client, 'text_to_dialogue', None)
+    if dialogue_api is None:
+        # SDK without text_to_dialogue: synthesize each line and stitch them
+        logger.warning("text_to_dialogue not available, falling back to per-line synthesis")
+        yield await _fallback_audio(dialogue_lines, voice_a, voice_b, client, timing)
+        return
+    
+    # Long sections are split at speaker turns and the pieces rendered in parallel
+    spans = split_dialogue_turns(dialogue_lines, DIALOGUE_CHUNK_LINES)
+    if len(spans) == 1:
+        async for audio in _stream_dialogue_once(
+            dialogue_api, client, dialogue_lines, inputs, voice_a, voice_b, timing
+        ):
+            yield audio
+        return
+    
+    async for audio in _stream_dialogue_chunked(
+        dialogue_api, client, dialogue_lines, inputs, voice_a, voice_b, timing, spans
+    ):
+        yield audio
+
+
+def split_dialogue_turns(dialogue_lines: List[dict], max_lines: int) -> List[Tuple[int, int]]:
+    """
+    Split a section into roughly equal runs of lines, cutting only at speaker turns
+    
+    Args:
+        dialogue_lines: Section lines in order
+        max_lines: Target maximum lines per chunk (0 disables splitting)
+        
+    Returns:
+        List of (start, end) line index ranges covering the section
+    """
+    total = len(dialogue_lines)
+    if max_lines <= 0 or total <= max_lines:
+        return [(0, total)]
+    
+    turns = [
+        i for i in range(1, total)
+        if dialogue_lines[i].get('speakerId', 1) != dialogue_lines[i - 1].get('speakerId', 1)
+    ]
+    chunk_count = math.ceil(total / max_lines)
+    target = total / chunk_count
+    
+    spans = []
+    start = 0
+    for k in range(1, chunk_count):
+        candidates = [t for t in turns if t > start]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda t: abs(t - k * target))
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, total))
+    return spans
+
+
+async def _stream_dialogue_once(
+    dialogue_api,
+    client: AsyncElevenLabs,
+    dialogue_lines: List[dict],
+    inputs: List[dict],
+    voice_a: str,
+    voice_b: str,
+    timing: DialogueTiming
+) -> AsyncIterator[bytes]:
+    """Render lines with one text-to-dialogue stream"""
+    # Call ElevenLabs text-to-dialogue API (async stream, yields to the event loop per chunk),
+    # holding a bulk ElevenLabs limiter permit for the whole call: bulk permits leave the
+    # interactive reserve free, so /api/tts isn't starved while renders stream
+    chars = sum(len(item['text']) for item in inputs)
+    
+    async def open_dialogue():
+        # Opening counts as the attempt: failures before the first chunk are retried,
+        # a stream that breaks after audio has been yielded is not
+        permit = await get_limiter('elevenlabs').enter(chars=chars, bulk=True)
+        stream = dialogue_api.stream_with_timestamps(
+            inputs=inputs, model_id=DIALOGUE_MODEL_ID, output_format=DIALOGUE_OUTPUT_FORMAT
+        )
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await stream.aclose()
+            permit.release()
+            raise
+        return stream, first, permit
+    
+    async def discard(opened):
+        # A stream that lost a hedge race: close it and give its permit back
+        stream, _, permit = opened
+        try:
+            await stream.aclose()
+        finally:
+            permit.release()
+    
     try:
-        # Generate dialogue audio
-        audio_response = client.text_to_dialogue.convert(
-            inputs=inputs,
-            model_id="eleven_v3"
+        stream, first, permit = await get_resilience('elevenlabs').call(
+            open_dialogue, ELEVENLABS_DIALOGUE_TIMEOUT, discard, operation='dialogue_stream'
         )
+    except Exception as e:
+        # Account or region without access to text-to-dialogue
+        if getattr(e, 'status_code', None) not in DIALOGUE_UNAVAILABLE_STATUSES:
+            raise
+        logger.warning(f"text_to_dialogue unavailable ({e.status_code}), falling back to per-line synthesis")
+        yield await _fallback_audio(dialogue_lines, voice_a, voice_b, client, timing)
+        return
+    
+    try:
+        if first is not None:
+            audio = _chunk_audio(first, timing)
+            if audio:
+                yield audio
+        async for chunk in stream:
+            audio = _chunk_audio(chunk, timing)
+            if audio:
+                yield audio
+    finally:
+        await stream.aclose()
+        permit.release()
+
+
+async def _stream_dialogue_chunked(
+    dialogue_api,
+    client: AsyncElevenLabs,
+    dialogue_lines: List[dict],
+    inputs: List[dict],
+    voice_a: str,
+    voice_b: str,
+    timing: DialogueTiming,
+    spans: List[Tuple[int, int]]
+) -> AsyncIterator[bytes]:
+    """
+    Render chunks concurrently and emit them in order, stitched at frame boundaries
+    
+    Each chunk's line timing is offset by the audio emitted before it, so the
+    combined timestamps stay exact. Audio for chunk N is yielded as soon as
+    chunks 0..N are done, while later chunks are still rendering.
+    """
+    semaphore = asyncio.Semaphore(DIALOGUE_CHUNK_CONCURRENCY)
+    
+    async def render(start: int, end: int) -> Tuple[bytes, List[Tuple[float, float]]]:
+        async with semaphore:
+            chunk_timing = DialogueTiming()
+            parts = []
+            async for audio in _stream_dialogue_once(
+                dialogue_api, client, dialogue_lines[start:end], inputs[start:end],
+                voice_a, voice_b, chunk_timing
+            ):
+                parts.append(audio)
+            return b"".join(parts), chunk_timing.line_spans(dialogue_lines[start:end])
+    
+    tasks = [asyncio.ensure_future(render(start, end)) for start, end in spans]
+    try:
+        for (start, _), task in zip(spans, tasks):
+            audio, line_spans = await task
+            # Chunks always meet at a speaker turn, so separate them like one
+            gap = DIALOGUE_SPEAKER_GAP if start > 0 else 0.0
+            piece, [(clip_start, _)] = stitch_mp3([audio], [gap])
+            offset = timing.frames.duration_seconds + clip_start
+            for index, (line_start, line_end) in enumerate(line_spans, start):
+                timing.add_line(index, offset + line_start, offset + line_end)
+            timing.feed_audio(piece)
+            yield piece
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _fallback_audio(
+    dialogue_lines: List[dict],
+    voice_a: str,
+    voice_b: str,
+    client: AsyncElevenLabs,
+    timing: DialogueTiming
+) -> bytes:
+    """Run the per-line fallback and record its exact line timing"""
+    audio_bytes, timestamps = await generate_dialogue_fallback(dialogue_lines, voice_a, voice_b, client)
+    for index, ts in enumerate(timestamps):
+        timing.add_line(index, ts['start'], ts['end'])
+    timing.feed_audio(audio_bytes)
+    return audio_bytes
+
+
+def _chunk_audio(chunk, timing: DialogueTiming) -> bytes:
+    """Decode one streamed chunk and record its voice segments and frames"""
+    timing.add_voice_segments(chunk.voice_segments)
+    audio = base64.b64decode(chunk.audio_base_64) if chunk.audio_base_64 else b""
+    timing.feed_audio(audio)
+    return audio
+
+
+async def generate_dialogue_audio(
+    dialogue_lines: List[dict],
+    speaker_a: str,
+    speaker_b: str,
+    language: str = 'en'
+) -> Tuple[bytes, List[dict]]:
+    """
+    Generate multi-speaker dialogue audio using ElevenLabs text-to-dialogue API
+    
+    Args:
+        dialogue_lines: List of {text, spokenText, speakerId, emotion}
+        speaker_a: Name of first speaker
+        speaker_b: Name of second speaker
+        language: Language code (en, es, fr)
         
-        # Collect audio bytes
-        audio_bytes = b""
-        for chunk in audio_response:
-            audio_bytes += chunk
-        
-        # Calculate estimated timestamps based on text length
-        timestamps = calculate_timestamps(dialogue_lines)
-        
-        return audio_bytes, timestamps
-        
-    except AttributeError:
-        # Fallback: If text_to_dialogue not available, use individual TTS calls
-        # This is a temporary fallback
-        print("Warning: text_to_dialogue not available, falling back to concatenation")
-        return await generate_dialogue_fallback(dialogue_lines, voice_a, voice_b, client)
+    Returns:
+        Tuple of (audio_bytes, timestamps)
+    """
+    # Collect chunks in a list and join once (linear, not quadratic)
+    timing = DialogueTiming()
+    chunks = []
+    async for chunk in stream_dialogue_audio(dialogue_lines, speaker_a, speaker_b, language, timing):
+        chunks.append(chunk)
+    audio_bytes = b"".join(chunks)
+    
+    return audio_bytes, timing.timestamps(dialogue_lines)
 
 
 def calculate_timestamps(dialogue_lines: List[dict]) -> List[dict]:
@@ -133,17 +509,134 @@ def calculate_timestamps(dialogue_lines: List[dict]) -> List[dict]:
     return timestamps
 
 
+def scale_timestamps(timestamps: List[dict], duration_seconds: float) -> List[dict]:
+    """
+    Stretch estimated timestamps so the last line ends at the measured duration
+    
+    Keeps the relative pacing of the estimate but removes the drift against
+    the real audio length.
+    """
+    if not timestamps or duration_seconds <= 0 or timestamps[-1]['end'] <= 0:
+        return timestamps
+    factor = duration_seconds / timestamps[-1]['end']
+    return [
+        dict(ts, start=round(ts['start'] * factor, 3), end=round(ts['end'] * factor, 3))
+        for ts in timestamps
+    ]
+
+
+async def synthesize_line(client: AsyncElevenLabs, voice_id: str, text: str) -> bytes:
+    """
+    Synthesize one line through the standard text-to-speech endpoint
+    
+    Uses the same model and settings as /api/tts, so results are shared with
+    it through the TTS cache and a repeated line is only synthesized once.
+    """
+    cache_key = make_tts_cache_key('elevenlabs', voice_id, text, ELEVENLABS_TTS_MODEL, ELEVENLABS_TTS_SETTINGS)
+    if TTS_CACHE_ENABLED:
+        cached = await tts_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    async def attempt():
+        async with get_limiter('elevenlabs').acquire(chars=len(text), bulk=True):
+            chunks = []
+            async for chunk in client.text_to_speech.convert(
+                voice_id,
+                text=text,
+                model_id=ELEVENLABS_TTS_MODEL,
+                voice_settings=VoiceSettings(**ELEVENLABS_VOICE_SETTINGS),
+                output_format=DIALOGUE_OUTPUT_FORMAT
+            ):
+                chunks.append(chunk)
+        return b"".join(chunks)
+    
+    audio = await get_resilience('elevenlabs').call(
+        attempt, ELEVENLABS_DIALOGUE_TIMEOUT, operation='line_tts'
+    )
+    if not audio:
+        raise ValueError(f"ElevenLabs returned no audio for line: {text[:40]!r}")
+    if TTS_CACHE_ENABLED:
+        await tts_cache.put(cache_key, audio)
+    return audio
+
+
 async def generate_dialogue_fallback(
     dialogue_lines: List[dict],
     voice_a: str,
     voice_b: str,
-    client: ElevenLabs
+    client: AsyncElevenLabs
 ) -> Tuple[bytes, List[dict]]:
     """
     Fallback: Generate dialogue by calling TTS for each line and concatenating
     Only used if text-to-dialogue API is not available
+    
+    Lines are synthesized concurrently (at most DIALOGUE_FALLBACK_CONCURRENCY
+    at a time, identical lines once) and stitched losslessly at MP3 frame
+    boundaries with silent frames between them, so every line's start and end
+    are exact.
+    
+    Raises:
+        ValueError: A line produced no audio (never cache a silent section)
     """
-    # This is a simplified fallback - in production you'd want proper audio concatenation
-    # For now, just return empty audio and timestamps
-    timestamps = calculate_timestamps(dialogue_lines)
-    return b"", timestamps
+    semaphore = asyncio.Semaphore(DIALOGUE_FALLBACK_CONCURRENCY)
+    jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+    
+    async def bounded(voice_id: str, text: str) -> bytes:
+        async with semaphore:
+            return await synthesize_line(client, voice_id, text)
+    
+    spoken = []
+    for line in dialogue_lines:
+        text = line.get('spokenText') or line.get('text', '')
+        voice_id = voice_a if line.get('speakerId', 1) == 1 else voice_b
+        spoken.append((voice_id, text))
+        if text.strip() and (voice_id, text) not in jobs:
+            jobs[(voice_id, text)] = asyncio.ensure_future(bounded(voice_id, text))
+    
+    try:
+        await asyncio.gather(*jobs.values())
+    finally:
+        # A failed line stops the rest; wait for them so their limiter permits
+        # are back before returning (and no task is left pending)
+        for job in jobs.values():
+            job.cancel()
+        await asyncio.gather(*jobs.values(), return_exceptions=True)
+    
+    clips, gaps, indexes = [], [], []
+    previous_speaker = None
+    for index, ((voice_id, text), line) in enumerate(zip(spoken, dialogue_lines)):
+        if not text.strip():
+            continue
+        speaker_id = line.get('speakerId', 1)
+        if previous_speaker is None:
+            gaps.append(0.0)
+        elif speaker_id != previous_speaker:
+            gaps.append(DIALOGUE_SPEAKER_GAP)
+        else:
+            gaps.append(DIALOGUE_SAME_SPEAKER_GAP)
+        clips.append(jobs[(voice_id, text)].result())
+        indexes.append(index)
+        previous_speaker = speaker_id
+    
+    if not clips:
+        raise ValueError("Dialogue has no lines to synthesize")
+    audio_bytes, spans = stitch_mp3(clips, gaps)
+    
+    # Blank lines get a zero-length span at the end of the previous line
+    span_by_index = dict(zip(indexes, spans))
+    timestamps = []
+    previous_end = 0.0
+    for index, (voice_id, text) in enumerate(spoken):
+        start, end = span_by_index.get(index, (previous_end, previous_end))
+        line = dialogue_lines[index]
+        timestamps.append({
+            'text': text,
+            'speaker_id': line.get('speakerId', 1),
+            'start': round(start, 3),
+            'end': round(end, 3),
+            'emotion': line.get('emotion')
+        })
+        previous_end = end
+    
+    return audio_bytes, timestamps
@@ -0,0 +1,205 @@
+"""
+Background Generation Jobs
+Bounded queue + worker pool for section generation, so clients get a job id
+back immediately (202 Accepted) and poll or subscribe for completion instead
+of holding an HTTP connection open for the whole synthesis. Jobs run in
+worker tasks, so they finish even if the client disconnects.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+GENERATION_WORKERS = int(os.environ.get('GENERATION_WORKERS', '4'))
+GENERATION_QUEUE_DEPTH = int(os.environ.get('GENERATION_QUEUE_DEPTH', '100'))
+GENERATION_JOB_TTL = float(os.environ.get('GENERATION_JOB_TTL', '3600'))
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """The job queue is at GENERATION_QUEUE_DEPTH"""
+
+
+class GenerationJob:
+    """One queued section generation and its outcome"""
+
+    def __init__(self, cache_key: str, work: Callable[[], Awaitable[dict]]):
+        self.id = uuid.uuid4().hex
+        self.cache_key = cache_key
+        self.work = work
+        self.status = JOB_QUEUED
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Set (and replaced with a fresh event) on every status change
+        self.changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'cache_key': self.cache_key,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class GenerationJobQueue:
+    """Bounded FIFO of generation jobs drained by a fixed pool of workers"""
+
+    def __init__(
+        self,
+        worker_count: int = GENERATION_WORKERS,
+        max_depth: int = GENERATION_QUEUE_DEPTH,
+        job_ttl: float = GENERATION_JOB_TTL
+    ):
+        self.worker_count = worker_count
+        self.max_depth = max_depth
+        self.job_ttl = job_ttl
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers = []
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._active_by_key: Dict[str, GenerationJob] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Start the worker pool (called from the app lifespan)"""
+        self._ensure_workers()
+
+    def _ensure_workers(self) -> None:
+        # Restart if the pool belongs to an event loop that is gone (e.g. tests)
+        loop = asyncio.get_running_loop()
+        if self._workers and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the workers; running jobs are cancelled and queued ones failed"""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # Pollers and /events subscribers must still see a terminal state
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            self._queue.task_done()
+            job.error = "Dropped by server shutdown before it started"
+            job.finished_at = time.time()
+            job._set_status(JOB_FAILED)
+            if self._active_by_key.get(job.cache_key) is job:
+                del self._active_by_key[job.cache_key]
+
+    def submit(self, cache_key: str, work: Callable[[], Awaitable[dict]]) -> GenerationJob:
+        """
+        Queue a generation, or return the job already queued/running for cache_key
+
+        Raises:
+            QueueFull: the queue is at its configured depth
+        """
+        self._prune()
+        active = self._active_by_key.get(cache_key)
+        if active is not None and not active.done:
+            return active
+
+        self._ensure_workers()
+        job = GenerationJob(cache_key, work)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"Generation queue is full ({self.max_depth} jobs)")
+
+        self._jobs[job.id] = job
+        self._active_by_key[cache_key] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        """Look up a job by id (finished jobs are kept for job_ttl seconds)"""
+        return self._jobs.get(job_id)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: GenerationJob) -> None:
+        job.started_at = time.time()
+        job._set_status(JOB_RUNNING)
+        try:
+            job.result = await job.work()
+            job.finished_at = time.time()
+            job._set_status(JOB_SUCCEEDED)
+        except asyncio.CancelledError:
+            job.error = "Cancelled by server shutdown"
+            job.finished_at = time.time()
+            job._set_status(JOB_FAILED)
+            raise
+        except Exception as e:
+            logger.warning(f"Generation job {job.id} for {job.cache_key} failed: {e}")
+            job.error = getattr(e, 'detail', None) or str(e)
+            job.finished_at = time.time()
+            job._set_status(JOB_FAILED)
+        finally:
+            if self._active_by_key.get(job.cache_key) is job:
+                del self._active_by_key[job.cache_key]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        """Queue depth and worker usage"""
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': self.worker_count,
+            'running': self.running,
+            'max_depth': self.max_depth,
+            'queued': statuses.count(JOB_QUEUED),
+            'in_progress': statuses.count(JOB_RUNNING),
+            'succeeded': statuses.count(JOB_SUCCEEDED),
+            'failed': statuses.count(JOB_FAILED),
+        }
+
+
+# Process-wide job queue for section generation
+generation_jobs = GenerationJobQueue()
@@ -0,0 +1,109 @@
+"""
+Cross-Worker Generation Leases
+MongoDB-backed leases so only one uvicorn worker (or host) generates a given
+cache_key at a time. A lease carries an expiry that the holder keeps renewing;
+if the holder crashes the lease goes stale and the next worker takes it over.
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL_SECONDS = float(os.environ.get('GENERATION_LEASE_TTL', '60'))
+LEASE_POLL_INTERVAL = float(os.environ.get('GENERATION_LEASE_POLL_INTERVAL', '0.5'))
+
+
+def make_owner_id() -> str:
+    """Identify this worker process (host:pid:nonce)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class GenerationLease:
+    """Lease manager over a MongoDB collection keyed by cache_key (_id)"""
+
+    def __init__(self, collection, ttl_seconds: float = LEASE_TTL_SECONDS, owner_id: Optional[str] = None):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.owner_id = owner_id or make_owner_id()
+
+    def _expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+
+    async def acquire(self, key: str) -> bool:
+        """
+        Try to take the lease for a key
+
+        Returns:
+            True if this worker now holds the lease, False if another live
+            worker does
+        """
+        now = datetime.utcnow()
+        try:
+            await self.collection.insert_one({
+                "_id": key,
+                "owner": self.owner_id,
+                "acquired_at": now,
+                "expires_at": self._expiry(),
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+
+        # Someone holds (or held) the lease; take it over only if it has gone stale
+        taken = await self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$lt": now}},
+            {"$set": {"owner": self.owner_id, "acquired_at": now, "expires_at": self._expiry()}},
+        )
+        if taken is not None:
+            logger.warning(f"Recovered stale generation lease for {key} from {taken.get('owner')}")
+            return True
+        return False
+
+    async def renew(self, key: str) -> bool:
+        """Extend a lease this worker holds; False if it was lost"""
+        result = await self.collection.update_one(
+            {"_id": key, "owner": self.owner_id},
+            {"$set": {"expires_at": self._expiry()}},
+        )
+        return result.matched_count == 1
+
+    async def release(self, key: str) -> None:
+        """Drop a lease this worker holds"""
+        await self.collection.delete_one({"_id": key, "owner": self.owner_id})
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        """
+        Keep a lease alive while the block runs, then release it
+
+        Must only be entered after a successful acquire(). A heartbeat task
+        renews the lease at a third of its TTL so long generations are not
+        mistaken for crashed workers.
+        """
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.ttl_seconds / 3)
+                if not await self.renew(key):
+                    logger.warning(f"Lost generation lease for {key}")
+                    return
+
+        renewer = asyncio.create_task(heartbeat())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            try:
+                await self.release(key)
+            except Exception as e:
+                # The lease will expire on its own; don't mask the real outcome
+                logger.warning(f"Failed to release generation lease for {key}: {e}")
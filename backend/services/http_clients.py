@@ -0,0 +1,109 @@
+"""
+Shared Upstream HTTP Clients
+One pooled httpx.AsyncClient per upstream provider (OpenAI, ElevenLabs),
+opened in the FastAPI lifespan hook and reused by every request so calls
+skip the TCP/TLS handshake once a connection is warm.
+"""
+
+import os
+import logging
+from typing import Dict
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+# Base URLs for each upstream provider
+UPSTREAM_BASE_URLS = {
+    'openai': os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com'),
+    'elevenlabs': os.environ.get('ELEVENLABS_BASE_URL', 'https://api.elevenlabs.io'),
+}
+
+# Per-upstream total timeouts (seconds). Chat completions are much slower than TTS.
+UPSTREAM_TIMEOUTS = {
+    'openai': float(os.environ.get('OPENAI_TIMEOUT', '60')),
+    'elevenlabs': float(os.environ.get('ELEVENLABS_TIMEOUT', '30')),
+}
+
+# Connection pool settings shared by all upstreams
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '5'))
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('UPSTREAM_MAX_CONNECTIONS', '100'))
+UPSTREAM_MAX_KEEPALIVE = int(os.environ.get('UPSTREAM_MAX_KEEPALIVE', '20'))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get('UPSTREAM_KEEPALIVE_EXPIRY', '30'))
+UPSTREAM_HTTP2 = os.environ.get('UPSTREAM_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_client(provider: str) -> httpx.AsyncClient:
+    """
+    Create a pooled client for one upstream provider
+
+    Args:
+        provider: Upstream name ('openai' or 'elevenlabs')
+
+    Returns:
+        Configured httpx.AsyncClient (caller owns closing it)
+    """
+    if provider not in UPSTREAM_BASE_URLS:
+        raise ValueError(f"Unknown upstream provider: {provider}")
+
+    http2 = UPSTREAM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("UPSTREAM_HTTP2 is enabled but 'h2' is not installed; using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(UPSTREAM_TIMEOUTS[provider], connect=UPSTREAM_CONNECT_TIMEOUT)
+
+    return httpx.AsyncClient(
+        base_url=UPSTREAM_BASE_URLS[provider],
+        limits=limits,
+        timeout=timeout,
+        http2=http2,
+    )
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Get the shared client for an upstream provider
+
+    Clients are normally opened by `open_clients()` at startup. If the app is
+    running without its lifespan (e.g. a bare TestClient), the client is
+    created lazily on first use instead.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = build_client(provider)
+        _clients[provider] = client
+    return client
+
+
+async def open_clients() -> None:
+    """Open one pooled client per upstream (called from the app lifespan)"""
+    for provider in UPSTREAM_BASE_URLS:
+        get_client(provider)
+
+
+async def close_clients() -> None:
+    """Close all shared clients and release their pooled connections"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
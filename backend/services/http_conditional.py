@@ -0,0 +1,139 @@
+"""
+HTTP Conditional & Range Request Helpers
+Byte-range parsing, strong ETags and If-None-Match / If-Modified-Since /
+If-Range evaluation for serving immutable cached audio files.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header is well-formed but lies entirely outside the file"""
+
+
+def make_etag(cache_key: str, file_size: int, content_hash: Optional[str] = None) -> str:
+    """
+    Build a strong ETag for a cached audio file
+
+    Uses the content hash when the entry has one; otherwise derives a tag
+    from the cache key and size, which is enough because a cache entry's
+    audio never changes once written.
+    """
+    if content_hash:
+        return f'"{content_hash}"'
+    digest = hashlib.sha256(f"{cache_key}:{file_size}".encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def http_date(timestamp: float) -> str:
+    """Format a POSIX timestamp as an HTTP-date"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _etag_list(header: str):
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def is_not_modified(
+    etag: str,
+    last_modified: float,
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str]
+) -> bool:
+    """
+    Decide whether a conditional GET can be answered with 304
+
+    If-None-Match takes precedence (weak comparison, '*' matches anything);
+    If-Modified-Since is only consulted when If-None-Match is absent.
+    """
+    if if_none_match:
+        tags = _etag_list(if_none_match)
+        return '*' in tags or _opaque(etag) in (_opaque(tag) for tag in tags)
+
+    if if_modified_since:
+        since = _parse_http_date(if_modified_since)
+        if since is None:
+            return False
+        modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+        return modified <= since
+
+    return False
+
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: float) -> bool:
+    """
+    Evaluate If-Range: the Range header applies only if the client's copy is current
+
+    Entity tags must match strongly; dates must match Last-Modified exactly.
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return not if_range.startswith('W/') and if_range == etag
+    return if_range == http_date(last_modified)
+
+
+def parse_range(header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range
+
+    Supports "bytes=start-end", open-ended "bytes=start-" and suffix
+    "bytes=-length".
+
+    Returns:
+        Inclusive (start, end) byte offsets, or None when the header is
+        absent, malformed or asks for multiple ranges (serve the whole file)
+
+    Raises:
+        RangeNotSatisfiable: the range starts at or beyond the end of the file
+    """
+    if not header:
+        return None
+    if file_size <= 0:
+        raise RangeNotSatisfiable()
+
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec or ',' in spec:
+        return None
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    first, last = first.strip(), last.strip()
+
+    try:
+        if not first:
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(file_size - length, 0), file_size - 1
+
+        start = int(first)
+        end = int(last) if last else file_size - 1
+    except ValueError:
+        return None
+
+    if start >= file_size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, file_size - 1)
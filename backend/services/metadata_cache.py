@@ -0,0 +1,123 @@
+"""
+Audio Cache Metadata LRU
+Bounded in-process cache of AudioCacheEntry documents in front of MongoDB.
+Entries never change once written, but GC or eviction in another worker can
+delete them, so positive hits expire after METADATA_POSITIVE_TTL (this
+worker's own GC invalidates at once). Misses are cached briefly (negative
+TTL) so a section generated by another worker becomes visible quickly.
+Aliases resolve to their newest variant, which a new generation can change,
+so they get a shorter TTL (and are invalidated in this process when a
+variant is stored).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', '10000'))
+METADATA_NEGATIVE_TTL = float(os.environ.get('METADATA_NEGATIVE_TTL', '5'))
+METADATA_POSITIVE_TTL = float(os.environ.get('METADATA_POSITIVE_TTL', '300'))
+METADATA_ALIAS_TTL = float(os.environ.get('METADATA_ALIAS_TTL', '30'))
+
+# Returned by get() when the cache has no opinion and MongoDB must be asked
+MISSING = object()
+
+
+class MetadataCache:
+    """LRU of cache_key -> entry dict, with expiring positive and short-lived negative entries"""
+
+    def __init__(
+        self,
+        max_entries: int = METADATA_CACHE_SIZE,
+        negative_ttl: float = METADATA_NEGATIVE_TTL,
+        positive_ttl: float = METADATA_POSITIVE_TTL
+    ):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.positive_ttl = positive_ttl
+        # cache_key -> entry dict (no expiry), (expiry, entry dict) for an entry
+        # with a TTL, or expiry timestamp (float) for a negative entry
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, cache_key: str):
+        """
+        Look up a cache_key
+
+        Returns:
+            The entry dict on a hit, None if the key is known not to exist,
+            or MISSING if MongoDB has to be consulted
+        """
+        value = self._entries.get(cache_key)
+        if value is None:
+            self._stats['misses'] += 1
+            return MISSING
+
+        if isinstance(value, float):
+            if value < time.monotonic():
+                del self._entries[cache_key]
+                self._stats['misses'] += 1
+                return MISSING
+            self._stats['negative_hits'] += 1
+            return None
+
+        if isinstance(value, tuple):
+            expires, value = value
+            if expires < time.monotonic():
+                del self._entries[cache_key]
+                self._stats['misses'] += 1
+                return MISSING
+
+        self._entries.move_to_end(cache_key)
+        self._stats['hits'] += 1
+        return value
+
+    def put(self, cache_key: str, entry: dict, ttl: Optional[float] = None) -> None:
+        """Remember an entry (without Mongo's _id) for ttl seconds (default positive_ttl; 0 = until evicted)"""
+        if self.max_entries <= 0:
+            return
+        if ttl is None:
+            ttl = self.positive_ttl
+        entry = {k: v for k, v in entry.items() if k != '_id'}
+        self._store(cache_key, (time.monotonic() + ttl, entry) if ttl > 0 else entry)
+
+    def put_negative(self, cache_key: str) -> None:
+        """Remember that a cache_key does not exist, for negative_ttl seconds"""
+        if self.max_entries <= 0 or self.negative_ttl <= 0:
+            return
+        self._store(cache_key, time.monotonic() + self.negative_ttl)
+
+    def invalidate(self, cache_key: str) -> None:
+        """Forget one key"""
+        self._entries.pop(cache_key, None)
+
+    def clear(self) -> None:
+        """Forget everything (used when the cache is cleared)"""
+        self._entries.clear()
+
+    def _store(self, cache_key: str, value: object) -> None:
+        self._entries[cache_key] = value
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def stats(self) -> dict:
+        """Snapshot of hit counts and size"""
+        s = self._stats
+        lookups = s['hits'] + s['negative_hits'] + s['misses']
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': s['hits'],
+            'negative_hits': s['negative_hits'],
+            'misses': s['misses'],
+            'evictions': s['evictions'],
+            'hit_rate': round((s['hits'] + s['negative_hits']) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Process-wide metadata cache used by the audio cache routes
+metadata_cache = MetadataCache()
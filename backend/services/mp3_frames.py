@@ -0,0 +1,297 @@
+"""
+MP3 Frame Parsing
+Exact audio duration from MPEG frame headers, without decoding: every frame
+carries a fixed number of samples, so duration = samples / sample rate.
+Skips ID3v2/ID3v1 tags and Xing/Info/VBRI header frames, and can be fed
+chunk by chunk while audio streams to disk. Clips of the same format can be
+stitched losslessly at frame boundaries, with silent frames for gaps.
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Bitrates in kbps by (version is MPEG1, layer) and header index 1-14
+_BITRATES = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates by version bits (3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+HEADER_SIZE = 4
+ID3V2_HEADER_SIZE = 10
+ID3V1_SIZE = 128
+
+
+class FrameHeader:
+    """The fields of one MPEG audio frame header that timing needs"""
+
+    __slots__ = ('mpeg1', 'layer', 'bitrate', 'sample_rate', 'padding', 'mono', 'length', 'samples')
+
+    def __init__(self, mpeg1: bool, layer: int, bitrate: int, sample_rate: int, padding: int, mono: bool):
+        self.mpeg1 = mpeg1
+        self.layer = layer
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.mono = mono
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            self.samples = 1152 if (layer == 2 or mpeg1) else 576
+            self.length = (self.samples // 8) * bitrate * 1000 // sample_rate + padding
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio in this frame"""
+        return self.samples / self.sample_rate
+
+    @property
+    def side_info_size(self) -> int:
+        """Layer III side information size (where Xing/Info tags live)"""
+        if self.mpeg1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def parse_frame_header(data: bytes, offset: int = 0) -> Optional[FrameHeader]:
+    """
+    Parse the 4-byte frame header at `offset`
+
+    Returns:
+        FrameHeader, or None if the bytes are not a valid (non free-format) header
+    """
+    if len(data) - offset < HEADER_SIZE:
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    return FrameHeader(
+        mpeg1=mpeg1,
+        layer=layer,
+        bitrate=_BITRATES[(mpeg1, layer)][bitrate_index - 1],
+        sample_rate=_SAMPLE_RATES[version_bits][rate_index],
+        padding=(b2 >> 1) & 0x01,
+        mono=(b3 >> 6) == 3,
+    )
+
+
+def id3v2_size(data: bytes, offset: int = 0) -> Optional[int]:
+    """Total size of an ID3v2 tag at `offset` (header, body and footer), or None"""
+    if len(data) - offset < ID3V2_HEADER_SIZE or data[offset:offset + 3] != b'ID3':
+        return None
+    size_bytes = data[offset + 6:offset + 10]
+    body = 0
+    for byte in size_bytes:
+        body = (body << 7) | (byte & 0x7F)  # syncsafe integer
+    footer = ID3V2_HEADER_SIZE if data[offset + 5] & 0x10 else 0
+    return ID3V2_HEADER_SIZE + body + footer
+
+
+def is_info_frame(data: bytes, offset: int, header: FrameHeader) -> bool:
+    """Whether the frame is a Xing/Info/VBRI header frame (metadata, no audio)"""
+    if header.layer != 3:
+        return False
+    tag_at = offset + HEADER_SIZE + header.side_info_size
+    if data[tag_at:tag_at + 4] in (b'Xing', b'Info'):
+        return True
+    vbri_at = offset + HEADER_SIZE + 32
+    return data[vbri_at:vbri_at + 4] == b'VBRI'
+
+
+def iter_audio_frames(data: bytes) -> Iterator[Tuple[FrameHeader, bytes]]:
+    """Yield (header, frame bytes) for every audio frame, skipping tags, info frames and garbage"""
+    pos = 0
+    size = len(data)
+    while size - pos >= HEADER_SIZE:
+        if data[pos:pos + 3] == b'ID3':
+            tag = id3v2_size(data, pos)
+            if tag is None:
+                break
+            pos += tag
+            continue
+        if data[pos:pos + 3] == b'TAG':
+            pos += ID3V1_SIZE
+            continue
+
+        header = parse_frame_header(data, pos)
+        if header is None:
+            next_sync = data.find(b'\xff', pos + 1)
+            if next_sync < 0:
+                break
+            pos = next_sync
+            continue
+        if header.length > size - pos:
+            break  # truncated final frame
+        if not is_info_frame(data, pos, header):
+            yield header, data[pos:pos + header.length]
+        pos += header.length
+
+
+def silent_frame(template: bytes) -> bytes:
+    """
+    A frame that decodes to silence, in the same format as `template`
+
+    Zeroed side information means no Huffman data and no bit-reservoir
+    borrowing, so the frame is silent and independent of its neighbours.
+    """
+    header = bytearray(template[:HEADER_SIZE])
+    header[1] |= 0x01   # no CRC
+    header[2] &= ~0x02  # no padding
+    length = parse_frame_header(bytes(header)).length
+    return bytes(header) + b'\x00' * (length - HEADER_SIZE)
+
+
+def _format_of(header: FrameHeader) -> Tuple[bool, int, int, bool]:
+    return header.mpeg1, header.layer, header.sample_rate, header.mono
+
+
+def stitch_mp3(clips: Sequence[bytes], gaps: Sequence[float]) -> Tuple[bytes, List[Tuple[float, float]]]:
+    """
+    Concatenate MP3 clips frame by frame with silence before each one
+
+    No re-encoding happens, and each clip's start and end fall exactly on
+    frame boundaries of the output, so they come back as exact times.
+
+    Args:
+        clips: Complete MP3 files, all with the same layer, sample rate and channel mode
+        gaps: Seconds of silence before each clip (rounded to whole frames)
+
+    Returns:
+        Tuple of (stitched MP3 bytes, [(start_seconds, end_seconds)] per clip)
+
+    Raises:
+        ValueError: clips are empty or in different formats
+    """
+    parts: List[bytes] = []
+    spans: List[Tuple[float, float]] = []
+    fmt = None
+    silence = b''
+    samples = 0
+    sample_rate = 0
+    frame_samples = 0
+
+    for clip, gap in zip(clips, gaps):
+        frames = list(iter_audio_frames(clip))
+        if not frames:
+            raise ValueError("MP3 clip contains no audio frames")
+        first = frames[0][0]
+        if fmt is None:
+            fmt = _format_of(first)
+            silence = silent_frame(frames[0][1])
+            sample_rate = first.sample_rate
+            frame_samples = first.samples
+
+        silent_count = int(round(gap * sample_rate / frame_samples)) if gap > 0 else 0
+        parts.append(silence * silent_count)
+        samples += silent_count * frame_samples
+
+        start = samples
+        for header, frame in frames:
+            if _format_of(header) != fmt:
+                raise ValueError("MP3 clips must share layer, sample rate and channel mode")
+            parts.append(frame)
+            samples += header.samples
+        spans.append((start / sample_rate, samples / sample_rate))
+
+    return b''.join(parts), spans
+
+
+class Mp3FrameCounter:
+    """
+    Incremental MP3 duration counter
+
+    feed() chunks in stream order; `duration_seconds` is exact once the whole
+    stream has been fed. Garbage between frames is skipped by resyncing on the
+    next valid header, and a truncated final frame is not counted.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._skip = 0
+        self.frames = 0
+        self.bytes_fed = 0
+        self._samples: Dict[int, int] = {}  # sample rate -> samples
+
+    def feed(self, data: bytes) -> None:
+        self.bytes_fed += len(data)
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            data = data[skipped:]
+        self._buffer += data
+
+        buf = self._buffer
+        pos = 0
+        while True:
+            remaining = len(buf) - pos
+            if remaining < HEADER_SIZE:
+                break
+
+            if buf[pos] == 0x49 and buf[pos + 1:pos + 3] == b'D3':  # 'ID3'
+                if remaining < ID3V2_HEADER_SIZE:
+                    break
+                size = id3v2_size(buf, pos)
+                if size > remaining:
+                    self._skip = size - remaining
+                    pos = len(buf)
+                    break
+                pos += size
+                continue
+
+            if buf[pos:pos + 3] == b'TAG':
+                if remaining < ID3V1_SIZE:
+                    break
+                pos += ID3V1_SIZE
+                continue
+
+            header = parse_frame_header(buf, pos)
+            if header is None:
+                next_sync = buf.find(b'\xff', pos + 1)
+                pos = len(buf) if next_sync < 0 else next_sync
+                continue
+            if header.length > remaining:
+                break
+
+            if not is_info_frame(buf, pos, header):
+                self.frames += 1
+                self._samples[header.sample_rate] = self._samples.get(header.sample_rate, 0) + header.samples
+            pos += header.length
+
+        del buf[:pos]
+
+    @property
+    def duration_seconds(self) -> float:
+        return sum(samples / rate for rate, samples in self._samples.items())
+
+    @property
+    def duration_ms(self) -> int:
+        return int(round(self.duration_seconds * 1000))
+
+
+def mp3_duration(data: bytes) -> Tuple[float, int]:
+    """
+    Exact duration of a complete MP3 buffer
+
+    Returns:
+        Tuple of (seconds, audio frame count)
+    """
+    counter = Mp3FrameCounter()
+    counter.feed(data)
+    return counter.duration_seconds, counter.frames
@@ -0,0 +1,341 @@
+"""
+Upstream Resilience
+Per-request deadlines, retries with exponential backoff and full jitter,
+optional hedging once a call runs past the provider's observed p95 latency,
+and a per-provider circuit breaker so a degraded provider is skipped (and the
+caller can fall back to the other one) instead of failing every request.
+"""
+
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from services.upstream_limiter import LimiterTimeout, queue_clock
+
+
+T = TypeVar('T')
+
+RETRY_ATTEMPTS = int(os.environ.get('UPSTREAM_RETRY_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.environ.get('UPSTREAM_RETRY_BASE_DELAY', '0.2'))
+RETRY_MAX_DELAY = float(os.environ.get('UPSTREAM_RETRY_MAX_DELAY', '2.0'))
+
+# Hedging sends a duplicate call when the first is slower than p95; it costs
+# provider quota, so it is opt-in and only kicks in once p95 is meaningful
+HEDGING_ENABLED = os.environ.get('UPSTREAM_HEDGING', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_MIN_SAMPLES = int(os.environ.get('UPSTREAM_HEDGE_MIN_SAMPLES', '20'))
+
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('UPSTREAM_BREAKER_FAILURES', '5'))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('UPSTREAM_BREAKER_RESET', '30'))
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The provider's circuit breaker is open; don't call it right now"""
+
+
+class DeadlineExceeded(Exception):
+    """The request deadline passed before an attempt succeeded"""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transport failures, timeouts, 429 and 5xx are worth retrying; other errors are not"""
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, 'status_code', None)
+    if status is None and isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    return status is not None and (status == 429 or status >= 500)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Recent successful call latencies for one provider"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def p95(self) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95)]
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    Opens after `failure_threshold` failures in a row, rejects calls for
+    `reset_timeout` seconds, then lets a single probe through (half-open);
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejections = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = BREAKER_HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe slot when half-open)"""
+        state = self.state
+        if state == BREAKER_CLOSED:
+            return True
+        if state == BREAKER_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self._rejections += 1
+        return False
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot without judging the provider"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == BREAKER_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = BREAKER_OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'rejections': self._rejections,
+        }
+
+
+class ProviderResilience:
+    """Breaker, latency window and retry/hedge policy for one upstream provider"""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: Optional[CircuitBreaker] = None,
+        max_attempts: int = RETRY_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        hedging: bool = HEDGING_ENABLED,
+        hedge_min_samples: int = HEDGE_MIN_SAMPLES
+    ):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        # One latency window per operation: a long dialogue stream and a short
+        # TTS call to the same provider must not share a hedge delay
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self._calls = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._failures = 0
+
+    def latency(self, operation: str = 'default') -> LatencyTracker:
+        """Latency window for one kind of call to this provider"""
+        tracker = self._latency.get(operation)
+        if tracker is None:
+            tracker = self._latency[operation] = LatencyTracker()
+        return tracker
+
+    def hedge_delay(self, operation: str = 'default') -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or p95 unknown"""
+        latency = self.latency(operation)
+        if not self.hedging or latency.count < self.hedge_min_samples:
+            return None
+        return latency.p95()
+
+    async def call(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        deadline: float,
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+        operation: str = 'default'
+    ) -> T:
+        """
+        Run `attempt` until it succeeds, retrying retryable failures
+
+        Args:
+            attempt: Zero-argument coroutine factory performing one upstream call
+            deadline: Seconds the whole call (all retries and hedges) may take
+            discard: Cleanup for a successful result that lost a hedge race
+            operation: Kind of call, for its own latency window and hedge delay
+
+        Raises:
+            CircuitOpen: the breaker rejected the call
+            DeadlineExceeded: the deadline passed first
+            LimiterTimeout: the deadline passed while still queued for a local
+                limiter permit (not counted against the provider)
+            Exception: the last non-retryable (or final) upstream error
+        """
+        self._calls += 1
+        expires = time.monotonic() + deadline
+        for n in range(self.max_attempts):
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{self.name} deadline of {deadline:.1f}s exceeded")
+
+            if not self.breaker.allow():
+                raise CircuitOpen(f"{self.name} circuit is open")
+            # Only a half-open breaker lets a call through as its single probe
+            probe = self.breaker.state == BREAKER_HALF_OPEN
+
+            started = time.monotonic()
+            try:
+                with queue_clock() as queued:
+                    result = await asyncio.wait_for(
+                        self._attempt_hedged(attempt, discard, operation), remaining
+                    )
+            except asyncio.TimeoutError:
+                if queued.admitted == 0 and queued.abandoned:
+                    # Never got past our own limiter: local saturation says
+                    # nothing about the provider, so don't trip its breaker
+                    if probe:
+                        self.breaker.release_probe()
+                    raise LimiterTimeout(f"{self.name} upstream is over budget; queued until the deadline")
+                self.breaker.record_failure()
+                self._failures += 1
+                raise DeadlineExceeded(f"{self.name} deadline of {deadline:.1f}s exceeded")
+            except Exception as e:
+                if not is_retryable(e):
+                    # A 4xx (or a local error) says nothing about the provider's health
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                self.breaker.record_failure()
+                self._failures += 1
+                delay = backoff_delay(n, self.base_delay, self.max_delay)
+                if n == self.max_attempts - 1 or time.monotonic() + delay >= expires:
+                    raise
+                self._retries += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (client gone, caller's own timeout): no verdict on the
+                # provider, but the probe slot must be freed or the breaker stays
+                # half-open and rejects every call from now on
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            # Provider latency only: queueing for a permit would inflate the hedge delay
+            self.latency(operation).record(max(time.monotonic() - started - queued.first_wait, 0.0))
+            self.breaker.record_success()
+            return result
+
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    async def _attempt_hedged(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]],
+        operation: str
+    ) -> T:
+        hedge_after = self.hedge_delay(operation)
+        if hedge_after is None:
+            return await attempt()
+
+        primary = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self._hedges += 1
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._hedge_wins += 1
+                        winner = task.result()
+                        for other in done - {task}:
+                            if other.exception() is None and discard:
+                                await discard(other.result())
+                        return winner
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                late = await asyncio.gather(*pending, return_exceptions=True)
+                for result in late:
+                    if discard and not isinstance(result, BaseException):
+                        await discard(result)
+
+    def stats(self) -> dict:
+        return {
+            'breaker': self.breaker.stats(),
+            'calls': self._calls,
+            'retries': self._retries,
+            'failures': self._failures,
+            'hedges': self._hedges,
+            'hedge_wins': self._hedge_wins,
+            'p95_latency_ms': {
+                operation: round(tracker.p95() * 1000, 3)
+                for operation, tracker in self._latency.items() if tracker.count
+            },
+        }
+
+
+_providers: Dict[str, ProviderResilience] = {}
+
+
+def get_resilience(provider: str) -> ProviderResilience:
+    """Get the process-wide resilience policy for an upstream provider"""
+    policy = _providers.get(provider)
+    if policy is None:
+        policy = ProviderResilience(provider)
+        _providers[provider] = policy
+    return policy
+
+
+def resilience_stats() -> dict:
+    """Breaker state, retry and hedge counters for every provider used so far"""
+    return {name: policy.stats() for name, policy in _providers.items()}
@@ -0,0 +1,107 @@
+"""
+Dialogue Script Cache
+The lesson script prompt depends only on language, location, situation and
+difficulty, a small finite space. Scripts are cached per prompt key (see
+dialogue_script.script_cache_key), with a bounded pool of variants per
+key so users still get variety: while a pool is filling every request goes
+upstream and adds its script; once full, requests pick a random variant
+with zero upstream calls. Variants expire after a TTL (and are refilled
+lazily); the least recently used prompts are evicted beyond a key budget.
+"""
+
+import os
+import time
+import random
+from collections import OrderedDict
+from typing import List, Optional
+
+
+SCRIPT_CACHE_ENABLED = os.environ.get('SCRIPT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SCRIPT_CACHE_VARIANTS = int(os.environ.get('SCRIPT_CACHE_VARIANTS', '5'))
+SCRIPT_CACHE_TTL = float(os.environ.get('SCRIPT_CACHE_TTL', str(7 * 24 * 3600)))
+SCRIPT_CACHE_MAX_KEYS = int(os.environ.get('SCRIPT_CACHE_MAX_KEYS', '2000'))
+
+
+class ScriptCache:
+    """LRU of prompt key -> pool of (script text, stored at) variants"""
+
+    def __init__(
+        self,
+        variants: int = SCRIPT_CACHE_VARIANTS,
+        ttl: float = SCRIPT_CACHE_TTL,
+        max_keys: int = SCRIPT_CACHE_MAX_KEYS
+    ):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._pools: "OrderedDict[str, List[tuple]]" = OrderedDict()
+        self._stats = {'hits': 0, 'fills': 0, 'served_on_error': 0, 'expired': 0, 'evictions': 0}
+
+    def _pool(self, key: str) -> List[tuple]:
+        """Live variants for key (expired ones dropped)"""
+        pool = self._pools.get(key)
+        if pool is None:
+            return []
+        now = time.time()
+        live = [variant for variant in pool if now - variant[1] < self.ttl]
+        if len(live) != len(pool):
+            self._stats['expired'] += len(pool) - len(live)
+            if live:
+                self._pools[key] = live
+            else:
+                del self._pools[key]
+        return live
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        A random variant once the pool is full
+
+        Returns:
+            Script text, or None while the pool is still filling (go upstream)
+        """
+        pool = self._pool(key)
+        if len(pool) < self.variants:
+            return None
+        self._pools.move_to_end(key)
+        self._stats['hits'] += 1
+        return random.choice(pool)[0]
+
+    def get_any(self, key: str) -> Optional[str]:
+        """Any live variant, full pool or not (served when the upstream call failed)"""
+        pool = self._pool(key)
+        if not pool:
+            return None
+        self._stats['served_on_error'] += 1
+        return random.choice(pool)[0]
+
+    def put(self, key: str, text: str) -> None:
+        """Add a freshly generated script to the key's pool (ignored once full)"""
+        if self.variants <= 0:
+            return
+        pool = self._pool(key)
+        if len(pool) >= self.variants or any(existing == text for existing, _ in pool):
+            return
+        self._pools[key] = pool + [(text, time.time())]
+        self._pools.move_to_end(key)
+        self._stats['fills'] += 1
+        while len(self._pools) > self.max_keys:
+            self._pools.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        self._pools.clear()
+
+    def stats(self) -> dict:
+        total = self._stats['hits'] + self._stats['fills']
+        return dict(
+            self._stats,
+            enabled=SCRIPT_CACHE_ENABLED,
+            keys=len(self._pools),
+            variants=sum(len(pool) for pool in self._pools.values()),
+            full_pools=sum(1 for pool in self._pools.values() if len(pool) >= self.variants),
+            hit_rate=round(self._stats['hits'] / total, 4) if total else 0.0,
+        )
+
+
+# Process-wide instance
+script_cache = ScriptCache()
@@ -0,0 +1,48 @@
+"""
+In-Process Single-Flight
+Collapses concurrent calls for the same key into one in-flight task whose
+result (or exception) is shared by every caller.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Deduplicate concurrent async work per key within one process"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def in_flight(self, key: str) -> bool:
+        """True if work for this key is currently running"""
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once per key; concurrent callers await the same result
+
+        The work runs as its own task and callers await it through
+        asyncio.shield, so a caller that disconnects (and is cancelled) does
+        not cancel the generation the other callers are waiting on.
+
+        Args:
+            key: Deduplication key (e.g. a cache_key)
+            fn: Zero-argument coroutine factory doing the actual work
+
+        Returns:
+            Whatever fn() returns
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,24 @@
+"""
+Server-Sent Events helpers
+"""
+
+import os
+import json
+
+
+# Seconds between keep-alive comments on an otherwise idle stream, so
+# proxies don't time out the connection
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get('SSE_KEEPALIVE_INTERVAL', '15'))
+
+# Headers for every SSE response: no caching, no proxy buffering
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data) -> str:
+    """One Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_keepalive() -> str:
+    """A comment line; clients ignore it but it keeps the connection active"""
+    return ": keep-alive\n\n"
@@ -0,0 +1,343 @@
+"""
+TTS Result Cache
+Content-addressed cache for single-line /api/tts results:
+1. Small in-memory LRU tier (hot greetings, vocab words, quiz prompts)
+2. On-disk MP3 files + JSON metadata index, bounded by a size budget
+
+The index is rewritten after every store and, when only hits have changed
+it, every TTS_CACHE_INDEX_FLUSH_INTERVAL seconds and on shutdown, so
+last_access survives restarts and disk eviction order stays LRU.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_ENABLED = os.environ.get('TTS_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', '/app/backend/tts-cache')
+TTS_CACHE_MEMORY_BYTES = int(float(os.environ.get('TTS_CACHE_MEMORY_MB', '32')) * 1024 * 1024)
+TTS_CACHE_DISK_BYTES = int(float(os.environ.get('TTS_CACHE_DISK_MB', '512')) * 1024 * 1024)
+TTS_CACHE_INDEX_FLUSH_INTERVAL = float(os.environ.get('TTS_CACHE_INDEX_FLUSH_INTERVAL', '60'))
+
+
+def make_tts_cache_key(provider: str, voice: str, text: str, model: str, settings: dict) -> str:
+    """
+    Build a content-addressed key for a TTS result
+
+    Every input that changes the synthesized audio is part of the key, so a
+    hit is always byte-identical to what the upstream would return.
+
+    Returns:
+        sha256 hex digest
+    """
+    identity = json.dumps(
+        {
+            'provider': provider.lower().strip(),
+            'voice': voice.strip(),
+            'text': text,
+            'model': model,
+            'settings': settings or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """Two-tier (memory LRU + disk) cache of synthesized audio keyed by content hash"""
+
+    def __init__(
+        self,
+        cache_dir: str = TTS_CACHE_DIR,
+        memory_max_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        disk_max_bytes: int = TTS_CACHE_DISK_BYTES,
+        index_flush_interval: float = TTS_CACHE_INDEX_FLUSH_INTERVAL,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.index_flush_interval = index_flush_interval
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+
+        # Disk index: key -> {size, created_at, last_access}, kept in LRU order
+        self._index: "OrderedDict[str, dict]" = OrderedDict()
+        self._disk_bytes = 0
+        self._index_loaded = False
+        # Snapshots are numbered; a writer never replaces a newer one with an older one
+        self._index_version = 0
+        self._index_written = 0
+        self._index_write_lock = threading.Lock()
+        self._index_dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'bytes_served': 0,
+            'hit_latency_total': 0.0,
+            'upstream_latency_total': 0.0,
+            'upstream_calls': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Disk helpers (run in a worker thread)
+    # ------------------------------------------------------------------
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp3")
+
+    def _load_index(self) -> None:
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        entries = sorted(raw.items(), key=lambda item: item[1].get('last_access', 0))
+        for key, meta in entries:
+            if os.path.exists(self._file_path(key)):
+                self._index[key] = meta
+                self._disk_bytes += meta.get('size', 0)
+
+    def _write_index(self, snapshot: dict, version: int) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._index_write_lock:
+            if version <= self._index_written:
+                return
+            # Unique temp name: other workers may share the directory
+            with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=self.cache_dir, prefix='index.', suffix='.tmp', delete=False
+            ) as f:
+                json.dump(snapshot, f)
+            try:
+                os.replace(f.name, self._index_path)
+            except OSError:
+                os.remove(f.name)
+                raise
+            self._index_written = version
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._file_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_file(self, key: str, audio: bytes) -> None:
+        path = self._file_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique temp name: concurrent writers of the same key (or other workers) don't collide
+        with tempfile.NamedTemporaryFile(
+            'wb', dir=os.path.dirname(path), prefix=f"{key}.", suffix='.tmp', delete=False
+        ) as f:
+            f.write(audio)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    def _remove_file(self, key: str) -> None:
+        try:
+            os.remove(self._file_path(key))
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for a key, or None on a miss"""
+        started = time.perf_counter()
+
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self._touch(key)
+            self._record_hit('memory_hits', audio, started)
+            return audio
+
+        if not self._index_loaded:
+            await asyncio.to_thread(self._load_index)
+
+        if key in self._index:
+            audio = await asyncio.to_thread(self._read_file, key)
+            if audio is not None:
+                self._touch(key)
+                self._remember(key, audio)
+                self._record_hit('disk_hits', audio, started)
+                return audio
+            # File vanished underneath the index
+            self._disk_bytes -= self._index.pop(key).get('size', 0)
+
+        self._stats['misses'] += 1
+        return None
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """Store audio in both tiers, evicting least-recently-used disk entries over budget"""
+        if not audio:
+            return
+        self._remember(key, audio)
+
+        if not self._index_loaded:
+            await asyncio.to_thread(self._load_index)
+        if key in self._index or len(audio) > self.disk_max_bytes:
+            return
+
+        try:
+            await asyncio.to_thread(self._write_file, key, audio)
+        except OSError as e:
+            logger.warning(f"TTS cache disk write failed: {e}")
+            return
+        if key in self._index:
+            # A concurrent miss for the same key stored it while this write ran
+            return
+
+        now = time.time()
+        self._index[key] = {'size': len(audio), 'created_at': now, 'last_access': now}
+        self._disk_bytes += len(audio)
+        self._index_dirty = True
+        self._stats['stores'] += 1
+
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._index:
+            old_key, meta = self._index.popitem(last=False)
+            self._disk_bytes -= meta.get('size', 0)
+            evicted.append(old_key)
+        self._stats['evictions'] += len(evicted)
+
+        try:
+            for old_key in evicted:
+                await asyncio.to_thread(self._remove_file, old_key)
+        except OSError as e:
+            logger.warning(f"TTS cache eviction failed: {e}")
+        await self.flush_index()
+
+    def _touch(self, key: str) -> None:
+        """Mark a disk entry as just used (persisted by the next index flush)"""
+        meta = self._index.get(key)
+        if meta is not None:
+            meta['last_access'] = time.time()
+            self._index.move_to_end(key)
+            self._index_dirty = True
+
+    async def flush_index(self) -> bool:
+        """
+        Write the disk index if it changed since the last write
+
+        Returns:
+            True if the index was written
+        """
+        if not self._index_dirty:
+            return False
+        self._index_dirty = False
+        self._index_version += 1
+        snapshot = {key: dict(meta) for key, meta in self._index.items()}
+        try:
+            await asyncio.to_thread(self._write_index, snapshot, self._index_version)
+        except OSError as e:
+            self._index_dirty = True
+            logger.warning(f"TTS cache index write failed: {e}")
+            return False
+        return True
+
+    async def start(self) -> None:
+        """Start the periodic index flush (called from the app lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write hits recorded since the last one"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush_index()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.index_flush_interval)
+            await self.flush_index()
+
+    def record_upstream_latency(self, seconds: float) -> None:
+        """Record how long a cache miss took upstream (for hit/miss latency comparison)"""
+        self._stats['upstream_calls'] += 1
+        self._stats['upstream_latency_total'] += seconds
+
+    def _record_hit(self, tier: str, audio: bytes, started: float) -> None:
+        self._stats[tier] += 1
+        self._stats['bytes_served'] += len(audio)
+        self._stats['hit_latency_total'] += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        """Snapshot of hit rate, sizes and latencies"""
+        s = self._stats
+        hits = s['memory_hits'] + s['disk_hits']
+        lookups = hits + s['misses']
+        return {
+            'enabled': TTS_CACHE_ENABLED,
+            'lookups': lookups,
+            'memory_hits': s['memory_hits'],
+            'disk_hits': s['disk_hits'],
+            'misses': s['misses'],
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'stores': s['stores'],
+            'evictions': s['evictions'],
+            'bytes_served': s['bytes_served'],
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'memory_budget_bytes': self.memory_max_bytes,
+            'disk_entries': len(self._index),
+            'disk_bytes': self._disk_bytes,
+            'disk_budget_bytes': self.disk_max_bytes,
+            'avg_hit_latency_ms': round(s['hit_latency_total'] / hits * 1000, 3) if hits else 0.0,
+            'avg_upstream_latency_ms': (
+                round(s['upstream_latency_total'] / s['upstream_calls'] * 1000, 3)
+                if s['upstream_calls'] else 0.0
+            ),
+        }
+
+
+# Process-wide cache used by /api/tts
+tts_cache = TTSCache()
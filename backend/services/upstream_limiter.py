@@ -0,0 +1,276 @@
+"""
+Upstream Concurrency & Rate Limiting
+Per-provider limiter shared by every code path that calls OpenAI or
+ElevenLabs: a cap on in-flight calls plus token buckets for requests/second
+and characters/second. Over budget, callers queue until a deadline instead
+of failing straight away (and instead of provoking 429s from the provider).
+
+Long-running bulk work (chunked dialogue renders hold a permit for each
+chunk's whole stream) is marked bulk=True and may only use
+max_concurrency - interactive_reserve slots, so interactive /api/tts
+requests always have slots of their own instead of queueing behind a
+render until they hit the queue timeout.
+
+Time spent queued here is local saturation, not provider slowness: callers
+that account for provider health (see services/resilience.py) wrap their
+attempts in queue_clock() to tell the two apart.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+# Default seconds a caller may queue for a permit before giving up
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT', '30'))
+
+# Per-provider defaults; override with {PROVIDER}_MAX_CONCURRENCY,
+# {PROVIDER}_REQUESTS_PER_SECOND and {PROVIDER}_CHARS_PER_SECOND (0 = unlimited);
+# {PROVIDER}_INTERACTIVE_RESERVE slots are kept out of reach of bulk callers
+PROVIDER_LIMIT_DEFAULTS = {
+    'openai': {'max_concurrency': 16, 'requests_per_second': 8, 'chars_per_second': 0,
+               'interactive_reserve': 0},
+    'elevenlabs': {'max_concurrency': 4, 'requests_per_second': 4, 'chars_per_second': 2000,
+                   'interactive_reserve': 1},
+}
+
+
+class LimiterTimeout(Exception):
+    """No permit became available before the caller's deadline"""
+
+
+class QueueClock:
+    """Limiter queueing seen by one block of work, including tasks it spawns"""
+
+    def __init__(self):
+        self.admitted = 0
+        # Permit requests cancelled while still queued
+        self.abandoned = 0
+        self.waits: List[float] = []
+
+    @property
+    def first_wait(self) -> float:
+        """Queue time of the first permit granted (0 if none)"""
+        return self.waits[0] if self.waits else 0.0
+
+
+_queue_clock: ContextVar[Optional[QueueClock]] = ContextVar('upstream_queue_clock', default=None)
+
+
+@contextmanager
+def queue_clock():
+    """Collect queueing for every permit requested inside the block"""
+    clock = QueueClock()
+    token = _queue_clock.set(clock)
+    try:
+        yield clock
+    finally:
+        _queue_clock.reset(token)
+
+
+class TokenBucket:
+    """Classic token bucket; a cost larger than the burst may run the bucket into debt"""
+
+    def __init__(self, rate: float, burst_seconds: float = 1.0):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens can be taken (0 = now)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, cost: float) -> None:
+        if self.rate > 0:
+            self.tokens -= cost
+
+
+class Permit:
+    """A held limiter slot; release() exactly once"""
+
+    def __init__(self, limiter: "UpstreamLimiter", bulk: bool = False):
+        self._limiter = limiter
+        self._bulk = bulk
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self._bulk)
+
+
+class UpstreamLimiter:
+    """Concurrency cap + request and character rate budgets for one provider"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        requests_per_second: float = 0,
+        chars_per_second: float = 0,
+        queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT,
+        interactive_reserve: int = 0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        # Bulk callers always keep at least one slot
+        self.interactive_reserve = max(0, min(interactive_reserve, max_concurrency - 1))
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._bulk_slots = asyncio.Semaphore(max_concurrency - self.interactive_reserve)
+        self._bulk_in_flight = 0
+        self._requests = TokenBucket(requests_per_second)
+        self._chars = TokenBucket(chars_per_second)
+        self._in_flight = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._waits = deque(maxlen=1000)
+        self._wait_total = 0.0
+
+    async def enter(self, chars: int = 0, timeout: Optional[float] = None, bulk: bool = False) -> Permit:
+        """
+        Wait for a concurrency slot and enough request/character budget
+
+        Args:
+            chars: Characters this call will synthesize/send (counts against chars/second)
+            timeout: Max seconds to queue (defaults to the limiter's queue_timeout)
+            bulk: Background/long-held call; never takes the interactive reserve
+
+        Raises:
+            LimiterTimeout: budget not available before the deadline
+        """
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if timeout is None else timeout)
+        clock = _queue_clock.get()
+        self._waiting += 1
+        try:
+            if bulk:
+                try:
+                    await asyncio.wait_for(self._bulk_slots.acquire(), timeout=max(deadline - started, 0))
+                except asyncio.TimeoutError:
+                    raise self._timed_out()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except BaseException as e:
+                if bulk:
+                    self._bulk_slots.release()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._timed_out()
+                raise
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._requests.wait_time(1, now), self._chars.wait_time(chars, now))
+                    if wait == 0:
+                        self._requests.consume(1)
+                        self._chars.consume(chars)
+                        break
+                    if now + wait > deadline:
+                        raise self._timed_out()
+                    await asyncio.sleep(wait)
+            except BaseException:
+                self._slots.release()
+                if bulk:
+                    self._bulk_slots.release()
+                raise
+        except asyncio.CancelledError:
+            if clock is not None:
+                clock.abandoned += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self._waits.append(waited)
+        self._wait_total += waited
+        self._acquired += 1
+        self._in_flight += 1
+        if bulk:
+            self._bulk_in_flight += 1
+        if clock is not None:
+            clock.admitted += 1
+            clock.waits.append(waited)
+        return Permit(self, bulk)
+
+    @asynccontextmanager
+    async def acquire(self, chars: int = 0, timeout: Optional[float] = None, bulk: bool = False):
+        """Hold a permit for the duration of the block"""
+        permit = await self.enter(chars, timeout, bulk)
+        try:
+            yield permit
+        finally:
+            permit.release()
+
+    def _release(self, bulk: bool = False) -> None:
+        self._in_flight -= 1
+        self._slots.release()
+        if bulk:
+            self._bulk_in_flight -= 1
+            self._bulk_slots.release()
+
+    def _timed_out(self) -> LimiterTimeout:
+        self._timeouts += 1
+        return LimiterTimeout(f"{self.name} upstream is over budget; queued too long")
+
+    def stats(self) -> dict:
+        """Current load and queue-wait metrics"""
+        waits = sorted(self._waits)
+        return {
+            'max_concurrency': self.max_concurrency,
+            'requests_per_second': self._requests.rate,
+            'chars_per_second': self._chars.rate,
+            'interactive_reserve': self.interactive_reserve,
+            'in_flight': self._in_flight,
+            'bulk_in_flight': self._bulk_in_flight,
+            'waiting': self._waiting,
+            'acquired': self._acquired,
+            'timeouts': self._timeouts,
+            'avg_wait_ms': round(self._wait_total / self._acquired * 1000, 3) if self._acquired else 0.0,
+            'p95_wait_ms': round(waits[int(len(waits) * 0.95)] * 1000, 3) if waits else 0.0,
+            'max_wait_ms': round(waits[-1] * 1000, 3) if waits else 0.0,
+        }
+
+
+_limiters: Dict[str, UpstreamLimiter] = {}
+
+
+def _provider_setting(provider: str, name: str) -> float:
+    default = PROVIDER_LIMIT_DEFAULTS.get(provider, PROVIDER_LIMIT_DEFAULTS['openai'])[name]
+    return float(os.environ.get(f"{provider.upper()}_{name.upper()}", default))
+
+
+def get_limiter(provider: str) -> UpstreamLimiter:
+    """Get the process-wide limiter for an upstream provider"""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = UpstreamLimiter(
+            provider,
+            max_concurrency=int(_provider_setting(provider, 'max_concurrency')),
+            requests_per_second=_provider_setting(provider, 'requests_per_second'),
+            chars_per_second=_provider_setting(provider, 'chars_per_second'),
+            interactive_reserve=int(_provider_setting(provider, 'interactive_reserve')),
+        )
+        _limiters[provider] = limiter
+    return limiter
+
+
+def limiter_stats() -> dict:
+    """Stats for every provider limiter created so far"""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -19,3 +19,44 @@ def test_env():
     # Cleanup after tests
     if "TESTING" in os.environ:
         del os.environ["TESTING"]
+
+
+def mongodb_available():
+    """Check if MongoDB is available."""
+    from pymongo import MongoClient
+    from pymongo.errors import ServerSelectionTimeoutError
+    try:
+        mongo = MongoClient(os.environ.get("MONGO_URL", "localhost:27017"), serverSelectionTimeoutMS=1000)
+        mongo.server_info()
+        return True
+    except ServerSelectionTimeoutError:
+        return False
+
+
+requires_mongodb = pytest.mark.skipif(
+    not mongodb_available(),
+    reason="MongoDB not available"
+)
+
+
+class RecordingCollection:
+    """Stands in for audio_cache when only bulk_write is used (access tracking)"""
+
+    def __init__(self):
+        self.bulk_writes = []
+
+    async def bulk_write(self, requests, ordered=True):
+        self.bulk_writes.append(requests)
+
+
+@pytest.fixture(autouse=True)
+def access_tracker(monkeypatch):
+    """Give every test its own access tracker so hits never reach a real MongoDB"""
+    import server
+    from routes import audio_cache
+    from services.access_tracker import AccessTracker
+
+    tracker = AccessTracker(RecordingCollection())
+    monkeypatch.setattr(audio_cache, "access_tracker", tracker)
+    monkeypatch.setattr(server, "access_tracker", tracker)
+    return tracker
@@ -0,0 +1,91 @@
+"""
+Access Tracker Tests
+"""
+
+import asyncio
+
+from services.access_tracker import AccessTracker
+from tests.conftest import RecordingCollection
+
+
+class FailingCollection:
+    async def bulk_write(self, requests, ordered=True):
+        raise ConnectionError("mongo down")
+
+
+def test_hits_are_aggregated_into_one_bulk_write():
+    collection = RecordingCollection()
+    tracker = AccessTracker(collection)
+    for key in ["a", "b", "a", "a"]:
+        tracker.record(key)
+
+    assert asyncio.run(tracker.flush()) == 2
+    (updates,) = collection.bulk_writes
+    by_key = {u._filter["cache_key"]: u._doc for u in updates}
+    assert by_key["a"]["$inc"] == {"hit_count": 3}
+    assert by_key["b"]["$inc"] == {"hit_count": 1}
+    assert "last_accessed_at" in by_key["a"]["$max"]
+    assert tracker.stats()["pending_entries"] == 0
+
+
+def test_event_threshold_triggers_flush():
+    collection = RecordingCollection()
+    tracker = AccessTracker(collection, flush_interval=3600, flush_events=5)
+
+    async def scenario():
+        for i in range(5):
+            tracker.record(f"key-{i % 2}")
+        await asyncio.sleep(0)  # let the scheduled flush run
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert len(collection.bulk_writes) == 1
+    assert tracker.stats()["pending_events"] == 0
+
+
+def test_failed_flush_keeps_counts_and_shutdown_flushes():
+    tracker = AccessTracker(FailingCollection())
+    tracker.record("a")
+    tracker.record("a")
+
+    assert asyncio.run(tracker.flush()) == 0
+    assert tracker.stats()["flush_errors"] == 1
+    assert tracker.stats()["pending_entries"] == 1
+
+    collection = RecordingCollection()
+    tracker.collection = collection
+    tracker.record("a")
+
+    async def lifecycle():
+        await tracker.start()
+        await tracker.stop()
+
+    asyncio.run(lifecycle())
+    assert collection.bulk_writes[0][0]._doc["$inc"] == {"hit_count": 3}
+
+
+def test_pending_entries_are_capped_while_the_database_is_down():
+    tracker = AccessTracker(FailingCollection(), flush_interval=3600, flush_events=3, max_pending=3)
+
+    async def scenario():
+        for key in ["a", "b", "c", "a"]:
+            tracker.record(key)
+        await asyncio.sleep(0)  # threshold flush fails and restores everything
+        await asyncio.sleep(0)
+        for key in ["d", "e"]:
+            tracker.record(key)
+        await asyncio.sleep(0)  # no retry before the periodic flush
+
+    asyncio.run(scenario())
+    stats = tracker.stats()
+    assert stats["flush_errors"] == 1
+    assert stats["pending_entries"] == 3
+    assert stats["dropped_entries"] == 2  # b and c were hit least recently
+    assert stats["dropped_hits"] == 2
+    assert stats["pending_events"] == 4
+
+    collection = RecordingCollection()
+    tracker.collection = collection
+    assert asyncio.run(tracker.flush()) == 3
+    by_key = {u._filter["cache_key"]: u._doc["$inc"]["hit_count"] for u in collection.bulk_writes[0]}
+    assert by_key == {"a": 2, "d": 1, "e": 1}
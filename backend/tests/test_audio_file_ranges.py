@@ -0,0 +1,134 @@
+"""
+/api/audio/file/{cache_key} Range, ETag and Conditional GET Tests
+"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import app
+from routes import audio_cache
+from services.metadata_cache import MetadataCache
+from services.http_conditional import parse_range, RangeNotSatisfiable
+
+
+CACHE_KEY = "en_welcome_coffeeshop_maria_jordan"
+CONTENT_KEY = f"{CACHE_KEY}.v2-0123456789abcdef"
+AUDIO = bytes(range(256)) * 400  # 102400 bytes
+SIZE = len(AUDIO)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    audio_path = f"/audio-cache/en/coffeeshop/{CACHE_KEY}.mp3"
+    full_path = tmp_path / audio_path.lstrip("/")
+    os.makedirs(full_path.parent)
+    full_path.write_bytes(AUDIO)
+
+    cache = MetadataCache(max_entries=10)
+    cache.put(CACHE_KEY, {"cache_key": CACHE_KEY, "audio_path": audio_path})
+    cache.put(CONTENT_KEY, {"cache_key": CONTENT_KEY, "audio_path": audio_path, "content_hash": "0123456789abcdef"})
+    monkeypatch.setattr(audio_cache, "metadata_cache", cache)
+    monkeypatch.setattr(audio_cache, "AUDIO_STORAGE_ROOT", str(tmp_path))
+    return TestClient(app)
+
+
+URL = f"/api/audio/file/{CACHE_KEY}"
+
+
+class TestParseRange:
+    def test_forms(self):
+        assert parse_range(None, 100) is None
+        assert parse_range("bytes=0-9", 100) == (0, 9)
+        assert parse_range("bytes=90-", 100) == (90, 99)
+        assert parse_range("bytes=-10", 100) == (90, 99)
+        assert parse_range("bytes=50-500", 100) == (50, 99)
+
+    def test_ignored_forms(self):
+        assert parse_range("bytes=9-0", 100) is None
+        assert parse_range("bytes=0-1,5-6", 100) is None
+        assert parse_range("items=0-1", 100) is None
+        assert parse_range("bytes=abc", 100) is None
+
+    def test_unsatisfiable(self):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=100-", 100)
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=-0", 100)
+
+
+class TestAudioFileEndpoint:
+    def test_full_download(self, client):
+        response = client.get(URL)
+        assert response.status_code == 200
+        assert response.content == AUDIO
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["etag"].startswith('"')
+        assert "last-modified" in response.headers
+
+    def test_single_range(self, client):
+        response = client.get(URL, headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 100-199/{SIZE}"
+        assert response.headers["content-length"] == "100"
+        assert response.content == AUDIO[100:200]
+
+    def test_open_ended_range(self, client):
+        response = client.get(URL, headers={"Range": f"bytes={SIZE - 1000}-"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes {SIZE - 1000}-{SIZE - 1}/{SIZE}"
+        assert response.content == AUDIO[-1000:]
+
+    def test_suffix_range(self, client):
+        response = client.get(URL, headers={"Range": "bytes=-500"})
+        assert response.status_code == 206
+        assert response.content == AUDIO[-500:]
+
+    def test_unsatisfiable_range(self, client):
+        response = client.get(URL, headers={"Range": f"bytes={SIZE}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{SIZE}"
+
+    def test_malformed_range_serves_whole_file(self, client):
+        response = client.get(URL, headers={"Range": "bytes=500-100"})
+        assert response.status_code == 200
+        assert response.content == AUDIO
+
+    def test_if_none_match_returns_304(self, client):
+        etag = client.get(URL).headers["etag"]
+        response = client.get(URL, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        assert client.get(URL, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    def test_if_modified_since_returns_304(self, client):
+        last_modified = client.get(URL).headers["last-modified"]
+        response = client.get(URL, headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 304
+
+        old = "Mon, 01 Jan 2001 00:00:00 GMT"
+        assert client.get(URL, headers={"If-Modified-Since": old}).status_code == 200
+
+    def test_if_range(self, client):
+        etag = client.get(URL).headers["etag"]
+        current = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+        assert current.status_code == 206
+
+        stale = client.get(URL, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert stale.status_code == 200
+        assert stale.content == AUDIO
+
+    def test_only_content_keys_are_immutable(self, client):
+        response = client.get(f"/api/audio/file/{CONTENT_KEY}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+        # An alias moves to each new variant: clients revalidate it with the ETag
+        alias = client.get(URL)
+        assert alias.headers["cache-control"] == "no-cache"
+        revalidated = client.get(URL, headers={"If-None-Match": alias.headers["etag"]})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["cache-control"] == "no-cache"
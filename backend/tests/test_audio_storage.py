@@ -0,0 +1,61 @@
+"""
+Atomic Audio Storage Tests
+"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from services.audio_storage import AtomicAudioWriter, WRITE_BUFFER_SIZE
+
+
+CHUNKS = [bytes([i]) * 50_000 for i in range(12)]  # spans several buffer flushes
+AUDIO = b"".join(CHUNKS)
+
+
+def test_commit_writes_whole_file_with_hash_and_size(tmp_path):
+    final_path = str(tmp_path / "en" / "coffeeshop" / "section.mp3")
+
+    async def write():
+        async with AtomicAudioWriter(final_path) as writer:
+            for chunk in CHUNKS:
+                await writer.write(chunk)
+            assert not os.path.exists(final_path)  # nothing visible until commit
+            await writer.commit()
+        return writer
+
+    writer = asyncio.run(write())
+    assert len(AUDIO) > WRITE_BUFFER_SIZE
+    with open(final_path, "rb") as f:
+        assert f.read() == AUDIO
+    assert writer.size == len(AUDIO)
+    assert writer.content_hash == hashlib.sha256(AUDIO).hexdigest()
+    assert os.listdir(os.path.dirname(final_path)) == ["section.mp3"]
+
+
+def test_failed_stream_leaves_no_file(tmp_path):
+    final_path = str(tmp_path / "section.mp3")
+
+    async def write():
+        async with AtomicAudioWriter(final_path) as writer:
+            await writer.write(CHUNKS[0])
+            raise RuntimeError("upstream dropped the connection")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(write())
+    assert os.listdir(tmp_path) == []
+
+
+def test_commit_replaces_existing_file_atomically(tmp_path):
+    final_path = tmp_path / "section.mp3"
+    final_path.write_bytes(b"old audio")
+
+    async def write():
+        async with AtomicAudioWriter(str(final_path)) as writer:
+            await writer.write(b"new audio")
+            await writer.commit()
+
+    asyncio.run(write())
+    assert final_path.read_bytes() == b"new audio"
@@ -0,0 +1,152 @@
+"""
+Audio Cache Eviction & GC Tests
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.cache_gc import CacheGarbageCollector, entry_value
+from tests.conftest import requires_mongodb
+
+
+def test_value_prefers_frequent_and_recent_entries():
+    now = datetime.utcnow()
+    hot = {"hit_count": 50, "last_accessed_at": now - timedelta(hours=2)}
+    recent = {"hit_count": 1, "last_accessed_at": now - timedelta(minutes=5)}
+    stale = {"hit_count": 1, "last_accessed_at": now - timedelta(days=30)}
+    untracked = {"created_at": now - timedelta(days=7)}
+
+    ranked = sorted([hot, recent, stale, untracked], key=lambda e: entry_value(e, now))
+    assert ranked == [stale, untracked, recent, hot]
+
+
+class ReferenceCollection:
+    """Answers the `audio_path $in` lookups file reconciliation makes"""
+
+    def __init__(self, audio_paths):
+        self.audio_paths = set(audio_paths)
+
+    def find(self, query, projection=None):
+        wanted = query["audio_path"]["$in"]
+        return FakeCursor([{"audio_path": path} for path in wanted if path in self.audio_paths])
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+def write_file(root, audio_path, age):
+    path = f"{root}{audio_path}"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * 10)
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+
+def test_bundled_files_without_documents_survive(tmp_path):
+    root = str(tmp_path)
+    bundled = write_file(root, "/audio-cache/en/coffeeshop/en_welcome_coffeeshop_maria_jordan.mp3", 7200)
+    orphan = write_file(root, "/audio-cache/en/coffeeshop/en_welcome_coffeeshop_maria_jordan.v2-0123456789abcdef.mp3", 7200)
+    temp = write_file(root, "/audio-cache/en/coffeeshop/x.mp3.abc123.tmp", 7200)
+    collection = ReferenceCollection([])
+
+    # Default: only stale temp files go
+    assert asyncio.run(CacheGarbageCollector(collection, root)._reconcile_files()) == (0, 1)
+    assert os.path.exists(bundled) and os.path.exists(orphan) and not os.path.exists(temp)
+
+    # Opted in: generated (content-keyed) orphans go, bundled audio stays
+    gc = CacheGarbageCollector(collection, root, remove_orphans=True)
+    assert asyncio.run(gc._reconcile_files()) == (1, 0)
+    assert os.path.exists(bundled)
+    assert not os.path.exists(orphan)
+
+
+@requires_mongodb
+class TestCacheGarbageCollector:
+    def _collection(self):
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        return client[os.environ.get("DB_NAME", "languageapp_test")][f"gc_{uuid.uuid4().hex[:8]}"]
+
+    def _write(self, root, audio_path, size, age=0):
+        path = f"{root}{audio_path}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        if age:
+            old = time.time() - age
+            os.utime(path, (old, old))
+        return path
+
+    def test_evicts_least_valuable_unpinned_entries(self, tmp_path):
+        root = str(tmp_path)
+        now = datetime.utcnow()
+
+        async def scenario():
+            collection = self._collection()
+            docs = [
+                ("pinned_old", 1, now - timedelta(days=60), True),
+                ("stale", 1, now - timedelta(days=30), False),
+                ("hot", 40, now - timedelta(hours=1), False),
+                ("fresh", 0, now, False),
+            ]
+            for key, hits, accessed, pinned in docs:
+                audio_path = f"/audio-cache/es/cafe/{key}.mp3"
+                self._write(root, audio_path, 1000)
+                await collection.insert_one({
+                    "cache_key": key, "audio_path": audio_path, "file_size": 1000,
+                    "hit_count": hits, "last_accessed_at": accessed, "pinned": pinned,
+                })
+
+            removed = []
+            gc = CacheGarbageCollector(collection, root, budget_bytes=3500, low_water=0.9, on_remove=removed.append)
+            result = await gc.run_once()
+            remaining = sorted([doc["cache_key"] async for doc in collection.find({})])
+            await collection.drop()
+            return result, removed, remaining
+
+        result, removed, remaining = asyncio.run(scenario())
+        assert removed == ["stale"]
+        assert remaining == ["fresh", "hot", "pinned_old"]
+        assert result["evicted_bytes"] == 1000
+        assert not os.path.exists(f"{root}/audio-cache/es/cafe/stale.mp3")
+        assert os.path.exists(f"{root}/audio-cache/es/cafe/pinned_old.mp3")
+
+    def test_reconciles_dangling_documents_orphans_and_temp_files(self, tmp_path):
+        root = str(tmp_path)
+
+        async def scenario():
+            collection = self._collection()
+            self._write(root, "/audio-cache/en/cafe/kept.mp3", 10)
+            await collection.insert_one({"cache_key": "kept", "audio_path": "/audio-cache/en/cafe/kept.mp3", "file_size": 10})
+            await collection.insert_one({"cache_key": "gone", "audio_path": "/audio-cache/en/cafe/gone.mp3", "file_size": 10})
+            self._write(root, "/audio-cache/en/cafe/orphan.v2-0123456789abcdef.mp3", 10, age=7200)
+            self._write(root, "/audio-cache/en/cafe/young-orphan.v2-0123456789abcdef.mp3", 10)
+            self._write(root, "/audio-cache/en/cafe/x.mp3.abc123.tmp", 10, age=7200)
+
+            gc = CacheGarbageCollector(collection, root, grace_seconds=3600, remove_orphans=True)
+            result = await gc.run_once()
+            keys = sorted([doc["cache_key"] async for doc in collection.find({})])
+            await collection.drop()
+            return result, keys
+
+        result, keys = asyncio.run(scenario())
+        assert keys == ["kept"]
+        assert result["dangling_documents"] == 1
+        assert result["orphan_files"] == 1
+        assert result["temp_files"] == 1
+        assert sorted(os.listdir(f"{root}/audio-cache/en/cafe")) == ["kept.mp3", "young-orphan.v2-0123456789abcdef.mp3"]
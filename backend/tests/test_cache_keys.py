@@ -0,0 +1,50 @@
+"""
+Cache Key Tests
+"""
+
+import pytest
+
+from services.cache_key_generator import (
+    generate_cache_key, generate_content_key, hash_section_content,
+    parse_cache_key, is_content_key, cache_key_alias
+)
+
+LINES = [
+    {"text": "Hola, ¿qué tal?", "spokenText": "Hola, ¿qué tal?", "speakerId": 1, "emotion": "happy"},
+    {"text": "Muy bien", "speakerId": 2},
+]
+
+
+def content_hash(lines=LINES, voice_a="voice-a", voice_b="voice-b", model="eleven_v3"):
+    return hash_section_content(lines, voice_a, voice_b, model, {"output_format": "mp3_44100_128"})
+
+
+def test_content_hash_tracks_what_is_spoken():
+    base = content_hash()
+    assert content_hash(lines=[dict(LINES[0], text="Hola (display)", emotion="sad"), LINES[1]]) == base
+    assert content_hash(lines=[dict(LINES[0], spokenText="  Hola,\n ¿qué  tal? "), LINES[1]]) == base
+
+    assert content_hash(lines=[LINES[0], dict(LINES[1], text="Muy mal")]) != base
+    assert content_hash(voice_b="voice-c") != base
+    assert content_hash(model="eleven_flash_v2_5") != base
+    assert content_hash(lines=list(reversed(LINES))) != base
+
+
+def test_content_key_round_trips():
+    alias = generate_cache_key("es", "welcome", "coffee_shop", "Maria_José", "Jordan")
+    assert alias == "es_welcome_coffeeshop_maria-josé_jordan"
+
+    key = generate_content_key(alias, content_hash())
+    assert is_content_key(key) and not is_content_key(alias)
+    assert cache_key_alias(key) == alias
+
+    parsed = parse_cache_key(key)
+    assert parsed["speaker_a"] == "maria-josé"
+    assert parsed["version"] == "v2"
+    assert parsed["content_hash"] == content_hash()
+    assert parse_cache_key(alias)["content_hash"] is None
+
+
+def test_ambiguous_legacy_key_is_rejected():
+    with pytest.raises(ValueError):
+        parse_cache_key("en_welcome_coffeeshop_mary_ann_jordan")
@@ -0,0 +1,137 @@
+"""
+Audio Cache Pre-Warming Tests
+"""
+
+import asyncio
+from datetime import datetime
+
+from services import upstream_limiter
+from services.cache_key_generator import generate_cache_key
+from services.cache_prewarm import CachePrewarmer, parse_window, script_sections, window_start
+
+CATALOG = [
+    {"language": "en", "location": "coffee_shop", "speaker_a": "maria", "speaker_b": "jordan"},
+    {"language": "es", "location": "restaurant", "speaker_a": "maria", "speaker_b": "jordan"},
+    {"language": "fr", "location": "coffee_shop", "speaker_a": "maria", "speaker_b": "jordan"},
+]
+SECTIONS = ("welcome", "vocab", "quiz")
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor(list(self.docs))
+
+
+def entry(language, location, section, hits=0):
+    alias = generate_cache_key(language, section, location, "maria", "jordan")
+    return {"cache_key": f"{alias}.v2-0123456789abcdef", "alias": alias, "language": language,
+            "location": location, "speaker_a": "maria", "speaker_b": "jordan", "hit_count": hits}
+
+
+def script(language):
+    return [
+        {"speakerId": 1, "segmentType": "WELCOME", "emotion": "happy", "text": f"{language} hello"},
+        {"speakerId": 2, "segmentType": "VOCAB", "emotion": None, "text": "word - meaning"},
+        {"speakerId": 1, "segmentType": "QUIZ", "emotion": "curious", "text": "question?"},
+    ]
+
+
+def prewarmer(docs, generated, scripts, **kwargs):
+    async def fetch_script(config):
+        scripts.append(config)
+        return script(config["language"])
+
+    async def generate(section):
+        generated.append(section)
+
+    return CachePrewarmer(
+        FakeCollection(docs), generate, fetch_script, catalog=CATALOG, sections=SECTIONS, **kwargs
+    )
+
+
+def test_plan_ranks_lessons_by_observed_demand():
+    docs = [entry("es", "restaurant", "welcome", hits=30), entry("es", "restaurant", "vocab", hits=5)]
+    warmer = prewarmer(docs, [], [])
+    warmer.record_demand("FR", "coffee_shop", "Maria", "Jordan", count=3)
+    warmer.record_demand("de", "hotel", "sarah", "kevin")
+
+    plan = asyncio.run(warmer.plan())
+
+    assert [(p["language"], p["demand"]) for p in plan] == [("es", 35), ("fr", 3), ("de", 1), ("en", 0)]
+    assert plan[0]["cached"] == ["welcome", "vocab"]
+    assert plan[0]["missing"] == ["quiz"]
+    assert plan[1]["missing"] == list(SECTIONS)
+
+
+def test_pass_generates_missing_sections_within_budget(monkeypatch):
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+    docs = [entry("es", "restaurant", "welcome", hits=30), entry("es", "restaurant", "vocab", hits=5)]
+    generated, scripts = [], []
+    warmer = prewarmer(docs, generated, scripts)
+
+    result = asyncio.run(warmer.run_once({"sections": 3}))
+
+    # es (most demanded) only needs its quiz; then the first catalog lesson fills the budget
+    assert [(s["language"], s["section_type"]) for s in generated] == [
+        ("es", "quiz"), ("en", "welcome"), ("en", "vocab")
+    ]
+    assert generated[0]["dialogue_lines"] == [{"text": "question?", "speakerId": 1, "emotion": "curious"}]
+    assert [c["language"] for c in scripts] == ["es", "en"]
+    assert result["stop_reason"] == "section budget spent"
+    assert result["planned"] == 7
+    assert result["sections"] == 3
+
+    dry = asyncio.run(prewarmer(docs, [], []).run_once(dry_run=True))
+    assert len(dry["generated"]) == 7
+
+
+def test_coverage_report():
+    docs = [entry("es", "restaurant", section) for section in SECTIONS] + [entry("en", "coffee_shop", "welcome")]
+    report = asyncio.run(prewarmer(docs, [], []).coverage())
+
+    assert report["sections_total"] == 9
+    assert report["sections_cached"] == 4
+    assert report["by_language"]["es"]["coverage"] == 1.0
+    assert [gap["language"] for gap in report["top_missing"]] == ["en", "fr"]
+
+
+def test_background_passes_run_only_in_window_with_a_shared_budget(monkeypatch):
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+    window = parse_window("23:00-05:00")
+    assert window_start(window, datetime(2026, 1, 2, 3, 30)) == datetime(2026, 1, 1, 23, 0)
+    assert window_start(window, datetime(2026, 1, 2, 23, 30)) == datetime(2026, 1, 2, 23, 0)
+    assert window_start(window, datetime(2026, 1, 2, 12, 0)) is None
+
+    generated, scripts = [], []
+    warmer = prewarmer([], generated, scripts, window="23:00-05:00", max_sections=4)
+
+    assert asyncio.run(warmer._run_in_window(datetime(2026, 1, 2, 12, 0))) is None
+    asyncio.run(warmer._run_in_window(datetime(2026, 1, 2, 23, 30)))
+    assert len(generated) == 4
+    # Same window: budget already spent
+    assert asyncio.run(warmer._run_in_window(datetime(2026, 1, 3, 1, 0))) is None
+    # Next night's window gets a fresh budget
+    asyncio.run(warmer._run_in_window(datetime(2026, 1, 3, 23, 30)))
+    assert len(generated) == 8
+
+
+def test_script_sections_keep_the_first_run_of_each_section():
+    lines = script("en") + [{"speakerId": 2, "segmentType": "WELCOME", "emotion": None, "text": "again"}]
+    sections = script_sections(lines)
+    assert list(sections) == ["welcome", "vocab", "quiz"]
+    assert [line["text"] for line in sections["welcome"]] == ["en hello"]
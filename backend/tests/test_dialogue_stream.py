@@ -0,0 +1,114 @@
+"""
+Streaming Dialogue Generation Tests
+"""
+
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import server
+from services import dialogue_script, resilience, upstream_limiter
+from services.script_cache import ScriptCache
+from services.dialogue_script import DialogueLineParser, parse_dialogue_line
+
+SCRIPT = (
+    "1|WELCOME|[friendly]|Hello and welcome!\n"
+    "2|WELCOME|[happy]|Glad to be here | really.\n"
+    "Here is your lesson:\n"
+    "1|VOCAB|[neutral]|Coffee - a hot drink"
+)
+
+
+def test_parse_validates_fields():
+    assert parse_dialogue_line("2|slow|[polite]|How can I help?") == {
+        "speakerId": 2, "segmentType": "SLOW", "emotion": "polite", "text": "How can I help?"
+    }
+    assert parse_dialogue_line("1|WELCOME||Hi")["emotion"] is None
+    assert parse_dialogue_line("3|WELCOME|[happy]|Hi") is None
+    assert parse_dialogue_line("1|INTRO|[happy]|Hi") is None
+    assert parse_dialogue_line("1|WELCOME|[happy]|  ") is None
+    assert parse_dialogue_line("1|Hi") is None
+
+
+def test_parser_emits_lines_as_they_complete():
+    parser = DialogueLineParser()
+    emitted = []
+    # Deltas split lines (and the newline) at arbitrary points
+    for start in range(0, len(SCRIPT), 7):
+        emitted.append([line["text"] for line in parser.feed(SCRIPT[start:start + 7])])
+    emitted.append([line["text"] for line in parser.finish()])
+
+    flat = [text for batch in emitted for text in batch]
+    assert flat == ["Hello and welcome!", "Glad to be here | really.", "Coffee - a hot drink"]
+    # The last line only arrives with finish(); the first well before the end
+    assert emitted[-1] == ["Coffee - a hot drink"]
+    assert next(i for i, batch in enumerate(emitted) if batch) < len(emitted) // 2
+    assert parser.rejected == ["Here is your lesson:"]
+    assert [line["index"] for line in parser.lines] == [0, 1, 2]
+
+
+def openai_stream(text: str, chunk: int = 5) -> bytes:
+    events = [
+        {"choices": [{"delta": {"content": text[i:i + chunk]}}]}
+        for i in range(0, len(text), chunk)
+    ]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+    return (body + "data: [DONE]\n\n").encode()
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_endpoint_sends_line_events(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=openai_stream(SCRIPT), headers={"Content-Type": "text/event-stream"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="https://api.openai.test")
+    monkeypatch.setattr(dialogue_script, "get_client", lambda provider: client)
+    monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(resilience, "_providers", {})
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+    monkeypatch.setattr(dialogue_script, "script_cache", ScriptCache())
+
+    response = TestClient(server.app).post(
+        "/api/generate-dialogue/stream", json={"config": {"language": "es", "location": "restaurant"}}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert requests[0]["stream"] is True
+    assert "Language: es" in requests[0]["messages"][1]["content"]
+
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["line", "line", "line", "done"]
+    assert events[0][1] == {
+        "speakerId": 1, "segmentType": "WELCOME", "emotion": "friendly", "text": "Hello and welcome!", "index": 0
+    }
+    done = events[-1][1]
+    assert done["lines"] == 3
+    assert done["rejected"] == ["Here is your lesson:"]
+    assert done["output_text"].splitlines()[2] == "1|VOCAB|[neutral]|Coffee - a hot drink"
+
+
+def test_upstream_error_before_first_token_is_http_error(monkeypatch):
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(401, json={"error": "bad key"})),
+        base_url="https://api.openai.test"
+    )
+    monkeypatch.setattr(dialogue_script, "get_client", lambda provider: client)
+    monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(resilience, "_providers", {})
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+    monkeypatch.setattr(dialogue_script, "script_cache", ScriptCache())
+
+    response = TestClient(server.app).post("/api/generate-dialogue/stream", json={"config": {}})
+    assert response.status_code == 500
+    assert "OpenAI API request failed" in response.json()["detail"]
@@ -0,0 +1,296 @@
+"""
+ElevenLabs Dialogue Service Tests
+Generation must never block the event loop for other requests
+"""
+
+import asyncio
+import base64
+import time
+from types import SimpleNamespace
+
+import httpx
+
+import server
+from services import elevenlabs_dialogue, resilience, upstream_limiter
+from services.mp3_frames import mp3_duration
+from services.tts_cache import TTSCache
+from services.upstream_limiter import UpstreamLimiter
+
+
+CHUNK = b"\xff\xfb\x90\x64" + b"\x00" * 413
+CHUNK_COUNT = 10
+CHUNK_DELAY = 0.05  # 0.5s total synthesis
+
+
+FRAME_SECONDS = 1152 / 44100  # one 128 kbps / 44.1 kHz MPEG1 Layer III frame
+
+
+class SlowDialogueStream:
+    """Fake async text_to_dialogue endpoint that trickles chunks slowly"""
+
+    def __init__(self):
+        self.inputs = None
+
+    async def stream_with_timestamps(self, inputs, model_id, output_format):
+        self.inputs = inputs
+        for i in range(CHUNK_COUNT):
+            await asyncio.sleep(CHUNK_DELAY)
+            # First line spans frames 0-3, the second frames 5-9
+            segments = []
+            if i == 0:
+                segments = [voice_segment(0, 0.0, 4 * FRAME_SECONDS)]
+            elif i == 5:
+                segments = [voice_segment(1, 5 * FRAME_SECONDS, 10 * FRAME_SECONDS)]
+            yield SimpleNamespace(
+                audio_base_64=base64.b64encode(CHUNK).decode(),
+                voice_segments=segments,
+            )
+
+
+def voice_segment(index, start, end):
+    return SimpleNamespace(dialogue_input_index=index, start_time_seconds=start, end_time_seconds=end)
+
+
+class FakeClient:
+    def __init__(self):
+        self.text_to_dialogue = SlowDialogueStream()
+
+
+LINES = [
+    {"text": "Hello and welcome!", "speakerId": 1, "emotion": "warm"},
+    {"text": "Glad you're here.", "speakerId": 2, "emotion": "friendly"},
+]
+
+
+def test_generation_collects_all_chunks(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_dialogue, "get_elevenlabs_client", lambda api_key: fake)
+
+    audio, timestamps = asyncio.run(
+        elevenlabs_dialogue.generate_dialogue_audio(LINES, "maria", "jordan")
+    )
+
+    assert audio == CHUNK * CHUNK_COUNT
+    assert [(ts["start"], ts["end"]) for ts in timestamps] == [
+        (0.0, round(4 * FRAME_SECONDS, 3)),
+        (round(5 * FRAME_SECONDS, 3), round(10 * FRAME_SECONDS, 3)),
+    ]
+    assert [i["voice_id"] for i in fake.text_to_dialogue.inputs] == [
+        elevenlabs_dialogue.VOICE_MAP["maria"],
+        elevenlabs_dialogue.VOICE_MAP["jordan"],
+    ]
+
+
+def test_other_endpoints_stay_responsive_during_generation(monkeypatch):
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_dialogue, "get_elevenlabs_client", lambda api_key: FakeClient())
+
+    async def scenario():
+        generation = asyncio.create_task(
+            elevenlabs_dialogue.generate_dialogue_audio(LINES, "maria", "jordan")
+        )
+        await asyncio.sleep(CHUNK_DELAY)  # generation is now mid-stream
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            response = await client.get("/api/health")
+            health_latency = time.perf_counter() - started
+
+        still_generating = not generation.done()
+        await generation
+        return response.status_code, health_latency, still_generating
+
+    status, latency, still_generating = asyncio.run(scenario())
+    assert status == 200
+    assert still_generating
+    assert latency < CHUNK_DELAY * CHUNK_COUNT / 2
+
+
+def test_timing_without_segments_is_scaled_to_real_duration():
+    timing = elevenlabs_dialogue.DialogueTiming()
+    timing.feed_audio(CHUNK * 100)  # 100 frames = 2.612s
+
+    timestamps = timing.timestamps(LINES)
+    assert timing.duration_ms == 2612
+    assert timestamps[-1]["end"] == 2.612
+    estimated = elevenlabs_dialogue.calculate_timestamps(LINES)
+    ratio = timestamps[0]["end"] / estimated[0]["end"]
+    assert abs(ratio - 2.612 / estimated[-1]["end"]) < 0.01
+
+
+class FakeTextToSpeech:
+    """Fake per-line TTS endpoint: each line is N frames, N = word count"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def convert(self, voice_id, text, model_id, voice_settings, output_format):
+        self.calls.append((voice_id, text))
+        await asyncio.sleep(0.01)
+        yield CHUNK * len(text.split())
+
+
+class NoDialogueClient:
+    def __init__(self):
+        self.text_to_speech = FakeTextToSpeech()
+
+
+def test_fallback_stitches_lines_with_exact_timing(monkeypatch, tmp_path):
+    fake = NoDialogueClient()
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_dialogue, "get_elevenlabs_client", lambda api_key: fake)
+    monkeypatch.setattr(elevenlabs_dialogue, "tts_cache", TTSCache(str(tmp_path)))
+    monkeypatch.setattr(elevenlabs_dialogue, "DIALOGUE_SPEAKER_GAP", 5 * FRAME_SECONDS)
+    monkeypatch.setattr(elevenlabs_dialogue, "DIALOGUE_SAME_SPEAKER_GAP", 2 * FRAME_SECONDS)
+
+    lines = LINES + [{"text": "Hello and welcome!", "speakerId": 1}, {"text": "", "speakerId": 2}]
+    audio, timestamps = asyncio.run(
+        elevenlabs_dialogue.generate_dialogue_audio(lines, "maria", "jordan")
+    )
+
+    # 3 frames, 5 silent, 3 frames, 5 silent, 3 frames (repeated line synthesized once)
+    assert len(fake.text_to_speech.calls) == 2
+    assert len(audio) == 19 * len(CHUNK)
+    assert mp3_duration(audio)[1] == 19
+    spans = [(ts["start"], ts["end"]) for ts in timestamps]
+    assert spans == [
+        (0.0, round(3 * FRAME_SECONDS, 3)),
+        (round(8 * FRAME_SECONDS, 3), round(11 * FRAME_SECONDS, 3)),
+        (round(16 * FRAME_SECONDS, 3), round(19 * FRAME_SECONDS, 3)),
+        (round(19 * FRAME_SECONDS, 3), round(19 * FRAME_SECONDS, 3)),
+    ]
+
+    # A second section reuses the cached lines
+    asyncio.run(elevenlabs_dialogue.generate_dialogue_audio(LINES, "maria", "jordan"))
+    assert len(fake.text_to_speech.calls) == 2
+
+
+class OneBadLineTextToSpeech:
+    """Per-line TTS where "bad" returns no audio at once and every other line is slow"""
+
+    async def convert(self, voice_id, text, model_id, voice_settings, output_format):
+        if text == "bad":
+            return
+        await asyncio.sleep(1)
+        yield CHUNK
+
+
+def test_failed_fallback_line_waits_for_the_cancelled_lines(monkeypatch, tmp_path):
+    client = SimpleNamespace(text_to_speech=OneBadLineTextToSpeech())
+    limiter = UpstreamLimiter("elevenlabs", 10)
+    monkeypatch.setattr(elevenlabs_dialogue, "tts_cache", TTSCache(str(tmp_path)))
+    monkeypatch.setitem(upstream_limiter._limiters, "elevenlabs", limiter)
+    lines = [{"text": text, "speakerId": 1} for text in ("one", "two", "bad")]
+
+    async def scenario():
+        try:
+            await elevenlabs_dialogue.generate_dialogue_fallback(lines, "voice-a", "voice-b", client)
+        except ValueError as e:
+            assert "no audio" in str(e)
+        else:
+            raise AssertionError("a silent line must fail the section")
+        # Every line task is finished and has given its permit back
+        assert limiter.stats()["in_flight"] == 0
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(scenario())
+
+
+class PerLineDialogueStream:
+    """Fake text_to_dialogue whose latency grows with the number of lines (2 frames each)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def stream_with_timestamps(self, inputs, model_id, output_format):
+        self.calls += 1
+        for i, _ in enumerate(inputs):
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(
+                audio_base_64=base64.b64encode(CHUNK * 2).decode(),
+                voice_segments=[voice_segment(i, 2 * i * FRAME_SECONDS, (2 * i + 2) * FRAME_SECONDS)],
+            )
+
+
+def test_split_dialogue_turns_only_cuts_at_speaker_changes():
+    lines = [{"speakerId": 1 + (i // 3) % 2} for i in range(40)]  # turns every 3 lines
+    spans = elevenlabs_dialogue.split_dialogue_turns(lines, 12)
+    assert spans[0][0] == 0 and spans[-1][1] == 40
+    assert len(spans) == 4
+    for start, _ in spans[1:]:
+        assert start % 3 == 0
+    assert elevenlabs_dialogue.split_dialogue_turns(lines[:12], 12) == [(0, 12)]
+
+
+def test_long_section_renders_chunks_in_parallel(monkeypatch):
+    fake = FakeClient()
+    fake.text_to_dialogue = PerLineDialogueStream()
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_dialogue, "get_elevenlabs_client", lambda api_key: fake)
+    monkeypatch.setattr(elevenlabs_dialogue, "DIALOGUE_CHUNK_LINES", 10)
+    monkeypatch.setitem(upstream_limiter._limiters, "elevenlabs", UpstreamLimiter("elevenlabs", 10))
+    monkeypatch.setattr(elevenlabs_dialogue, "DIALOGUE_SPEAKER_GAP", 5 * FRAME_SECONDS)
+
+    lines = [{"text": f"Line {i}", "speakerId": 1 + i % 2} for i in range(40)]
+    started = time.perf_counter()
+    audio, timestamps = asyncio.run(
+        elevenlabs_dialogue.generate_dialogue_audio(lines, "maria", "jordan")
+    )
+    elapsed = time.perf_counter() - started
+
+    assert fake.text_to_dialogue.calls == 4
+    assert elapsed < 40 * 0.01 / 2  # four 10-line chunks at once, not 40 lines in series
+    assert mp3_duration(audio)[1] == 40 * 2 + 3 * 5
+    # Line i sits after 2 frames per earlier line plus 5 silent frames per earlier chunk
+    for i, ts in enumerate(timestamps):
+        frames_before = 2 * i + 5 * (i // 10)
+        assert ts["start"] == round(frames_before * FRAME_SECONDS, 3)
+        assert ts["end"] == round((frames_before + 2) * FRAME_SECONDS, 3)
+
+
+class RacingDialogueStream:
+    """Two opens whose first chunks arrive together, so the hedge race has a loser"""
+
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.both_open = asyncio.Event()
+
+    def stream_with_timestamps(self, inputs, model_id, output_format):
+        self.opened += 1
+        if self.opened == 2:
+            self.both_open.set()
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            await self.both_open.wait()
+            for i in range(2):
+                yield SimpleNamespace(audio_base_64=base64.b64encode(CHUNK).decode(), voice_segments=[])
+        finally:
+            self.closed += 1
+
+
+def test_hedged_dialogue_stream_closes_the_loser(monkeypatch):
+    fake = FakeClient()
+    fake.text_to_dialogue = RacingDialogueStream()
+    limiter = UpstreamLimiter("elevenlabs", 4)
+    policy = resilience.ProviderResilience("elevenlabs", hedging=True, hedge_min_samples=3)
+    for _ in range(3):
+        policy.latency("dialogue_stream").record(0.01)
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(elevenlabs_dialogue, "get_elevenlabs_client", lambda api_key: fake)
+    monkeypatch.setitem(upstream_limiter._limiters, "elevenlabs", limiter)
+    monkeypatch.setitem(resilience._providers, "elevenlabs", policy)
+
+    audio, _ = asyncio.run(elevenlabs_dialogue.generate_dialogue_audio(LINES, "maria", "jordan"))
+
+    assert audio == CHUNK * 2
+    assert policy.stats()["hedges"] == 1
+    assert fake.text_to_dialogue.opened == 2
+    assert fake.text_to_dialogue.closed == 2  # the winner after use, the loser by discard
+    assert limiter.stats()["in_flight"] == 0
+    # Short TTS calls keep their own window: no hedge delay learned from dialogue streams
+    assert policy.hedge_delay("tts") is None
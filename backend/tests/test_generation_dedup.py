@@ -0,0 +1,131 @@
+"""
+Generation Deduplication Tests
+Single-flight within a process, MongoDB leases across workers
+"""
+
+import asyncio
+import os
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.single_flight import SingleFlight
+from services.generation_lease import GenerationLease
+from tests.conftest import requires_mongodb
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "audio"
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do("key", work) for _ in range(10)))
+
+        assert asyncio.run(scenario()) == ["audio"] * 10
+        assert len(calls) == 1
+
+    def test_exception_is_shared_and_key_released(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        async def scenario():
+            results = await asyncio.gather(
+                *(flight.do("key", failing) for _ in range(3)), return_exceptions=True
+            )
+            assert not flight.in_flight("key")
+            return results
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(calls) == 1
+
+    def test_cancelled_caller_does_not_cancel_work(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def scenario():
+            first = asyncio.create_task(flight.do("key", work))
+            second = asyncio.create_task(flight.do("key", work))
+            await asyncio.sleep(0.01)
+            first.cancel()  # e.g. the first client disconnected
+            return await second
+
+        assert asyncio.run(scenario()) == "done"
+
+
+@requires_mongodb
+class TestGenerationLease:
+    def _collection(self):
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        return client[os.environ.get("DB_NAME", "languageapp_test")][f"leases_{uuid.uuid4().hex[:8]}"]
+
+    def test_only_one_worker_holds_lease(self):
+        async def scenario():
+            collection = self._collection()
+            worker_a = GenerationLease(collection, ttl_seconds=30, owner_id="a")
+            worker_b = GenerationLease(collection, ttl_seconds=30, owner_id="b")
+            try:
+                assert await worker_a.acquire("en_welcome_coffeeshop_maria_jordan")
+                assert not await worker_b.acquire("en_welcome_coffeeshop_maria_jordan")
+                await worker_a.release("en_welcome_coffeeshop_maria_jordan")
+                assert await worker_b.acquire("en_welcome_coffeeshop_maria_jordan")
+            finally:
+                await collection.drop()
+
+        asyncio.run(scenario())
+
+    def test_stale_lease_is_recovered(self):
+        async def scenario():
+            collection = self._collection()
+            crashed = GenerationLease(collection, ttl_seconds=0.05, owner_id="crashed")
+            survivor = GenerationLease(collection, ttl_seconds=30, owner_id="survivor")
+            try:
+                assert await crashed.acquire("key")
+                await asyncio.sleep(0.1)  # crashed worker never renews
+                assert await survivor.acquire("key")
+                assert not await crashed.renew("key")
+            finally:
+                await collection.drop()
+
+        asyncio.run(scenario())
+
+
+@requires_mongodb
+class TestAudioCacheIndexes:
+    def test_unique_cache_key_index_collapses_duplicates(self, monkeypatch):
+        from routes import audio_cache
+
+        async def scenario():
+            client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+            db = client[f"languageapp_idx_{uuid.uuid4().hex[:8]}"]
+            monkeypatch.setattr(audio_cache, "db", db)
+            try:
+                await db.audio_cache.insert_many([
+                    {"cache_key": "dup", "created_at": 1},
+                    {"cache_key": "dup", "created_at": 2},
+                ])
+                await audio_cache.ensure_indexes()
+
+                indexes = await db.audio_cache.index_information()
+                assert indexes["cache_key_unique"]["unique"] is True
+                assert "language_location_section" in indexes
+                assert await db.audio_cache.count_documents({"cache_key": "dup"}) == 1
+                assert "expires_at_ttl" in await db.generation_leases.index_information()
+            finally:
+                await client.drop_database(db.name)
+
+        asyncio.run(scenario())
@@ -0,0 +1,161 @@
+"""
+Background Generation Job Tests
+"""
+
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from server import app
+from routes import audio_cache
+from models.audio_cache import AudioCacheResponse
+from services.generation_jobs import GenerationJobQueue, QueueFull, JOB_SUCCEEDED, JOB_FAILED
+from services.metadata_cache import MetadataCache
+
+
+class TestGenerationJobQueue:
+    def test_worker_pool_bounds_concurrency(self):
+        queue = GenerationJobQueue(worker_count=2, max_depth=10)
+        running = []
+        peak = []
+
+        def make_work(i):
+            async def work():
+                running.append(i)
+                peak.append(len(running))
+                await asyncio.sleep(0.02)
+                running.remove(i)
+                return {"n": i}
+            return work
+
+        async def scenario():
+            jobs = [queue.submit(f"key{i}", make_work(i)) for i in range(6)]
+            while not all(job.done for job in jobs):
+                await asyncio.sleep(0.01)
+            await queue.stop()
+            return jobs
+
+        jobs = asyncio.run(scenario())
+        assert all(job.status == JOB_SUCCEEDED for job in jobs)
+        assert [job.result["n"] for job in jobs] == list(range(6))
+        assert max(peak) == 2
+
+    def test_same_key_reuses_active_job_and_depth_is_bounded(self):
+        queue = GenerationJobQueue(worker_count=1, max_depth=1)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        async def scenario():
+            first = queue.submit("a", slow)
+            await asyncio.sleep(0)  # worker takes "a" off the queue
+            assert queue.submit("a", slow) is first
+            queue.submit("b", slow)  # fills the single queue slot
+            try:
+                queue.submit("c", slow)
+            except QueueFull:
+                return True
+            finally:
+                await queue.stop()
+            return False
+
+        assert asyncio.run(scenario())
+
+    def test_failure_is_recorded(self):
+        queue = GenerationJobQueue(worker_count=1, max_depth=5)
+
+        async def failing():
+            raise RuntimeError("ElevenLabs returned 429")
+
+        async def scenario():
+            job = queue.submit("a", failing)
+            while not job.done:
+                await asyncio.sleep(0.01)
+            await queue.stop()
+            return job
+
+        job = asyncio.run(scenario())
+        assert job.status == JOB_FAILED
+        assert job.error == "ElevenLabs returned 429"
+
+    def test_stop_fails_queued_jobs(self):
+        queue = GenerationJobQueue(worker_count=1, max_depth=5)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        async def scenario():
+            running = queue.submit("a", slow)
+            await asyncio.sleep(0)  # worker takes "a" off the queue
+            queued = queue.submit("b", slow)
+            waiter = asyncio.ensure_future(queued.changed.wait())
+            await queue.stop()
+            await asyncio.wait_for(waiter, 1)  # subscribers are woken up
+            return running, queued
+
+        running, queued = asyncio.run(scenario())
+        assert running.status == JOB_FAILED
+        assert queued.status == JOB_FAILED
+        assert "shutdown" in queued.error
+        assert queued.finished_at is not None
+        assert queue.stats()["queued"] == 0
+
+
+REQUEST = {
+    "section_type": "welcome",
+    "language": "en",
+    "location": "coffeeshop",
+    "speaker_a": "maria",
+    "speaker_b": "jordan",
+    "dialogue_lines": [{"text": "Welcome!", "speakerId": 1}],
+}
+
+
+CACHE_KEY = audio_cache.section_cache_key(
+    "en", "welcome", "coffeeshop", "maria", "jordan", REQUEST["dialogue_lines"]
+)
+
+
+def test_async_mode_returns_202_and_job_completes(monkeypatch):
+    cache = MetadataCache(max_entries=10)
+    cache.put_negative(CACHE_KEY)
+    monkeypatch.setattr(audio_cache, "metadata_cache", cache)
+    monkeypatch.setattr(audio_cache, "SSE_KEEPALIVE_INTERVAL", 0.01)
+
+    async def fake_generate(cache_key, request):
+        await asyncio.sleep(0.05)
+        return AudioCacheResponse(
+            cache_key=cache_key,
+            audio_url=f"http://test/api/audio/file/{cache_key}",
+            timestamps=[],
+            duration=1200,
+            is_cached=False,
+        )
+
+    monkeypatch.setattr(audio_cache, "generate_section", fake_generate)
+
+    with TestClient(app) as client:
+        response = client.post("/api/audio/section/generate?mode=async", json=REQUEST)
+        assert response.status_code == 202
+        accepted = response.json()
+        assert accepted["cache_key"] == CACHE_KEY
+        assert CACHE_KEY.startswith("en_welcome_coffeeshop_maria_jordan.v2-")
+        assert response.headers["location"] == accepted["status_url"]
+
+        with client.stream("GET", accepted["events_url"]) as events:
+            assert events.headers["cache-control"] == "no-cache"
+            body = "".join(events.iter_text())
+        assert "event: succeeded" in body
+        assert ": keep-alive\n\n" in body
+
+        deadline = time.time() + 2
+        while True:
+            job = client.get(accepted["status_url"]).json()
+            if job["status"] == "succeeded" or time.time() > deadline:
+                break
+            time.sleep(0.02)
+        assert job["status"] == "succeeded"
+        assert job["result"]["duration"] == 1200
+
+        assert client.get("/api/audio/jobs/unknown").status_code == 404
@@ -0,0 +1,44 @@
+"""
+Shared Upstream Client Tests
+"""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from server import app
+from services import http_clients
+
+
+class TestSharedClients:
+    """Pooled upstream clients are reused across requests"""
+
+    def test_get_client_is_reused(self):
+        first = http_clients.get_client("openai")
+        second = http_clients.get_client("openai")
+        assert first is second
+        assert http_clients.get_client("elevenlabs") is not first
+
+    def test_per_upstream_configuration(self):
+        client = http_clients.build_client("openai")
+        try:
+            assert str(client.base_url).startswith(http_clients.UPSTREAM_BASE_URLS["openai"])
+            assert client.timeout.read == http_clients.UPSTREAM_TIMEOUTS["openai"]
+            assert client.timeout.connect == http_clients.UPSTREAM_CONNECT_TIMEOUT
+        finally:
+            asyncio.run(client.aclose())
+
+    def test_unknown_provider_rejected(self):
+        try:
+            http_clients.build_client("nope")
+        except ValueError:
+            return
+        assert False, "expected ValueError"
+
+    def test_lifespan_opens_and_closes_clients(self):
+        with TestClient(app) as client:
+            assert client.get("/api/health").status_code == 200
+            opened = dict(http_clients._clients)
+            assert set(opened) == set(http_clients.UPSTREAM_BASE_URLS)
+        assert all(c.is_closed for c in opened.values())
+        assert http_clients._clients == {}
@@ -0,0 +1,103 @@
+"""
+Pipelined Lesson Build Tests
+"""
+
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from server import app
+from routes import lessons
+from models.audio_cache import AudioCacheResponse
+from services import dialogue_script, resilience, upstream_limiter
+from services.script_cache import ScriptCache
+
+SCRIPT_LINES = [
+    "1|WELCOME|[friendly]|Hola y bienvenidos!",
+    "2|WELCOME|[happy]|Hola a todos.",
+    "1|VOCAB|[neutral]|La cuenta - the bill",
+    "1|VOCAB|[neutral]|El menú - the menu",
+    "2|QUIZ|[curious]|¿Qué es la cuenta?",
+]
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def setup(monkeypatch, timeline, fail_section=None):
+    async def body():
+        for raw in SCRIPT_LINES:
+            await asyncio.sleep(0.02)
+            timeline.append(("llm", raw.split("|")[1]))
+            event = {"choices": [{"delta": {"content": raw + "\n"}}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+        timeline.append(("llm", "end"))
+        yield b"data: [DONE]\n\n"
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())),
+        base_url="https://api.openai.test"
+    )
+
+    async def fake_generate(request):
+        timeline.append(("tts", request.section_type))
+        if request.section_type == fail_section:
+            raise RuntimeError("tts down")
+        return AudioCacheResponse(
+            cache_key=f"key-{request.section_type}",
+            audio_url=f"http://test/api/audio/file/key-{request.section_type}",
+            timestamps=[],
+            duration=1000 * len(request.dialogue_lines),
+            is_cached=False
+        )
+
+    monkeypatch.setattr(dialogue_script, "get_client", lambda provider: client)
+    monkeypatch.setattr(lessons, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(lessons, "get_or_generate_section", fake_generate)
+    monkeypatch.setattr(resilience, "_providers", {})
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+    monkeypatch.setattr(dialogue_script, "script_cache", ScriptCache())
+
+
+REQUEST = {"config": {"language": "es", "location": "restaurant"}, "speaker_a": "carlos", "speaker_b": "ana"}
+
+
+def test_sections_are_synthesized_while_script_streams(monkeypatch):
+    timeline = []
+    setup(monkeypatch, timeline)
+
+    response = TestClient(app).post("/api/lessons/build", json=REQUEST)
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+
+    # WELCOME audio started before the model had finished the script
+    assert timeline.index(("tts", "welcome")) < timeline.index(("llm", "end"))
+
+    sections = [data for name, data in events if name == "section"]
+    assert [s["section_type"] for s in sections] == ["welcome", "vocab", "quiz"]
+    assert sections[1]["lines"][0] == {"text": "La cuenta - the bill", "speakerId": 1, "emotion": "neutral"}
+    assert sections[0]["cache_key"].startswith("es_welcome_restaurant_carlos_ana.v2-")
+
+    audio = {data["section_type"]: data for name, data in events if name == "audio"}
+    assert audio["vocab"]["duration"] == 2000
+    assert events[-1][0] == "done"
+    assert events[-1][1]["sections"] == 3
+    assert len([name for name, _ in events if name == "line"]) == 5
+
+
+def test_failed_section_does_not_stop_the_lesson(monkeypatch):
+    timeline = []
+    setup(monkeypatch, timeline, fail_section="vocab")
+
+    events = parse_sse(TestClient(app).post("/api/lessons/build", json=REQUEST).text)
+    errors = [data for name, data in events if name == "audio_error"]
+    assert [(e["section_type"], e["detail"]) for e in errors] == [("vocab", "tts down")]
+    assert sorted(data["section_type"] for name, data in events if name == "audio") == ["quiz", "welcome"]
+    assert events[-1][0] == "done"
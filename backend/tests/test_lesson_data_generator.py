@@ -0,0 +1,148 @@
+"""
+Bulk Lesson Data Generator Tests
+scripts/generate_lesson_data.py against mocked OpenAI and backend transports
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+
+import httpx
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "generate_lesson_data.py")
+_spec = importlib.util.spec_from_file_location("generate_lesson_data", SCRIPT)
+generator = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(generator)
+
+LESSON_TEXT = "\n".join([
+    "1|WELCOME|[happy]|Hello",
+    "2|WELCOME|[friendly]|Hi there",
+    "1|VOCAB|[neutral]|Word - meaning",
+    "not a dialogue line",
+    "x|QUIZ|[curious]|bad speaker id",
+    "1|QUIZ|[curious]|Question?",
+])
+
+
+class FakeBackend:
+    """Section generate endpoint: the first `cached` sections are cache hits"""
+
+    def __init__(self, cached=0, fail=()):
+        self.cached = cached
+        self.fail = set(fail)
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append(body)
+        key = f"{body['language']}_{body['section_type']}_{body['location']}"
+        if key in self.fail:
+            return httpx.Response(400, json={"detail": "bad section"})
+        return httpx.Response(200, json={
+            "cache_key": f"{key}.v2-0123456789abcdef",
+            "audio_url": "http://backend.test/audio",
+            "timestamps": [],
+            "duration": 1000,
+            "is_cached": len(self.requests) <= self.cached,
+        })
+
+
+def run(tmp_path, backend=None, extra=()):
+    llm_calls = []
+
+    def openai(request: httpx.Request) -> httpx.Response:
+        llm_calls.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": LESSON_TEXT}}]})
+
+    args = generator.parse_args(["--output-dir", str(tmp_path), "--only", "es_coffee_shop", "en_restaurant",
+                                 *(["--audio"] if backend else []), *extra])
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(openai)) as openai_client:
+            if backend is None:
+                return await generator.LessonPipeline(args, openai_client).run(
+                    [lesson for lesson in generator.LESSONS if generator.lesson_key(lesson) in args.only]
+                )
+            async with httpx.AsyncClient(
+                transport=httpx.MockTransport(backend.handler), base_url="http://backend.test"
+            ) as backend_client:
+                return await generator.LessonPipeline(args, openai_client, backend_client).run(
+                    [lesson for lesson in generator.LESSONS if generator.lesson_key(lesson) in args.only]
+                )
+
+    return asyncio.run(scenario()), llm_calls
+
+
+def test_parse_and_group_sections():
+    lines = generator.parse_lesson_lines(LESSON_TEXT)
+    assert [(line["speakerId"], line["segmentType"], line["emotion"], line["text"]) for line in lines] == [
+        (1, "WELCOME", "happy", "Hello"),
+        (2, "WELCOME", "friendly", "Hi there"),
+        (1, "VOCAB", "neutral", "Word - meaning"),
+        (1, "QUIZ", "curious", "Question?"),
+    ]
+    sections = generator.group_sections(lines)
+    assert [(name, len(section)) for name, section in sections] == [("welcome", 2), ("vocab", 1), ("quiz", 1)]
+
+
+def test_outputs_are_skipped_while_the_prompt_hash_matches(tmp_path):
+    results, calls = run(tmp_path)
+    assert results["generated"] == 2 and len(calls) == 2
+
+    output = json.loads((tmp_path / "lesson_data_es_coffee_shop.json").read_text())
+    assert output["prompt_hash"] == generator.prompt_hash(generator.LESSONS[1])
+    assert len(output["lines"]) == 4
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    results, calls = run(tmp_path)
+    assert results["skipped"] == 2 and not calls
+
+    # A changed prompt (here: an edited output hash) is regenerated
+    output["prompt_hash"] = "stale"
+    (tmp_path / "lesson_data_es_coffee_shop.json").write_text(json.dumps(output))
+    results, calls = run(tmp_path)
+    assert results["generated"] == 1 and results["skipped"] == 1 and len(calls) == 1
+
+
+def test_audio_accounting_and_resume_from_checkpoint(tmp_path):
+    backend = FakeBackend(cached=2, fail={"en_quiz_restaurant"})
+    results, _ = run(tmp_path, backend)
+
+    assert len(backend.requests) == 6  # 3 sections x 2 lessons
+    assert all(body["pin"] for body in backend.requests)
+    assert results["audio_cached"] == 2
+    assert results["audio_generated"] == 3
+    assert results["audio_failed"] == 1
+
+    state = json.loads((tmp_path / generator.CHECKPOINT_FILE).read_text())
+    assert sorted(state["en_restaurant"]["sections"]) == ["vocab", "welcome"]
+    assert sorted(state["es_coffee_shop"]["sections"]) == ["quiz", "vocab", "welcome"]
+
+    # Re-run: only the failed section goes to the backend again
+    backend = FakeBackend()
+    results, calls = run(tmp_path, backend)
+    assert not calls
+    assert [(body["language"], body["section_type"]) for body in backend.requests] == [("en", "quiz")]
+    assert results["audio_skipped"] == 5
+    assert results["audio_generated"] == 1
+
+
+def test_other_speakers_or_backend_render_audio_again(tmp_path):
+    run(tmp_path, FakeBackend())
+
+    backend = FakeBackend()
+    results, _ = run(tmp_path, backend, ["--speakers", "sarah", "kevin"])
+    assert len(backend.requests) == 6
+    assert {(body["speaker_a"], body["speaker_b"]) for body in backend.requests} == {("sarah", "kevin")}
+    assert results["audio_skipped"] == 0
+
+    state = json.loads((tmp_path / generator.CHECKPOINT_FILE).read_text())
+    assert state["es_coffee_shop"]["sections"]["quiz"] == {
+        "target": f"{generator.BACKEND_URL}|sarah|kevin",
+        "cache_key": "es_quiz_coffee_shop.v2-0123456789abcdef",
+    }
+
+    backend = FakeBackend()
+    results, _ = run(tmp_path, backend, ["--speakers", "sarah", "kevin", "--backend-url", "http://other.test"])
+    assert len(backend.requests) == 6
@@ -0,0 +1,205 @@
+"""
+Batch Lesson Resolve Tests
+"""
+
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from server import app
+from routes import audio_cache
+from models.audio_cache import AudioCacheResponse
+from services.metadata_cache import MetadataCache
+from services.cache_key_generator import cache_key_hash
+from services.elevenlabs_dialogue import voice_alias, mentions_speaker_names
+
+
+def entry(cache_key: str, alias: str = None, created_at: int = 0) -> dict:
+    return {
+        "cache_key": cache_key,
+        "alias": alias,
+        "audio_path": f"/audio-cache/es/restaurant/{cache_key}.mp3",
+        "dialogue_timestamps": [{"text": "Hola", "speaker_id": 1, "start": 0.0, "end": 0.8}],
+        "duration": 800,
+        "created_at": created_at,
+    }
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """Records find() calls and serves documents from a list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        clauses = query.get("$or", [query])
+
+        def holds(doc, field, cond):
+            return doc.get(field) in cond["$in"] if isinstance(cond, dict) else doc.get(field) == cond
+
+        def matches(doc):
+            return any(all(holds(doc, field, cond) for field, cond in clause.items()) for clause in clauses)
+
+        return FakeCursor([doc for doc in self.docs if matches(doc)])
+
+
+class FakeDB:
+    def __init__(self, docs):
+        self.audio_cache = FakeCollection(docs)
+
+
+VOCAB_LINES = [{"text": "la cuenta", "speakerId": 1}]
+VOCAB_KEY = audio_cache.section_cache_key("es", "vocab", "restaurant", "carlos", "ana", VOCAB_LINES)
+
+LESSON = {
+    "language": "es",
+    "location": "restaurant",
+    "speaker_a": "carlos",
+    "speaker_b": "ana",
+    "sections": [
+        {"section_type": "welcome"},
+        {"section_type": "vocab", "dialogue_lines": VOCAB_LINES},
+        {"section_type": "quiz"},
+        {"section_type": "cultural"},
+    ],
+}
+
+
+def setup(monkeypatch, docs, cached=()):
+    cache = MetadataCache(max_entries=100)
+    for key in cached:
+        cache.put(key, entry(key))
+    fake_db = FakeDB(docs)
+    monkeypatch.setattr(audio_cache, "metadata_cache", cache)
+    monkeypatch.setattr(audio_cache, "db", fake_db)
+    return fake_db
+
+
+def test_resolve_batches_content_keys_and_aliases(monkeypatch):
+    fake_db = setup(
+        monkeypatch,
+        docs=[
+            # Legacy entry keyed by its alias, and two script variants of the quiz
+            entry("es_cultural_restaurant_carlos_ana"),
+            entry("es_quiz_restaurant_carlos_ana.v2-aaaa", alias="es_quiz_restaurant_carlos_ana", created_at=1),
+            entry("es_quiz_restaurant_carlos_ana.v2-bbbb", alias="es_quiz_restaurant_carlos_ana", created_at=2),
+        ],
+        cached=["es_welcome_restaurant_carlos_ana"],
+    )
+
+    response = TestClient(app).post("/api/audio/lesson/resolve", json=LESSON)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [h["cache_key"] for h in data["hits"]] == [
+        "es_welcome_restaurant_carlos_ana",
+        "es_quiz_restaurant_carlos_ana.v2-bbbb",  # newest variant
+        "es_cultural_restaurant_carlos_ana",
+    ]
+    assert data["misses"] == [VOCAB_KEY]
+
+    # Only keys the metadata cache could not answer went to MongoDB: one query per key kind
+    aliases = ["es_quiz_restaurant_carlos_ana", "es_cultural_restaurant_carlos_ana"]
+    assert fake_db.audio_cache.queries == [
+        {"$or": [
+            {"cache_key": {"$in": [VOCAB_KEY]}},
+            {"script_hash": {"$in": [cache_key_hash(VOCAB_KEY)]}},
+        ]},
+        {"$or": [
+            {"cache_key": {"$in": aliases}},
+            {"alias": {"$in": aliases}},
+            {"voice_alias": {"$in": [voice_alias("es", "quiz", "restaurant", "carlos", "ana"),
+                                     voice_alias("es", "cultural", "restaurant", "carlos", "ana")]},
+             "mentions_speakers": False},
+        ]},
+    ]
+
+
+def test_speakers_sharing_voices_share_audio(monkeypatch):
+    """carlos/ana and james/lisa use the same two voices"""
+    james_key = audio_cache.section_cache_key("es", "vocab", "restaurant", "james", "lisa", VOCAB_LINES)
+    assert james_key != VOCAB_KEY and cache_key_hash(james_key) == cache_key_hash(VOCAB_KEY)
+
+    greeting = [{"text": "Hola Lisa", "speakerId": 1}]
+    setup(monkeypatch, docs=[
+        dict(entry(james_key), script_hash=cache_key_hash(james_key)),
+        dict(entry("es_welcome_restaurant_james_lisa.v2-aaaa"), mentions_speakers=False,
+             voice_alias=voice_alias("es", "welcome", "restaurant", "james", "lisa")),
+        dict(entry("es_cultural_restaurant_james_lisa.v2-bbbb"),
+             mentions_speakers=mentions_speaker_names(greeting, "james", "lisa"),
+             voice_alias=voice_alias("es", "cultural", "restaurant", "james", "lisa")),
+    ])
+
+    data = TestClient(app).post("/api/audio/lesson/resolve", json=LESSON).json()
+    assert [h["cache_key"] for h in data["hits"]] == [
+        "es_welcome_restaurant_james_lisa.v2-aaaa",
+        james_key,
+    ]
+    # The cultural script greets Lisa by name, so it is not reused for Ana
+    assert data["misses"] == ["es_quiz_restaurant_carlos_ana", "es_cultural_restaurant_carlos_ana"]
+
+
+def test_generate_missing_only_for_sections_with_lines(monkeypatch):
+    setup(monkeypatch, docs=[])
+    generated = []
+
+    async def fake_generate(cache_key, request):
+        generated.append(cache_key)
+        if request.section_type == "vocab":
+            return AudioCacheResponse(
+                cache_key=cache_key,
+                audio_url=f"http://test/api/audio/file/{cache_key}",
+                timestamps=[],
+                duration=1000,
+                is_cached=False,
+            )
+        raise HTTPException(status_code=500, detail="boom")
+
+    monkeypatch.setattr(audio_cache, "generate_section", fake_generate)
+
+    quiz_lines = [{"text": "¿Qué es?", "speakerId": 2}]
+    quiz_key = audio_cache.section_cache_key("es", "quiz", "restaurant", "carlos", "ana", quiz_lines)
+    lesson = dict(LESSON, generate_missing=True)
+    lesson["sections"] = LESSON["sections"] + [{"section_type": "quiz", "dialogue_lines": quiz_lines}]
+    data = TestClient(app).post("/api/audio/lesson/resolve", json=lesson).json()
+
+    assert sorted(generated) == sorted([quiz_key, VOCAB_KEY])
+    assert [h["cache_key"] for h in data["hits"]] == [VOCAB_KEY]
+    assert data["hits"][0]["is_cached"] is False
+    assert data["errors"] == {quiz_key: "boom"}
+    assert quiz_key in data["misses"]
+    assert "es_welcome_restaurant_carlos_ana" in data["misses"]
+
+
+def test_found_aliases_are_cached_briefly(monkeypatch):
+    quiz = "es_quiz_restaurant_carlos_ana"
+    fake_db = setup(monkeypatch, docs=[entry(f"{quiz}.v2-aaaa", alias=quiz, created_at=1)])
+
+    first = asyncio.run(audio_cache.resolve_cache_entry(quiz))
+    second = asyncio.run(audio_cache.resolve_cache_entry(quiz))
+    assert first["cache_key"] == second["cache_key"] == f"{quiz}.v2-aaaa"
+    assert len(fake_db.audio_cache.queries) == 1  # the repeat hit made no round trip
+
+    # A newer variant shows up once the alias is invalidated (or its TTL runs out)
+    fake_db.audio_cache.docs.append(entry(f"{quiz}.v2-bbbb", alias=quiz, created_at=2))
+    audio_cache.metadata_cache.invalidate(quiz)
+    assert asyncio.run(audio_cache.resolve_cache_entry(quiz))["cache_key"] == f"{quiz}.v2-bbbb"
@@ -0,0 +1,92 @@
+"""
+Metadata Cache Tests
+"""
+
+import time
+
+from fastapi.testclient import TestClient
+
+from server import app
+from routes import audio_cache
+from services.metadata_cache import MetadataCache, MISSING
+
+
+ENTRY = {
+    "_id": "mongo-object-id",
+    "cache_key": "en_welcome_coffeeshop_maria_jordan",
+    "audio_path": "/audio-cache/en/coffeeshop/en_welcome_coffeeshop_maria_jordan.mp3",
+    "dialogue_timestamps": [{"text": "Welcome!", "speaker_id": 1, "start": 0.0, "end": 1.2}],
+    "duration": 1200,
+}
+
+
+class TestMetadataCache:
+    def test_hit_miss_and_id_stripped(self):
+        cache = MetadataCache(max_entries=10)
+        assert cache.get(ENTRY["cache_key"]) is MISSING
+        cache.put(ENTRY["cache_key"], ENTRY)
+        hit = cache.get(ENTRY["cache_key"])
+        assert hit["duration"] == 1200
+        assert "_id" not in hit
+
+    def test_lru_bound(self):
+        cache = MetadataCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.put(key, {"cache_key": key})
+        cache.get("a")
+        cache.put("c", {"cache_key": "c"})
+        assert cache.get("b") is MISSING
+        assert cache.get("a") is not MISSING
+        assert cache.stats()["evictions"] == 1
+
+    def test_negative_entries_expire(self):
+        cache = MetadataCache(max_entries=10, negative_ttl=0.05)
+        cache.put_negative("missing")
+        assert cache.get("missing") is None
+        time.sleep(0.06)
+        assert cache.get("missing") is MISSING
+
+    def test_entries_with_a_ttl_expire(self):
+        cache = MetadataCache(max_entries=10)
+        cache.put("alias", {"cache_key": "alias.v2-aaaa"}, ttl=0.05)
+        assert cache.get("alias")["cache_key"] == "alias.v2-aaaa"
+        time.sleep(0.06)
+        assert cache.get("alias") is MISSING
+
+    def test_positive_entries_expire(self):
+        # A section deleted by another worker's GC must not stay a hit forever
+        cache = MetadataCache(max_entries=10, positive_ttl=0.05)
+        cache.put("a", {"cache_key": "a"})
+        cache.put("b", {"cache_key": "b"}, ttl=0)
+        assert cache.get("a")["cache_key"] == "a"
+        time.sleep(0.06)
+        assert cache.get("a") is MISSING
+        assert cache.get("b")["cache_key"] == "b"  # ttl=0: kept until evicted
+
+    def test_clear(self):
+        cache = MetadataCache(max_entries=10)
+        cache.put("a", {"cache_key": "a"})
+        cache.clear()
+        assert cache.get("a") is MISSING
+
+
+class ExplodingDB:
+    """Any MongoDB access fails the test"""
+
+    def __getattr__(self, name):
+        raise AssertionError("cache hit should not touch MongoDB")
+
+
+def test_cached_section_hit_makes_no_database_round_trip(monkeypatch):
+    cache = MetadataCache(max_entries=10)
+    cache.put(ENTRY["cache_key"], ENTRY)
+    monkeypatch.setattr(audio_cache, "metadata_cache", cache)
+    monkeypatch.setattr(audio_cache, "db", ExplodingDB())
+
+    response = TestClient(app).get(f"/api/audio/section/{ENTRY['cache_key']}")
+    assert response.status_code == 200
+    assert response.json()["is_cached"] is True
+    assert response.json()["duration"] == 1200
+
+    cache.put_negative("en_quiz_coffeeshop_maria_jordan")
+    assert TestClient(app).get("/api/audio/section/en_quiz_coffeeshop_maria_jordan").status_code == 404
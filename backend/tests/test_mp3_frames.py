@@ -0,0 +1,52 @@
+"""
+MP3 Frame Parsing Tests
+"""
+
+from services.mp3_frames import Mp3FrameCounter, mp3_duration, parse_frame_header
+
+
+# MPEG1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 bytes, 1152 samples
+FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+# Same, with the padding bit set: 418 bytes
+PADDED_FRAME = b"\xff\xfb\x92\x64" + b"\x00" * 414
+# MPEG2 Layer III, 64 kbps, 24 kHz: 576 samples, 192 bytes
+MPEG2_FRAME = b"\xff\xf3\x84\x64" + b"\x00" * 188
+
+
+def id3v2_tag(body_size: int) -> bytes:
+    size = bytes([(body_size >> 21) & 0x7F, (body_size >> 14) & 0x7F, (body_size >> 7) & 0x7F, body_size & 0x7F])
+    return b"ID3\x04\x00\x00" + size + b"\x00" * body_size
+
+
+def xing_frame() -> bytes:
+    # Xing tag sits after the header and 32 bytes of stereo side info
+    frame = bytearray(FRAME)
+    frame[36:40] = b"Xing"
+    return bytes(frame)
+
+
+def test_header_fields():
+    header = parse_frame_header(FRAME)
+    assert (header.bitrate, header.sample_rate, header.length, header.samples) == (128, 44100, 417, 1152)
+    assert parse_frame_header(PADDED_FRAME).length == 418
+    mpeg2 = parse_frame_header(MPEG2_FRAME)
+    assert (mpeg2.sample_rate, mpeg2.samples, mpeg2.length) == (24000, 576, 192)
+    assert parse_frame_header(b"\xff\xfb\xf0\x64") is None  # bad bitrate index
+
+
+def test_duration_skips_tags_and_info_frame():
+    audio = id3v2_tag(300) + xing_frame() + (FRAME + PADDED_FRAME) * 50 + b"TAG" + b"\x00" * 125
+    seconds, frames = mp3_duration(audio)
+    assert frames == 100
+    assert abs(seconds - 100 * 1152 / 44100) < 1e-9
+
+
+def test_chunked_feed_matches_whole_buffer():
+    audio = id3v2_tag(5000) + FRAME * 40 + b"\x00garbage" + MPEG2_FRAME * 10 + FRAME[:100]
+    counter = Mp3FrameCounter()
+    for offset in range(0, len(audio), 333):
+        counter.feed(audio[offset:offset + 333])
+
+    assert counter.frames == 50  # truncated trailing frame not counted
+    assert counter.duration_seconds == mp3_duration(audio)[0]
+    assert counter.duration_ms == round((40 * 1152 / 44100 + 10 * 576 / 24000) * 1000)
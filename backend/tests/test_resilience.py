@@ -0,0 +1,219 @@
+"""
+Upstream Resilience Tests
+Run against an in-process fake upstream that injects latency and errors.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from services import resilience
+from services.resilience import (
+    CircuitBreaker, ProviderResilience, CircuitOpen, DeadlineExceeded,
+    BREAKER_OPEN, BREAKER_HALF_OPEN, BREAKER_CLOSED
+)
+from services.tts_cache import TTSCache
+from services.upstream_limiter import UpstreamLimiter, LimiterTimeout
+
+
+class FakeUpstream:
+    """Replays a script of (delay_seconds, status_code) per call, then answers 200"""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request)
+        delay, status = self.script.pop(0) if self.script else (0, 200)
+        await asyncio.sleep(delay)
+        if status != 200:
+            return httpx.Response(status, json={"error": "injected"})
+        return httpx.Response(200, content=b"ID3audio", headers={"Content-Type": "audio/mpeg"})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(self.handler), base_url="https://upstream.test"
+        )
+
+
+def synth_attempt(client: httpx.AsyncClient):
+    async def attempt():
+        response = await client.post("/v1/text-to-speech/voice")
+        response.raise_for_status()
+        return response.content
+    return attempt
+
+
+def policy(**kwargs) -> ProviderResilience:
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.02)
+    return ProviderResilience("test", **kwargs)
+
+
+def test_retries_transient_errors_then_succeeds():
+    upstream = FakeUpstream([(0, 503), (0, 429)])
+    resilient = policy()
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(synth_attempt(client), deadline=5)
+
+    assert asyncio.run(scenario()) == b"ID3audio"
+    assert len(upstream.calls) == 3
+    assert resilient.stats()["retries"] == 2
+    assert resilient.breaker.state == BREAKER_CLOSED
+
+
+def test_client_errors_are_not_retried():
+    upstream = FakeUpstream([(0, 400)])
+    resilient = policy()
+
+    async def scenario():
+        async with upstream.client() as client:
+            await resilient.call(synth_attempt(client), deadline=5)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scenario())
+    assert len(upstream.calls) == 1
+    assert resilient.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_deadline_bounds_slow_upstream():
+    upstream = FakeUpstream([(1.0, 200)])
+    resilient = policy()
+
+    async def scenario():
+        async with upstream.client() as client:
+            await resilient.call(synth_attempt(client), deadline=0.1)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+
+
+def test_breaker_opens_then_probes():
+    upstream = FakeUpstream([(0, 500)] * 3)
+    resilient = policy(breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.05), max_attempts=3)
+
+    async def scenario():
+        async with upstream.client() as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await resilient.call(synth_attempt(client), deadline=5)
+            assert resilient.breaker.state == BREAKER_OPEN
+
+            with pytest.raises(CircuitOpen):
+                await resilient.call(synth_attempt(client), deadline=5)
+
+            await asyncio.sleep(0.06)
+            assert resilient.breaker.state == BREAKER_HALF_OPEN
+            return await resilient.call(synth_attempt(client), deadline=5)
+
+    assert asyncio.run(scenario()) == b"ID3audio"
+    assert resilient.breaker.state == BREAKER_CLOSED
+    assert len(upstream.calls) == 4  # the open circuit sent nothing upstream
+
+
+def test_cancelled_probe_frees_the_half_open_slot():
+    upstream = FakeUpstream([(0, 500), (1.0, 200)])
+    resilient = policy(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05), max_attempts=1)
+
+    async def scenario():
+        async with upstream.client() as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await resilient.call(synth_attempt(client), deadline=5)
+            await asyncio.sleep(0.06)
+
+            probe = asyncio.ensure_future(resilient.call(synth_attempt(client), deadline=5))
+            await asyncio.sleep(0.05)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+            # Still half-open, and the next call may probe instead of being rejected
+            assert resilient.breaker.state == BREAKER_HALF_OPEN
+            return await resilient.call(synth_attempt(client), deadline=5)
+
+    assert asyncio.run(scenario()) == b"ID3audio"
+    assert resilient.breaker.state == BREAKER_CLOSED
+    assert resilient.breaker.stats()["rejections"] == 0
+
+
+def test_local_queueing_does_not_trip_the_breaker():
+    upstream = FakeUpstream()
+    limiter = UpstreamLimiter("test", max_concurrency=1)
+    resilient = policy(breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30))
+
+    def limited_attempt(client):
+        async def attempt():
+            async with limiter.acquire():
+                return await synth_attempt(client)()
+        return attempt
+
+    async def scenario():
+        async with upstream.client() as client:
+            held = await limiter.enter()
+            for _ in range(3):
+                with pytest.raises(LimiterTimeout):
+                    await resilient.call(limited_attempt(client), deadline=0.1)
+            assert resilient.breaker.state == BREAKER_CLOSED
+
+            # Queue wait is not provider latency
+            asyncio.get_running_loop().call_later(0.2, held.release)
+            result = await resilient.call(limited_attempt(client), deadline=5)
+            assert resilient.latency().p95() < 0.1
+            return result
+
+    assert asyncio.run(scenario()) == b"ID3audio"
+    assert resilient.breaker.stats()["consecutive_failures"] == 0
+    assert resilient.stats()["failures"] == 0
+    assert len(upstream.calls) == 1
+
+
+def test_hedge_wins_when_first_call_is_slow():
+    upstream = FakeUpstream([(1.0, 200)])
+    resilient = policy(hedging=True, hedge_min_samples=5)
+    for _ in range(5):
+        resilient.latency().record(0.02)
+
+    async def scenario():
+        async with upstream.client() as client:
+            return await resilient.call(synth_attempt(client), deadline=5)
+
+    assert asyncio.run(scenario()) == b"ID3audio"
+    stats = resilient.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert len(upstream.calls) == 2
+
+
+def test_tts_falls_back_to_other_provider(monkeypatch, tmp_path):
+    """ElevenLabs keeps failing, so /api/tts is served by OpenAI with the mapped voice"""
+    elevenlabs = FakeUpstream([(0, 503)] * 10)
+    openai = FakeUpstream()
+    clients = {"elevenlabs": elevenlabs.client(), "openai": openai.client()}
+
+    monkeypatch.setattr(server, "get_client", lambda provider: clients[provider])
+    monkeypatch.setattr(server, "tts_cache", TTSCache(str(tmp_path)))
+    monkeypatch.setattr(server, "ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(resilience, "_providers", {
+        "elevenlabs": policy(breaker=CircuitBreaker(failure_threshold=2)),
+        "openai": policy(),
+    })
+
+    request = {"text": "Hello there", "voice": "EXAVITQu4vr4xnSDxMaL", "provider": "elevenlabs"}
+    response = TestClient(server.app).post("/api/tts", json=request)
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    assert len(elevenlabs.calls) == 2  # breaker opened after two failures
+    assert json.loads(openai.calls[0].content)["voice"] == "nova"
+
+    # With the circuit open, the next request goes straight to OpenAI
+    response = TestClient(server.app).post("/api/tts?stream=true", json=dict(request, text="Again"))
+    assert response.content == b"ID3audio"
+    assert len(elevenlabs.calls) == 2
+    assert len(openai.calls) == 2
@@ -0,0 +1,90 @@
+"""
+Dialogue Script Cache Tests
+"""
+
+import itertools
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+import server
+from services import dialogue_script, upstream_limiter
+from services.dialogue_script import script_cache_key
+from services.script_cache import ScriptCache
+
+CONFIG = {"language": "es", "location": "coffee_shop", "situation": "ordering", "difficulty": "beginner"}
+
+
+def test_key_normalizes_config():
+    assert script_cache_key(CONFIG) == script_cache_key(dict(CONFIG, location="Coffee Shop", language=" ES "))
+    assert script_cache_key(CONFIG) != script_cache_key(dict(CONFIG, difficulty="advanced"))
+    # Defaults are part of the prompt, so an omitted field equals its default
+    assert script_cache_key({}) == script_cache_key({"language": "en", "location": "coffee_shop",
+                                                     "situation": "ordering", "difficulty": "intermediate"})
+
+
+def test_variants_expire_and_pools_are_bounded():
+    cache = ScriptCache(variants=2, ttl=0.05, max_keys=2)
+    cache.put("a", "script 1")
+    cache.put("a", "script 1")  # duplicate variant ignored
+    assert cache.get("a") is None  # still filling
+    cache.put("a", "script 2")
+    assert cache.get("a") in ("script 1", "script 2")
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get_any("a") is None
+    assert cache.stats()["expired"] == 2
+
+    for key in ("a", "b", "c"):
+        cache.put(key, "script")
+    assert cache.stats()["keys"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_warm_pool_serves_without_upstream_calls(monkeypatch):
+    counter = itertools.count(1)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        n = next(counter)
+        calls.append(n)
+        if n > 3:
+            return httpx.Response(503, json={"error": "down"})
+        text = f"1|WELCOME|[friendly]|Variant {n}"
+        return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="https://api.openai.test")
+    cache = ScriptCache(variants=2)
+    monkeypatch.setattr(server, "get_client", lambda provider: client)
+    monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(server, "script_cache", cache)
+    monkeypatch.setattr(dialogue_script, "script_cache", cache)
+    monkeypatch.setattr(upstream_limiter, "_limiters", {})
+
+    api = TestClient(server.app)
+    first = [api.post("/api/generate-dialogue", json={"config": CONFIG}) for _ in range(2)]
+    assert [r.headers["x-script-cache"] for r in first] == ["miss", "miss"]
+
+    later = [api.post("/api/generate-dialogue", json={"config": dict(CONFIG, location="coffee-shop")}) for _ in range(10)]
+    assert all(r.headers["x-script-cache"] == "hit" for r in later)
+    assert {r.json()["output_text"] for r in later} <= {"1|WELCOME|[friendly]|Variant 1", "1|WELCOME|[friendly]|Variant 2"}
+    assert len(calls) == 2
+
+    # The streaming endpoint replays the warm pool too
+    stream = api.post("/api/generate-dialogue/stream", json={"config": CONFIG})
+    assert "event: line" in stream.text and "event: done" in stream.text
+    assert len(calls) == 2
+
+    # Another prompt: one fill, then the upstream fails and the partial pool answers
+    other = dict(CONFIG, difficulty="advanced")
+    assert api.post("/api/generate-dialogue", json={"config": other}).headers["x-script-cache"] == "miss"
+    fallback = api.post("/api/generate-dialogue", json={"config": other})
+    assert fallback.headers["x-script-cache"] == "fallback"
+    assert fallback.json()["output_text"] == "1|WELCOME|[friendly]|Variant 3"
+
+    stats = api.get("/api/generate-dialogue/cache/stats").json()
+    assert stats["hits"] == 11
+    assert stats["fills"] == 3
+    assert stats["served_on_error"] == 1
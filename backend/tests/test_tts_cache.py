@@ -0,0 +1,150 @@
+"""
+TTS Result Cache Tests
+"""
+
+import json
+import asyncio
+import base64
+
+from fastapi.testclient import TestClient
+
+import server
+from services.tts_cache import TTSCache, make_tts_cache_key
+
+
+AUDIO = b"\xff\xfb\x90\x64" + b"\x01" * 1000
+
+
+def key_for(text: str, **overrides) -> str:
+    params = {
+        "provider": "elevenlabs",
+        "voice": "EXAVITQu4vr4xnSDxMaL",
+        "text": text,
+        "model": "eleven_flash_v2_5",
+        "settings": {"stability": 0.5},
+    }
+    params.update(overrides)
+    return make_tts_cache_key(**params)
+
+
+class TestCacheKey:
+    def test_key_is_stable(self):
+        assert key_for("Hello") == key_for("Hello")
+
+    def test_every_input_changes_key(self):
+        base = key_for("Hello")
+        assert key_for("Hello!") != base
+        assert key_for("Hello", voice="other") != base
+        assert key_for("Hello", provider="openai") != base
+        assert key_for("Hello", model="eleven_v3") != base
+        assert key_for("Hello", settings={"stability": 0.6}) != base
+
+
+class TestTTSCache:
+    def test_memory_then_disk_hit(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=10_000, disk_max_bytes=100_000)
+        key = key_for("Hello")
+
+        assert asyncio.run(cache.get(key)) is None
+        asyncio.run(cache.put(key, AUDIO))
+        assert asyncio.run(cache.get(key)) == AUDIO
+
+        # A fresh instance only has the disk tier to go on
+        reopened = TTSCache(str(tmp_path), memory_max_bytes=10_000, disk_max_bytes=100_000)
+        assert asyncio.run(reopened.get(key)) == AUDIO
+
+        stats = reopened.stats()
+        assert stats["disk_hits"] == 1
+        assert stats["disk_entries"] == 1
+        assert stats["disk_bytes"] == len(AUDIO)
+
+    def test_disk_budget_evicts_least_recently_used(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=0, disk_max_bytes=len(AUDIO) * 2)
+        keys = [key_for(f"line {i}") for i in range(3)]
+
+        asyncio.run(cache.put(keys[0], AUDIO))
+        asyncio.run(cache.put(keys[1], AUDIO))
+        asyncio.run(cache.get(keys[0]))  # touch: keys[1] is now the LRU entry
+        asyncio.run(cache.put(keys[2], AUDIO))
+
+        assert asyncio.run(cache.get(keys[1])) is None
+        assert asyncio.run(cache.get(keys[0])) == AUDIO
+        assert asyncio.run(cache.get(keys[2])) == AUDIO
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["disk_bytes"] <= len(AUDIO) * 2
+
+    def test_concurrent_stores_keep_a_complete_index(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=0, disk_max_bytes=100_000)
+        keys = [key_for(f"line {i}") for i in range(20)]
+
+        async def scenario():
+            await asyncio.gather(*(cache.put(key, AUDIO) for key in keys))
+
+        asyncio.run(scenario())
+        with open(tmp_path / "index.json") as f:
+            assert sorted(json.load(f)) == sorted(keys)
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_concurrent_stores_of_one_key_count_it_once(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=0, disk_max_bytes=100_000)
+        key = key_for("Hello")
+
+        async def scenario():
+            await asyncio.gather(*(cache.put(key, AUDIO) for _ in range(5)))
+
+        asyncio.run(scenario())
+        stats = cache.stats()
+        assert stats["disk_entries"] == 1
+        assert stats["disk_bytes"] == len(AUDIO)
+        assert stats["stores"] == 1
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_hits_are_persisted_without_a_store(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=10_000, disk_max_bytes=len(AUDIO) * 2)
+        keys = [key_for(f"line {i}") for i in range(3)]
+
+        async def scenario():
+            await cache.start()
+            await cache.put(keys[0], AUDIO)
+            await cache.put(keys[1], AUDIO)
+            await cache.get(keys[0])  # memory hit still counts for the disk LRU
+            await cache.stop()
+
+        asyncio.run(scenario())
+        assert asyncio.run(cache.flush_index()) is False  # nothing changed since stop()
+
+        # After a restart keys[1] is still the least recently used entry
+        reopened = TTSCache(str(tmp_path), memory_max_bytes=0, disk_max_bytes=len(AUDIO) * 2)
+        asyncio.run(reopened.put(keys[2], AUDIO))
+        assert asyncio.run(reopened.get(keys[1])) is None
+        assert asyncio.run(reopened.get(keys[0])) == AUDIO
+
+    def test_memory_budget(self, tmp_path):
+        cache = TTSCache(str(tmp_path), memory_max_bytes=len(AUDIO), disk_max_bytes=100_000)
+        asyncio.run(cache.put(key_for("a"), AUDIO))
+        asyncio.run(cache.put(key_for("b"), AUDIO))
+        assert cache.stats()["memory_entries"] == 1
+        assert cache.stats()["memory_bytes"] <= len(AUDIO)
+
+
+class TestTTSEndpointCache:
+    def test_cache_hit_skips_upstream(self, tmp_path, monkeypatch):
+        cache = TTSCache(str(tmp_path))
+        monkeypatch.setattr(server, "tts_cache", cache)
+        monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+
+        def fail_upstream(provider):
+            raise AssertionError("upstream should not be called on a cache hit")
+
+        monkeypatch.setattr(server, "get_client", fail_upstream)
+
+        key = make_tts_cache_key("openai", "nova", "Hola", "tts-1", {"response_format": "mp3"})
+        asyncio.run(cache.put(key, AUDIO))
+
+        response = TestClient(server.app).post(
+            "/api/tts", json={"text": "Hola", "voice": "nova", "provider": "openai"}
+        )
+        assert response.status_code == 200
+        audio = response.json()["audio"]
+        assert audio == "data:audio/mpeg;base64," + base64.b64encode(AUDIO).decode()
+        assert cache.stats()["memory_hits"] == 1
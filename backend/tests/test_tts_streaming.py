@@ -0,0 +1,86 @@
+"""
+/api/tts Binary Streaming Tests
+"""
+
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import server
+from services import resilience
+from services.tts_cache import TTSCache
+
+
+AUDIO = bytes(range(256)) * 512  # 128 KB, several upstream chunks
+
+
+def fake_upstream(status_code: int = 200):
+    """Build a get_client replacement backed by an in-process fake upstream"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if status_code != 200:
+            return httpx.Response(status_code, json={"error": "boom"})
+        return httpx.Response(200, content=AUDIO, headers={"Content-Type": "audio/mpeg"})
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="https://upstream.test"
+    )
+    return (lambda provider: client), calls
+
+
+def setup(monkeypatch, tmp_path, status_code: int = 200):
+    get_client, calls = fake_upstream(status_code)
+    cache = TTSCache(str(tmp_path))
+    monkeypatch.setattr(server, "get_client", get_client)
+    monkeypatch.setattr(server, "tts_cache", cache)
+    monkeypatch.setattr(server, "ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setattr(server, "OPENAI_API_KEY", None)  # no provider fallback here
+    monkeypatch.setattr(resilience, "_providers", {})
+    return cache, calls
+
+
+REQUEST = {"text": "Hello there", "voice": "EXAVITQu4vr4xnSDxMaL", "provider": "elevenlabs"}
+
+
+class TestTTSStreaming:
+    def test_stream_query_flag_returns_raw_audio(self, monkeypatch, tmp_path):
+        cache, calls = setup(monkeypatch, tmp_path)
+        response = TestClient(server.app).post("/api/tts?stream=true", json=REQUEST)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/mpeg"
+        assert "content-length" not in response.headers  # chunked transfer
+        assert response.content == AUDIO
+        assert len(calls) == 1
+
+        # The relayed result was cached and is served without a second upstream call
+        _, _, _, _, key = server.build_tts_upstream_request(server.TTSRequest(**REQUEST))
+        assert asyncio.run(cache.get(key)) == AUDIO
+
+        again = TestClient(server.app).post("/api/tts?stream=true", json=REQUEST)
+        assert again.content == AUDIO
+        assert len(calls) == 1
+
+    def test_accept_header_selects_stream(self, monkeypatch, tmp_path):
+        setup(monkeypatch, tmp_path)
+        response = TestClient(server.app).post(
+            "/api/tts", json=REQUEST, headers={"Accept": "audio/mpeg"}
+        )
+        assert response.headers["content-type"] == "audio/mpeg"
+        assert response.content == AUDIO
+
+    def test_default_json_shape_unchanged(self, monkeypatch, tmp_path):
+        setup(monkeypatch, tmp_path)
+        response = TestClient(server.app).post("/api/tts", json=REQUEST)
+        data = response.json()
+        assert data["success"] is True
+        assert data["audio"].startswith("data:audio/mpeg;base64,")
+
+    def test_upstream_error_before_stream_starts(self, monkeypatch, tmp_path):
+        cache, _ = setup(monkeypatch, tmp_path, status_code=502)
+        response = TestClient(server.app).post("/api/tts?stream=true", json=REQUEST)
+        assert response.status_code == 500
+        assert cache.stats()["stores"] == 0
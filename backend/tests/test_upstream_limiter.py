@@ -0,0 +1,114 @@
+"""
+Upstream Limiter Tests
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import app
+from services import upstream_limiter
+from services.tts_cache import TTSCache
+from services.upstream_limiter import UpstreamLimiter, LimiterTimeout
+
+
+def test_concurrency_is_capped():
+    limiter = UpstreamLimiter("test", max_concurrency=2)
+    running = []
+    peak = []
+
+    async def call():
+        async with limiter.acquire():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.pop()
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert max(peak) == 2
+    stats = limiter.stats()
+    assert stats["acquired"] == 6
+    assert stats["in_flight"] == 0
+    assert stats["max_wait_ms"] > 0
+
+
+def test_request_rate_queues_instead_of_failing():
+    limiter = UpstreamLimiter("test", max_concurrency=10, requests_per_second=20)
+
+    async def scenario():
+        started = time.monotonic()
+        # Bucket holds one second of burst (20); the next 5 have to wait ~0.25s
+        for _ in range(25):
+            async with limiter.acquire():
+                pass
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    assert 0.2 <= elapsed < 1.0
+
+
+def test_character_budget_and_deadline():
+    limiter = UpstreamLimiter("test", max_concurrency=10, chars_per_second=100)
+
+    async def scenario():
+        async with limiter.acquire(chars=100):
+            pass
+        # The bucket is empty and refills 100 chars/s: 100 more chars need ~1s
+        with pytest.raises(LimiterTimeout):
+            await limiter.enter(chars=100, timeout=0.1)
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert stats["timeouts"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_bulk_callers_leave_the_interactive_reserve_free():
+    limiter = UpstreamLimiter("test", max_concurrency=4, interactive_reserve=1)
+
+    async def scenario():
+        # A chunked render holds three bulk permits for its whole stream
+        held = [await limiter.enter(bulk=True) for _ in range(3)]
+        with pytest.raises(LimiterTimeout):
+            await limiter.enter(bulk=True, timeout=0.05)
+
+        # An interactive request still gets the reserved slot straight away
+        async with limiter.acquire(timeout=0.05):
+            assert limiter.stats()["in_flight"] == 4
+            assert limiter.stats()["bulk_in_flight"] == 3
+
+        held.pop().release()
+        permit = await limiter.enter(bulk=True, timeout=0.05)
+        for permit in held + [permit]:
+            permit.release()
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["bulk_in_flight"] == 0
+    assert stats["interactive_reserve"] == 1
+    assert stats["timeouts"] == 1
+
+
+def test_timeout_maps_to_503(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "tts_cache", TTSCache(str(tmp_path)))
+    monkeypatch.setattr(server, "OPENAI_API_KEY", "test-key")
+    limiter = UpstreamLimiter("openai", max_concurrency=1, queue_timeout=0)
+    monkeypatch.setitem(upstream_limiter._limiters, "openai", limiter)
+
+    async def hold_slot():
+        await limiter._slots.acquire()
+
+    asyncio.run(hold_slot())
+    response = TestClient(app).post("/api/tts", json={"text": "Hola", "voice": "nova", "provider": "openai"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+    stats = TestClient(app).get("/api/upstream/stats").json()
+    assert stats["limiters"]["openai"]["timeouts"] == 1
@@ -2,25 +2,66 @@
 Generate comprehensive lesson data for bundled audio
 Creates 15-20 minute lessons for each language/location combination
 
-Usage: 
-EXPO_PUBLIC_VIBECODE_OPENAI_API_KEY=<key> EXPO_PUBLIC_VIBECODE_ELEVENLABS_API_KEY=<key> python scripts/generate_lesson_data.py
+Lessons are generated concurrently by a bounded pool of async workers.
+Each output records the hash of the prompt and model settings that produced
+it, and lessons whose output already matches are skipped, so a re-run only
+pays for what failed or changed. Outputs and the checkpoint file are written
+atomically (temp file + rename). With --audio, every generated lesson is
+chained into section audio generation through the backend's audio cache
+(POST /api/audio/section/generate), so the bundled catalog ends up cached
+and pinned server-side; finished sections are checkpointed too, per
+backend and speaker pair.
+
+Usage:
+EXPO_PUBLIC_VIBECODE_OPENAI_API_KEY=<key> python scripts/generate_lesson_data.py [--workers 4] [--audio]
+
+Options:
+    --workers N         Concurrent lesson generations (default 4)
+    --only KEY ...      Only these lessons (e.g. es_coffee_shop)
+    --force             Regenerate even if the output is up to date
+    --output-dir DIR    Where lesson_data_*.json go (default: this directory)
+    --audio             Also generate section audio via the backend cache
+    --audio-workers N   Concurrent section audio requests (default 4)
+    --backend-url URL   Backend base URL (default $BACKEND_URL or http://localhost:8001)
+    --speakers A B      Speaker names for audio (default maria jordan)
 """
 
 import os
+import sys
 import json
-from openai import OpenAI
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from collections import Counter
+
+import httpx
 
 OPENAI_API_KEY = os.environ.get('EXPO_PUBLIC_VIBECODE_OPENAI_API_KEY')
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+BACKEND_URL = os.environ.get('BACKEND_URL', 'http://localhost:8001')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_FILE = '.lesson_data_checkpoint.json'
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.7
+MAX_TOKENS = 4000
+SYSTEM_PROMPT = (
+    "You are an expert language learning content creator. Generate comprehensive, engaging lessons "
+    "with natural dialogue. Output ONLY the pipe-delimited format requested, no additional text."
+)
 
-if not OPENAI_API_KEY:
-    print("Error: EXPO_PUBLIC_VIBECODE_OPENAI_API_KEY not set")
-    exit(1)
+# Section audio can take minutes for long sections
+OPENAI_TIMEOUT = 300.0
+AUDIO_TIMEOUT = 600.0
+MAX_ATTEMPTS = 3
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 def generate_lesson_prompt(language: str, location: str, language_label: str, location_label: str) -> str:
     """Generate a comprehensive lesson generation prompt for 15-20 minute lessons"""
-    
+
     return f"""Generate a COMPREHENSIVE {language_label} language learning lesson for a {location_label}.
 
 TARGET LESSON LENGTH: 15-20 minutes of audio content (approximately 120-150 dialogue lines total)
@@ -133,101 +174,327 @@ LESSONS = [
     }
 ]
 
-def generate_lesson_data(lesson_config):
-    """Generate lesson data using OpenAI"""
-    print(f"\n{'='*80}")
-    print(f"Generating: {lesson_config['language_label']} - {lesson_config['location_label']}")
-    print(f"{'='*80}\n")
-    
+
+def lesson_key(lesson_config) -> str:
+    return f"{lesson_config['language']}_{lesson_config['location']}"
+
+
+def completion_payload(lesson_config) -> dict:
+    """Chat completion request body for a lesson"""
     prompt = generate_lesson_prompt(
         lesson_config['language'],
         lesson_config['location'],
         lesson_config['language_label'],
         lesson_config['location_label']
     )
-    
-    print("Calling OpenAI API...")
-    
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert language learning content creator. Generate comprehensive, engaging lessons with natural dialogue. Output ONLY the pipe-delimited format requested, no additional text."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=4000
-    )
-    
-    lesson_text = response.choices[0].message.content
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
+    }
+
+
+def prompt_hash(lesson_config) -> str:
+    """Hash of everything that determines a lesson's output (prompt, model, settings)"""
+    identity = json.dumps(completion_payload(lesson_config), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def parse_lesson_lines(lesson_text: str) -> list:
+    """Parse pipe-delimited lesson output into line dicts (malformed lines dropped)"""
     lines = [line.strip() for line in lesson_text.split('\n') if line.strip() and '|' in line]
-    
-    print(f"✅ Generated {len(lines)} dialogue lines")
-    
-    # Parse lines
+
     parsed_lines = []
     for line in lines:
         parts = line.split('|')
-        if len(parts) >= 3:
-            speaker_id = int(parts[0])
-            segment_type = parts[1]
-            
-            # Extract emotion if present
-            emotion = None
-            text = '|'.join(parts[2:])
-            if text.startswith('[') and ']' in text:
-                emotion_end = text.index(']')
-                emotion = text[1:emotion_end]
-                text = text[emotion_end+2:].strip()
-            
-            parsed_lines.append({
-                'speakerId': speaker_id,
-                'segmentType': segment_type,
-                'emotion': emotion,
-                'text': text
-            })
-    
-    # Save to JSON file
-    output_file = f"lesson_data_{lesson_config['language']}_{lesson_config['location']}.json"
-    output_path = os.path.join('/app/scripts', output_file)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
+        if len(parts) < 3 or not parts[0].strip().isdigit():
+            continue
+        speaker_id = int(parts[0])
+        segment_type = parts[1].strip()
+
+        # Extract emotion if present
+        emotion = None
+        text = '|'.join(parts[2:])
+        if text.startswith('[') and ']' in text:
+            emotion_end = text.index(']')
+            emotion = text[1:emotion_end]
+            text = text[emotion_end+2:].strip()
+
+        parsed_lines.append({
+            'speakerId': speaker_id,
+            'segmentType': segment_type,
+            'emotion': emotion,
+            'text': text
+        })
+    return parsed_lines
+
+
+def group_sections(parsed_lines: list) -> list:
+    """Lesson lines grouped by section, in lesson order: [(section_type, lines)]"""
+    sections = {}
+    for line in parsed_lines:
+        sections.setdefault(line['segmentType'].lower(), []).append(line)
+    return list(sections.items())
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON via a temp file in the same directory + rename (never a torn file)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_json(path: str):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class Checkpoint:
+    """
+    Per-lesson progress, persisted after every change
+
+    {lesson_key: {prompt_hash, status, lines, sections: {section_type: {target, cache_key}}, error}}
+    An entry only counts while its prompt_hash matches the current prompt, and
+    a section only while its target (backend and speakers) matches the run's.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = read_json(path) or {}
+        self._lock = asyncio.Lock()
+
+    def get(self, key: str, current_hash: str) -> dict:
+        entry = self.state.get(key) or {}
+        return entry if entry.get('prompt_hash') == current_hash else {}
+
+    async def update(self, key: str, current_hash: str, **fields) -> None:
+        async with self._lock:
+            entry = self.get(key, current_hash) or {'prompt_hash': current_hash, 'sections': {}}
+            sections = fields.pop('sections', None)
+            if sections:
+                entry['sections'] = dict(entry.get('sections') or {}, **sections)
+            entry.update(fields, updated_at=time.time())
+            self.state[key] = entry
+            write_json_atomic(self.path, self.state)
+
+
+async def request_with_retries(client: httpx.AsyncClient, url: str, body: dict, **kwargs) -> httpx.Response:
+    """POST with retries on transport errors, 429 and 5xx (exponential backoff)"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = await client.post(url, json=body, **kwargs)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response
+            if attempt == MAX_ATTEMPTS:
+                response.raise_for_status()
+        except httpx.TransportError:
+            if attempt == MAX_ATTEMPTS:
+                raise
+        await asyncio.sleep(2 ** attempt)
+
+
+class LessonPipeline:
+    """Lesson text workers feeding (optionally) section audio workers"""
+
+    def __init__(self, args, openai_client: httpx.AsyncClient, backend_client: httpx.AsyncClient = None):
+        self.args = args
+        self.openai = openai_client
+        self.backend = backend_client
+        self.checkpoint = Checkpoint(os.path.join(args.output_dir, CHECKPOINT_FILE))
+        self.lessons = asyncio.Queue()
+        self.sections = asyncio.Queue()
+        self.results = Counter()
+
+    def output_path(self, lesson_config) -> str:
+        return os.path.join(self.args.output_dir, f"lesson_data_{lesson_key(lesson_config)}.json")
+
+    async def generate_lesson_data(self, lesson_config) -> list:
+        """Generate (or reuse) one lesson's data; returns its parsed lines"""
+        key = lesson_key(lesson_config)
+        current_hash = prompt_hash(lesson_config)
+        output_path = self.output_path(lesson_config)
+
+        existing = read_json(output_path)
+        if (not self.args.force and existing and existing.get('prompt_hash') == current_hash
+                and existing.get('lines')):
+            print(f"⏭️  {key}: up to date ({len(existing['lines'])} lines)")
+            self.results['skipped'] += 1
+            return existing['lines']
+
+        print(f"🤖 {key}: calling OpenAI API...")
+        started = time.perf_counter()
+        response = await request_with_retries(
+            self.openai,
+            OPENAI_URL,
+            completion_payload(lesson_config),
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}
+        )
+        lesson_text = response.json()['choices'][0]['message']['content']
+        parsed_lines = parse_lesson_lines(lesson_text)
+        if not parsed_lines:
+            raise ValueError("no dialogue lines in the completion")
+
+        write_json_atomic(output_path, {
             'config': lesson_config,
+            'prompt_hash': current_hash,
+            'generated_at': time.time(),
             'lines': parsed_lines
-        }, f, indent=2, ensure_ascii=False)
-    
-    print(f"💾 Saved to: {output_path}")
-    print(f"   Total lines: {len(parsed_lines)}")
-    
-    # Count by section
-    from collections import Counter
-    section_counts = Counter(line['segmentType'] for line in parsed_lines)
-    print(f"   Sections: {dict(section_counts)}")
-    
-    return parsed_lines
+        })
+        await self.checkpoint.update(key, current_hash, status='generated', lines=len(parsed_lines), error=None)
+        self.results['generated'] += 1
+
+        section_counts = Counter(line['segmentType'] for line in parsed_lines)
+        print(f"✅ {key}: {len(parsed_lines)} lines in {time.perf_counter() - started:.1f}s → {output_path}")
+        print(f"   Sections: {dict(section_counts)}")
+        return parsed_lines
+
+    async def lesson_worker(self) -> None:
+        while True:
+            lesson_config = await self.lessons.get()
+            key = lesson_key(lesson_config)
+            try:
+                parsed_lines = await self.generate_lesson_data(lesson_config)
+            except Exception as e:
+                print(f"❌ Error generating {key}: {e}")
+                self.results['failed'] += 1
+                await self.checkpoint.update(key, prompt_hash(lesson_config), status='failed', error=str(e))
+            else:
+                if self.backend is not None:
+                    self.queue_sections(lesson_config, parsed_lines)
+            finally:
+                self.lessons.task_done()
+
+    @property
+    def audio_target(self) -> str:
+        """What a finished section was rendered for: other speakers or another backend need it again"""
+        speaker_a, speaker_b = self.args.speakers
+        return f"{self.args.backend_url}|{speaker_a}|{speaker_b}"
+
+    def queue_sections(self, lesson_config, parsed_lines: list) -> None:
+        """Queue a lesson's sections for audio, skipping ones the checkpoint has as done for this target"""
+        key = lesson_key(lesson_config)
+        done = self.checkpoint.get(key, prompt_hash(lesson_config)).get('sections') or {}
+        for section_type, lines in group_sections(parsed_lines):
+            finished = done.get(section_type)
+            if (isinstance(finished, dict) and finished.get('target') == self.audio_target
+                    and not self.args.force):
+                self.results['audio_skipped'] += 1
+                continue
+            self.sections.put_nowait((lesson_config, section_type, lines))
+
+    async def section_worker(self) -> None:
+        speaker_a, speaker_b = self.args.speakers
+        while True:
+            lesson_config, section_type, lines = await self.sections.get()
+            key = lesson_key(lesson_config)
+            try:
+                response = await request_with_retries(
+                    self.backend,
+                    "/api/audio/section/generate",
+                    {
+                        "section_type": section_type,
+                        "language": lesson_config['language'],
+                        "location": lesson_config['location'],
+                        "speaker_a": speaker_a,
+                        "speaker_b": speaker_b,
+                        "dialogue_lines": lines,
+                        "pin": True
+                    }
+                )
+                entry = response.json()
+                await self.checkpoint.update(
+                    key, prompt_hash(lesson_config),
+                    sections={section_type: {'target': self.audio_target, 'cache_key': entry['cache_key']}}
+                )
+                status = 'cached' if entry.get('is_cached') else 'generated'
+                self.results[f'audio_{status}'] += 1
+                print(f"🔊 {key}/{section_type}: {status} {entry['cache_key']}")
+            except Exception as e:
+                self.results['audio_failed'] += 1
+                print(f"❌ Audio failed for {key}/{section_type}: {e}")
+            finally:
+                self.sections.task_done()
+
+    async def run(self, lessons: list) -> Counter:
+        for lesson_config in lessons:
+            self.lessons.put_nowait(lesson_config)
+
+        workers = [asyncio.create_task(self.lesson_worker()) for _ in range(self.args.workers)]
+        if self.backend is not None:
+            workers += [asyncio.create_task(self.section_worker()) for _ in range(self.args.audio_workers)]
+        try:
+            # Sections are queued before their lesson is marked done, so this order drains both
+            await self.lessons.join()
+            await self.sections.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate bundled lesson data (and optionally section audio)")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--only', nargs='+', metavar='KEY')
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--output-dir', default=SCRIPT_DIR)
+    parser.add_argument('--audio', action='store_true')
+    parser.add_argument('--audio-workers', type=int, default=4)
+    parser.add_argument('--backend-url', default=BACKEND_URL)
+    parser.add_argument('--speakers', nargs=2, default=['maria', 'jordan'], metavar=('A', 'B'))
+    return parser.parse_args(argv)
+
+
+async def run(args) -> Counter:
+    lessons = [lesson for lesson in LESSONS if not args.only or lesson_key(lesson) in args.only]
+    limits = httpx.Limits(max_connections=max(args.workers, args.audio_workers))
+    async with httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=limits) as openai_client:
+        if not args.audio:
+            return await LessonPipeline(args, openai_client).run(lessons)
+        async with httpx.AsyncClient(base_url=args.backend_url, timeout=AUDIO_TIMEOUT, limits=limits) as backend_client:
+            return await LessonPipeline(args, openai_client, backend_client).run(lessons)
+
 
 def main():
+    args = parse_args()
+    if not OPENAI_API_KEY:
+        print("Error: EXPO_PUBLIC_VIBECODE_OPENAI_API_KEY not set")
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+
     print("🎓 Comprehensive Lesson Data Generator")
     print("   Target: 15-20 minute lessons (~120-150 lines each)")
+    print(f"   Workers: {args.workers}" + (f", audio workers: {args.audio_workers} → {args.backend_url}" if args.audio else ""))
     print()
-    
-    for lesson in LESSONS:
-        try:
-            generate_lesson_data(lesson)
-        except Exception as e:
-            print(f"❌ Error generating {lesson['language']}_{lesson['location']}: {e}")
-            continue
-    
+
+    started = time.perf_counter()
+    results = asyncio.run(run(args))
+
     print(f"\n{'='*80}")
-    print("✅ All lesson data generated!")
-    print("   Next step: Run generate-bundled-audio.ts to create audio files")
+    print(f"Done in {time.perf_counter() - started:.1f}s: {dict(results)}")
+    if not args.audio:
+        print("   Next step: Run generate-bundled-audio.ts to create audio files (or re-run with --audio)")
     print(f"{'='*80}\n")
 
+    if results['failed'] or results['audio_failed']:
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()